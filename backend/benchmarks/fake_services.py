@@ -0,0 +1,158 @@
+# fake_services.py
+# Latency-injecting stand-ins for the services a TripWorkflow calls.
+#
+# One grpc.aio server hosts TripRequest, Matching, Pricing, DriverStatus,
+# Trip and Telemetry services. Every unary call awaits asyncio.sleep(latency)
+# and returns a minimal valid response. Benchmarks start it with
+# start_fake_backend(): one or more child processes sharing a port through
+# SO_REUSEPORT, so the backend does not share a GIL with the client.
+
+import asyncio
+import multiprocessing
+import os
+import socket
+import sys
+import uuid
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../generated/python"))
+
+import grpc
+
+from trip_request_pb2_grpc import TripRequestServiceServicer, add_TripRequestServiceServicer_to_server
+from matching_pb2_grpc import MatchingServiceServicer, add_MatchingServiceServicer_to_server
+from pricing_pb2_grpc import PricingServiceServicer, add_PricingServiceServicer_to_server
+from driver_status_pb2_grpc import DriverStatusServiceServicer, add_DriverStatusServiceServicer_to_server
+from trip_service_pb2_grpc import TripServiceServicer, add_TripServiceServicer_to_server
+from telemetry_pb2_grpc import TelemetryServiceServicer, add_TelemetryServiceServicer_to_server
+
+from trip_request_pb2 import TripRequest
+from matching_pb2 import MatchingResponse, Candidate
+from pricing_pb2 import PriceCalculationResponse, FallbackPricingConfig
+from driver_status_pb2 import DriverStatus
+from trip_pb2 import Trip
+from telemetry_pb2 import LogEventsAck
+
+
+class FakeTripRequestService(TripRequestServiceServicer):
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def CreateTripRequest(self, request, context):
+        await asyncio.sleep(self.latency)
+        return TripRequest(id=str(uuid.uuid4()), passenger_id=request.passenger_id, version=1)
+
+    async def CancelTripRequest(self, request, context):
+        await asyncio.sleep(self.latency)
+        return TripRequest(id=request.request_id, version=request.expected_version + 1)
+
+
+class FakeMatchingService(MatchingServiceServicer):
+
+    def __init__(self, latency: float, drivers: int = 1000):
+        self.latency = latency
+        self.drivers = drivers
+
+    async def GetCandidates(self, request, context):
+        await asyncio.sleep(self.latency)
+        first = hash(request.trip_request_id) % self.drivers
+        n = max(1, min(request.max_candidates or 3, 5))
+        return MatchingResponse(candidates=[
+            Candidate(driver_id=f"driver_{(first + i) % self.drivers}", probability=1.0 / n,
+                      distance_meters=300.0 * (i + 1), eta_seconds=60 * (i + 1))
+            for i in range(n)
+        ])
+
+
+class FakePricingService(PricingServiceServicer):
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def CalculatePrice(self, request, context):
+        await asyncio.sleep(self.latency)
+        fare = 300.0 + request.estimated_distance_meters * 0.05 + request.estimated_duration_seconds * 0.5
+        fare *= max(1.0, request.demand_multiplier)
+        return PriceCalculationResponse(
+            trip_request_id=request.trip_request_id,
+            calculation_id=str(uuid.uuid4()),
+            passenger_fare_total=fare,
+            driver_payout_total=fare * 0.8,
+            platform_commission=fare * 0.2,
+        )
+
+    async def GetFallbackConfig(self, request, context):
+        return FallbackPricingConfig(base_rate_kzt=300.0, per_meter_rate_kzt=0.05, per_second_rate_kzt=0.5,
+                                     minimum_fare_kzt=500.0, platform_commission_rate=0.2, config_version="fake")
+
+
+class FakeDriverStatusService(DriverStatusServiceServicer):
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def UpdateDriverStatus(self, request, context):
+        await asyncio.sleep(self.latency)
+        return DriverStatus(driver_id=request.driver_id, is_available=request.is_available, version=2)
+
+
+class FakeTripService(TripServiceServicer):
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def CreateTrip(self, request, context):
+        await asyncio.sleep(self.latency)
+        return Trip(id=str(uuid.uuid4()), trip_request_id=request.trip_request_id,
+                    passenger_id=request.passenger_id, driver_id=request.driver_id, version=1)
+
+    async def UpdateTripStatus(self, request, context):
+        await asyncio.sleep(self.latency)
+        return Trip(id=request.trip_id, status=request.new_status, version=request.expected_version + 1)
+
+
+class FakeTelemetryService(TelemetryServiceServicer):
+
+    async def LogEvents(self, request_iterator, context):
+        accepted = 0
+        async for _ in request_iterator:
+            accepted += 1
+        return LogEventsAck(accepted=accepted)
+
+
+async def serve_fake_backend(port: int, latency: float, ready=None):
+    server = grpc.aio.server(options=[("grpc.so_reuseport", 1)])
+    add_TripRequestServiceServicer_to_server(FakeTripRequestService(latency), server)
+    add_MatchingServiceServicer_to_server(FakeMatchingService(latency), server)
+    add_PricingServiceServicer_to_server(FakePricingService(latency), server)
+    add_DriverStatusServiceServicer_to_server(FakeDriverStatusService(latency), server)
+    add_TripServiceServicer_to_server(FakeTripService(latency), server)
+    add_TelemetryServiceServicer_to_server(FakeTelemetryService(), server)
+    bound = server.add_insecure_port(f"localhost:{port}")
+    await server.start()
+    if ready is not None:
+        ready.put(bound)
+    await server.wait_for_termination()
+
+
+def _run(port: int, latency: float, ready):
+    asyncio.run(serve_fake_backend(port, latency, ready))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+def start_fake_backend(latency: float, processes: int = 4, port: int = None):
+    """Start the fake backend in child processes; returns (processes, port)."""
+    port = port or free_port()
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    children = [ctx.Process(target=_run, args=(port, latency, ready), daemon=True) for _ in range(processes)]
+    for child in children:
+        child.start()
+    for _ in children:
+        ready.get(timeout=30)
+    return children, port
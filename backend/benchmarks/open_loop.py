@@ -0,0 +1,252 @@
+# open_loop.py
+# Open-loop load generator for the trip pipeline.
+#
+#   python benchmarks/open_loop.py --rate 200 --duration 30
+#   python benchmarks/open_loop.py --backend fake --latency-ms 20 --rate 500 --json out.json
+#
+# Trips arrive as a Poisson process at --rate per second whether or not
+# earlier trips have finished. (Closed-loop scripts slow down along with the
+# system and hide queueing.) Each trip runs CreateTripRequest ->
+# GetCandidates -> CreateTrip -> UpdateTripStatus(EN_ROUTE) on grpc.aio. Each
+# stage's latency goes into its own Histogram, timed from when the call was
+# sent. The end-to-end "trip" latency is timed from the trip's scheduled
+# arrival, so delay in sending also counts (no coordinated omission).
+#
+# Backends:
+#   inprocess  the real TripRequestService, TripService and PricingService,
+#              plus GetCandidates over a seeded DriverIndex (matching is not a
+#              Python service), on one grpc.server in this process. It shares
+#              the GIL with the client: use it to compare commits, not to
+#              plan capacity.
+#   fake       fake_services in --backend-processes child processes; every
+#              RPC sleeps --latency-ms.
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+from concurrent import futures
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../generated/python"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "../services/python"))
+
+import grpc
+
+from trip_request_pb2_grpc import TripRequestServiceStub, add_TripRequestServiceServicer_to_server
+from matching_pb2_grpc import MatchingServiceStub, MatchingServiceServicer, add_MatchingServiceServicer_to_server
+from pricing_pb2_grpc import add_PricingServiceServicer_to_server
+from trip_service_pb2_grpc import TripServiceStub, add_TripServiceServicer_to_server
+
+from trip_request_pb2 import CreateTripRequestCommand
+from matching_pb2 import MatchingRequest, MatchingResponse, Candidate
+from trip_service_pb2 import CreateTripCommand, UpdateTripStatusCommand
+from trip_pb2 import TripStatus
+from common_pb2 import Location
+
+from trip_request_server import TripRequestService
+from trip_server import TripService
+from pricing_server import PricingService
+from driver_index import DriverIndex
+
+from hdr_histogram import Histogram
+from fake_services import start_fake_backend
+
+# -----------------------------
+# Defaults
+# -----------------------------
+STAGES = ("create_trip_request", "get_candidates", "create_trip", "update_trip_status")
+DEFAULT_CALL_TIMEOUT_SECONDS = 5.0
+DEFAULT_MAX_IN_FLIGHT = 10_000    # arrivals beyond this are dropped (and counted), not queued
+CITY_CENTER = (40.28, 69.62)      # Khujand
+CITY_SPREAD_DEG = 0.05
+DRIVER_SPEED_MPS = 8.0
+
+LoadResult = collections.namedtuple("LoadResult", ["arrivals", "completed", "dropped", "errors", "elapsed",
+                                                   "histograms"])
+
+
+# -----------------------------
+# In-process backend
+# -----------------------------
+class IndexMatchingService(MatchingServiceServicer):
+    """GetCandidates: the nearest available drivers in a DriverIndex."""
+
+    def __init__(self, index: DriverIndex):
+        self.index = index
+
+    def GetCandidates(self, request, context):
+        n = request.max_candidates or 3
+        return MatchingResponse(candidates=[
+            Candidate(driver_id=snap.driver_id, probability=1.0 / n, distance_meters=snap.distance_m,
+                      eta_seconds=int(snap.distance_m / DRIVER_SPEED_MPS))
+            for snap in self.index.nearest(request.origin.lat, request.origin.lon, n)
+        ])
+
+
+def random_location(rng: random.Random) -> Location:
+    return Location(lat=CITY_CENTER[0] + rng.uniform(-CITY_SPREAD_DEG, CITY_SPREAD_DEG),
+                    lon=CITY_CENTER[1] + rng.uniform(-CITY_SPREAD_DEG, CITY_SPREAD_DEG))
+
+
+class InProcessBackend:
+
+    def __init__(self, drivers: int = 500, seed: int = 0, workers: int = 16):
+        rng = random.Random(seed)
+        self.index = DriverIndex()
+        now = time.time()
+        for i in range(drivers):
+            loc = random_location(rng)
+            self.index.update(f"driver_{i}", True, (loc.lat, loc.lon), 0, now)
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers))
+        port = self.server.add_insecure_port("localhost:0")
+        self.target = f"localhost:{port}"
+        # TripService prices through PricingService on this same server
+        self.pricing_channel = grpc.insecure_channel(self.target)
+        add_TripRequestServiceServicer_to_server(TripRequestService(), self.server)
+        add_MatchingServiceServicer_to_server(IndexMatchingService(self.index), self.server)
+        add_PricingServiceServicer_to_server(PricingService(), self.server)
+        add_TripServiceServicer_to_server(TripService(self.pricing_channel), self.server)
+
+    def start(self) -> str:
+        self.server.start()
+        return self.target
+
+    def stop(self):
+        self.server.stop(None)
+        self.pricing_channel.close()
+
+
+# -----------------------------
+# Load generator
+# -----------------------------
+async def run_open_loop(target: str, rate: float, duration: float, seed: int = 0,
+                        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                        timeout: float = DEFAULT_CALL_TIMEOUT_SECONDS) -> LoadResult:
+    """Offer Poisson arrivals at `rate`/s for `duration` seconds and wait for all of them."""
+    rng = random.Random(seed)
+    histograms = {stage: Histogram() for stage in STAGES + ("trip",)}
+    errors = collections.Counter()
+    in_flight = set()
+    arrivals = dropped = 0
+
+    async with grpc.aio.insecure_channel(target) as channel:
+        trip_request_stub = TripRequestServiceStub(channel)
+        matching_stub = MatchingServiceStub(channel)
+        trip_stub = TripServiceStub(channel)
+
+        async def timed(stage, call, request):
+            start = time.perf_counter()
+            response = await call(request, timeout=timeout)
+            histograms[stage].record(time.perf_counter() - start)
+            return response
+
+        async def one(i, scheduled, origin, destination):
+            try:
+                trip_request = await timed("create_trip_request", trip_request_stub.CreateTripRequest,
+                                           CreateTripRequestCommand(passenger_id=f"passenger_{seed}_{i}",
+                                                                    origin=origin, destination=destination))
+                match = await timed("get_candidates", matching_stub.GetCandidates,
+                                    MatchingRequest(trip_request_id=trip_request.id, origin=origin,
+                                                    destination=destination, max_candidates=3, seed=i))
+                if not match.candidates:
+                    errors["NO_CANDIDATES"] += 1
+                    return
+                trip = await timed("create_trip", trip_stub.CreateTrip,
+                                   CreateTripCommand(trip_request_id=trip_request.id,
+                                                     passenger_id=trip_request.passenger_id,
+                                                     driver_id=match.candidates[0].driver_id,
+                                                     origin=origin, destination=destination))
+                await timed("update_trip_status", trip_stub.UpdateTripStatus,
+                            UpdateTripStatusCommand(trip_id=trip.id, new_status=TripStatus.EN_ROUTE,
+                                                    expected_version=trip.version))
+                histograms["trip"].record(time.perf_counter() - scheduled)
+            except grpc.aio.AioRpcError as e:
+                errors[e.code().name] += 1
+
+        start = time.perf_counter()
+        scheduled = start
+        while True:
+            scheduled += rng.expovariate(rate)
+            if scheduled - start >= duration:
+                break
+            origin, destination = random_location(rng), random_location(rng)
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            arrivals += 1
+            if len(in_flight) >= max_in_flight:
+                dropped += 1
+                continue
+            task = asyncio.create_task(one(arrivals, scheduled, origin, destination))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        await asyncio.gather(*in_flight)
+        elapsed = time.perf_counter() - start
+
+    return LoadResult(arrivals, histograms["trip"].total, dropped, dict(errors), elapsed, histograms)
+
+
+# -----------------------------
+# Report
+# -----------------------------
+def summarize(result: LoadResult, rate: float) -> dict:
+    return {
+        "offered_rate": rate,
+        "achieved_rate": result.completed / result.elapsed if result.elapsed else 0.0,
+        "arrivals": result.arrivals,
+        "completed": result.completed,
+        "dropped": result.dropped,
+        "errors": result.errors,
+        "stages": {name: hist.summary() for name, hist in result.histograms.items()},
+    }
+
+
+def report(summary: dict):
+    print(f"offered {summary['offered_rate']:.1f}/s  achieved {summary['achieved_rate']:.1f}/s  "
+          f"completed {summary['completed']}/{summary['arrivals']}  dropped {summary['dropped']}  "
+          f"errors {summary['errors'] or 0}")
+    print(f"{'stage':>20} {'count':>7} {'p50 ms':>9} {'p99 ms':>9} {'p999 ms':>9} {'max ms':>9}")
+    for name, s in summary["stages"].items():
+        print(f"{name:>20} {s['count']:7d} {s['p50'] * 1000:9.2f} {s['p99'] * 1000:9.2f} "
+              f"{s['p999'] * 1000:9.2f} {s['max'] * 1000:9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Open-loop trip pipeline latency benchmark")
+    parser.add_argument("--backend", choices=("inprocess", "fake"), default="inprocess")
+    parser.add_argument("--rate", type=float, default=100.0, help="trip arrivals per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of arrivals")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--drivers", type=int, default=500, help="inprocess: drivers in the index")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="fake: sleep per RPC")
+    parser.add_argument("--backend-processes", type=int, default=2, help="fake: server processes")
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT)
+    parser.add_argument("--json", help="also write the summary to this file")
+    args = parser.parse_args()
+
+    if args.backend == "inprocess":
+        backend = InProcessBackend(args.drivers, args.seed)
+        target = backend.start()
+        stop = backend.stop
+    else:
+        processes, port = start_fake_backend(args.latency_ms / 1000, args.backend_processes)
+        target = f"localhost:{port}"
+        stop = lambda: [process.terminate() for process in processes]
+
+    try:
+        # The services print per request; keep that out of the report
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            result = asyncio.run(run_open_loop(target, args.rate, args.duration, args.seed, args.max_in_flight))
+    finally:
+        stop()
+
+    summary = summarize(result, args.rate)
+    report(summary)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
@@ -0,0 +1,484 @@
+# replay.py
+# Deterministic replay of recorded trip events against the services.
+#
+#   python benchmarks/replay.py trips.log --speed 1          # original pacing
+#   python benchmarks/replay.py trips.log --speed 10         # 10x compressed
+#   python benchmarks/replay.py telemetry_data/ --speed max --target services
+#   python benchmarks/replay.py trips.log --record replayed.log
+#
+# Inputs are JSON log_event lines ({"timestamp", "event_type", "data"}, as
+# printed by the realtime test scripts) or a TelemetryStore data dir
+# (segment_*.log). Both become one timeline of Records. Telemetry event
+# types are normalised to the log names (trip_created -> TripCreated), and
+# entity_id fills in the id the event is about.
+#
+# Events are grouped into sessions by trip_request_id (trip_id-only events
+# join the session of the TripCreated that names both). Events naming
+# neither, as in telemetry recorded before the workflows attached
+# trip_request_id, are linked by their place in the timeline: a match joins
+# the oldest open request still without a driver, a TripCreated the oldest
+# one matched to its driver. Each event is
+# re-driven as its RPC at the recorded offset divided by --speed; "max"
+# sends each one as soon as the previous event of its session has finished.
+# Within a session, ids are remapped from the recording to the live ones,
+# and matching gets the recorded seed (or --seed), so a replay against the
+# same build yields the same responses. Each response is diffed against
+# the recording (driver, status, version, success vs error). Events the
+# replay cannot re-drive are counted as skipped, e.g. FSMError, or
+# telemetry that lacks the ids it needs.
+#
+# --record writes the replay as log_event lines with the original
+# timestamps. Replaying that file against another build turns any
+# behaviour change into a mismatch.
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import glob
+import json
+import os
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../generated/python"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "../services/python"))
+
+import grpc
+
+from trip_request_pb2_grpc import TripRequestServiceStub
+from matching_pb2_grpc import MatchingServiceStub
+from trip_service_pb2_grpc import TripServiceStub
+
+from trip_request_pb2 import CreateTripRequestCommand
+from matching_pb2 import MatchingRequest
+from trip_service_pb2 import CreateTripCommand, UpdateTripStatusCommand, CancelTripCommand
+from trip_pb2 import TripStatus
+from common_pb2 import Location
+from telemetry_pb2 import TelemetryEvent
+
+from telemetry_store import read_segment, event_time
+from grpc_channels import resolve_target
+
+from hdr_histogram import Histogram
+from open_loop import InProcessBackend, CITY_CENTER
+
+# -----------------------------
+# Defaults
+# -----------------------------
+DEFAULT_SEED = 42
+DEFAULT_MAX_CANDIDATES = 3
+DEFAULT_CALL_TIMEOUT_SECONDS = 5.0
+
+# Which id an event's entity_id is, by (normalised) event type
+ENTITY_FIELDS = {
+    "TripRequestCreated": "trip_request_id",
+    "DriverAssigned": "driver_id",
+    "DriverMatched": "driver_id",
+    "NoDriversAvailable": "trip_request_id",
+    "TripRequestQueued": "trip_request_id",
+    "TripRequestExpired": "trip_request_id",
+    "TripCreated": "trip_id",
+    "TripStatusUpdated": "trip_id",
+    "TripCancelled": "trip_id",
+}
+
+# Re-driven as a matching call; recorded with no driver for the last two
+MATCH_EVENTS = ("DriverMatched", "DriverAssigned")
+NO_DRIVER_EVENTS = ("NoDriversAvailable", "TripRequestQueued")
+# A request that gets one of these will never have a trip
+CLOSING_EVENTS = ("NoDriversAvailable", "TripRequestExpired")
+
+Record = collections.namedtuple("Record", ["ts", "event_type", "data"])
+Mismatch = collections.namedtuple("Mismatch", ["ts", "event_type", "session", "field", "expected", "actual"])
+ReplayResult = collections.namedtuple("ReplayResult", ["replayed", "skipped", "mismatches", "elapsed", "span",
+                                                       "histograms"])
+
+
+# -----------------------------
+# Reading recordings
+# -----------------------------
+def parse_timestamp(value) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)   # log_event writes utcnow()
+    return dt.timestamp()
+
+
+def format_timestamp(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None).isoformat(timespec="microseconds") + "Z"
+
+
+def normalise_event_type(event_type: str) -> str:
+    """trip_request_created -> TripRequestCreated; CamelCase passes through."""
+    if "_" not in event_type and event_type[:1].isupper():
+        return event_type
+    return "".join(part.capitalize() for part in re.split(r"[_\s]+", event_type) if part)
+
+
+def read_log(path: str):
+    """Records from JSON log_event lines; other lines (and prefixes before the JSON) are ignored."""
+    with open(path) as f:
+        for line in f:
+            start = line.find("{")
+            if start < 0:
+                continue
+            try:
+                entry = json.loads(line[start:])
+            except ValueError:
+                continue
+            if not isinstance(entry, dict) or "event_type" not in entry or "timestamp" not in entry:
+                continue
+            yield Record(parse_timestamp(entry["timestamp"]), entry["event_type"], dict(entry.get("data") or {}))
+
+
+def read_segments(data_dir: str):
+    """Records from a TelemetryStore data dir."""
+    for path in sorted(glob.glob(os.path.join(data_dir, "segment_*.log"))):
+        for data in read_segment(path):
+            event = TelemetryEvent.FromString(data)
+            event_type = normalise_event_type(event.event_type)
+            fields = dict(event.metadata.data)
+            entity_field = ENTITY_FIELDS.get(event_type)
+            if entity_field and event.entity_id:
+                fields.setdefault(entity_field, event.entity_id)
+            yield Record(event_time(event), event_type, fields)
+
+
+def load_records(paths: list) -> list:
+    """All records from log files and segment dirs, in timestamp order (stable)."""
+    records = []
+    for path in paths:
+        records.extend(read_segments(path) if os.path.isdir(path) else read_log(path))
+    records.sort(key=lambda record: record.ts)
+    return records
+
+
+def _oldest(open_requests: dict, accept):
+    return next((request_id for request_id, driver_id in open_requests.items() if accept(driver_id)), None)
+
+
+def sessions_of(records: list) -> list:
+    """
+    The recorded trip_request_id each record belongs to, or None. Records
+    without one (or a trip_id already linked to one) are linked by timeline
+    order, see the module comment.
+    """
+    request_of_trip = {r.data["trip_id"]: r.data["trip_request_id"]
+                       for r in records if r.data.get("trip_id") and r.data.get("trip_request_id")}
+    open_requests = {}   # trip_request_id -> matched driver_id or None, oldest first, until it has a trip
+    sessions = []
+    for r in records:
+        kind, driver_id = r.event_type, r.data.get("driver_id")
+        session = r.data.get("trip_request_id") or request_of_trip.get(r.data.get("trip_id"))
+        if session is None and kind in MATCH_EVENTS:
+            # driver_assigned follows driver_matched for the same driver
+            session = (_oldest(open_requests, lambda matched: driver_id is not None and matched == driver_id)
+                       or _oldest(open_requests, lambda matched: matched is None))
+        elif session is None and kind == "TripCreated":
+            session = _oldest(open_requests, lambda matched: matched is not None
+                              and (driver_id is None or matched == driver_id))
+            if session is not None and r.data.get("trip_id"):
+                request_of_trip[r.data["trip_id"]] = session
+        sessions.append(session)
+
+        if session is None:
+            continue
+        if kind == "TripRequestCreated":
+            open_requests[session] = None
+        elif kind in MATCH_EVENTS and session in open_requests and open_requests[session] is None:
+            open_requests[session] = driver_id
+        elif kind == "TripCreated" or kind in CLOSING_EVENTS:
+            open_requests.pop(session, None)
+    return sessions
+
+
+def _location(value, default) -> Location:
+    if isinstance(value, dict) and "lat" in value and "lon" in value:
+        return Location(lat=float(value["lat"]), lon=float(value["lon"]))
+    if isinstance(value, str) and value.count(",") == 1:
+        # Telemetry metadata: "lat,lon"
+        lat, lon = value.split(",")
+        return Location(lat=float(lat), lon=float(lon))
+    return default
+
+
+def _status(value):
+    return TripStatus.Value(value) if isinstance(value, str) else int(value)
+
+
+# -----------------------------
+# Replayer
+# -----------------------------
+class Session:
+    """Live state of one recorded trip request during replay."""
+
+    def __init__(self):
+        self.trip_request = None
+        self.origin = None
+        self.destination = None
+        self.driver_id = None
+        self.trip = None
+        self.seed = None
+        self.tail = None   # task of this session's previous event
+
+
+class Replayer:
+
+    def __init__(self, trip_request_stub, matching_stub, trip_stub, speed: float = 1.0, seed: int = DEFAULT_SEED,
+                 namespace: str = "", timeout: float = DEFAULT_CALL_TIMEOUT_SECONDS, record=None):
+        """
+        speed: recorded time is divided by this; None replays as fast as
+        possible. namespace prefixes passenger ids so repeated replays against
+        one environment do not collide. record(entry) receives a log_event
+        dict per replayed event.
+        """
+        self.trip_request_stub = trip_request_stub
+        self.matching_stub = matching_stub
+        self.trip_stub = trip_stub
+        self.speed = speed
+        self.seed = seed
+        self.namespace = namespace
+        self.timeout = timeout
+        self.record = record
+        self.default_origin = Location(lat=CITY_CENTER[0], lon=CITY_CENTER[1])
+
+        self.histograms = collections.defaultdict(Histogram)
+        self.mismatches = []
+        self.replayed = 0
+        self.skipped = collections.Counter()
+
+    # -----------------------------
+    # Diffing
+    # -----------------------------
+    def _expect(self, record, session_id, field, expected, actual):
+        if expected is not None and expected != actual:
+            self.mismatches.append(Mismatch(record.ts, record.event_type, session_id, field, expected, actual))
+
+    def _emit(self, record, data):
+        if self.record is not None:
+            self.record({"timestamp": format_timestamp(record.ts), "event_type": record.event_type, "data": data})
+
+    # -----------------------------
+    # Events
+    # -----------------------------
+    async def _call(self, record, call, request):
+        start = time.perf_counter()
+        response = await call(request, timeout=self.timeout)
+        self.histograms[record.event_type].record(time.perf_counter() - start)
+        return response
+
+    async def _match(self, record, session):
+        return await self._call(record, self.matching_stub.GetCandidates, MatchingRequest(
+            trip_request_id=session.trip_request.id, origin=session.origin, destination=session.destination,
+            max_candidates=int(record.data.get("max_candidates", DEFAULT_MAX_CANDIDATES)), seed=session.seed,
+        ))
+
+    async def _replay(self, record, session_id, session):
+        """Re-drive one record; returns False when it cannot be replayed."""
+        data, kind = record.data, record.event_type
+
+        if kind == "TripRequestCreated":
+            session.origin = _location(data.get("origin"), self.default_origin)
+            session.destination = _location(data.get("destination"), session.origin)
+            session.seed = int(data.get("seed", self.seed))
+            passenger_id = data.get("passenger_id", session_id)
+            if self.namespace:
+                passenger_id = f"{self.namespace}:{passenger_id}"
+            session.trip_request = await self._call(record, self.trip_request_stub.CreateTripRequest,
+                                                    CreateTripRequestCommand(passenger_id=passenger_id,
+                                                                             origin=session.origin,
+                                                                             destination=session.destination))
+            self._emit(record, {"trip_request_id": session.trip_request.id,
+                                "passenger_id": data.get("passenger_id", session_id),
+                                "origin": {"lat": session.origin.lat, "lon": session.origin.lon},
+                                "destination": {"lat": session.destination.lat, "lon": session.destination.lon},
+                                "seed": session.seed})
+            return True
+
+        if session.trip_request is None:
+            return False   # the session's TripRequestCreated was not recorded
+
+        if kind == "DriverAssigned" and session.driver_id is not None:
+            # Assignment of the driver this session's DriverMatched already re-matched
+            self._expect(record, session_id, "driver_id", data.get("driver_id"), session.driver_id)
+            self._emit(record, {"trip_request_id": session.trip_request.id, "driver_id": session.driver_id})
+            return True
+
+        if kind in MATCH_EVENTS or kind in NO_DRIVER_EVENTS:
+            if "seed" in data:
+                session.seed = int(data["seed"])
+            response = await self._match(record, session)
+            actual = response.candidates[0].driver_id if response.candidates else None
+            if kind in MATCH_EVENTS:
+                self._expect(record, session_id, "driver_id", data.get("driver_id"), actual)
+            elif actual is not None:
+                # Recorded: nobody was available
+                self.mismatches.append(Mismatch(record.ts, kind, session_id, "driver_id", None, actual))
+            session.driver_id = actual
+            emitted = {"trip_request_id": session.trip_request.id, "seed": session.seed}
+            if actual is not None:
+                emitted["driver_id"] = actual
+            self._emit(record, emitted)
+            return True
+
+        if kind == "TripCreated":
+            driver_id = data.get("driver_id") or session.driver_id
+            if driver_id is None:
+                return False
+            session.trip = await self._call(record, self.trip_stub.CreateTrip, CreateTripCommand(
+                trip_request_id=session.trip_request.id, passenger_id=session.trip_request.passenger_id,
+                driver_id=driver_id, origin=session.origin, destination=session.destination,
+            ))
+            self._expect(record, session_id, "driver_id", driver_id, session.trip.driver_id)
+            self._emit(record, {"trip_id": session.trip.id, "trip_request_id": session.trip_request.id,
+                                "driver_id": session.trip.driver_id})
+            return True
+
+        if session.trip is None:
+            return False
+
+        if kind == "TripStatusUpdated" and "new_status" in data:
+            session.trip = await self._call(record, self.trip_stub.UpdateTripStatus, UpdateTripStatusCommand(
+                trip_id=session.trip.id, new_status=_status(data["new_status"]),
+                expected_version=session.trip.version,
+            ))
+            self._expect(record, session_id, "status", _status(data["new_status"]), session.trip.status)
+            self._expect(record, session_id, "version", data.get("version"), session.trip.version)
+            self._emit(record, {"trip_id": session.trip.id, "new_status": session.trip.status,
+                                "version": session.trip.version})
+            return True
+
+        if kind == "TripCancelled":
+            session.trip = await self._call(record, self.trip_stub.CancelTrip, CancelTripCommand(
+                trip_id=session.trip.id, reason=_status(data.get("status", TripStatus.CANCELLED)),
+                expected_version=session.trip.version,
+            ))
+            self._expect(record, session_id, "status", data.get("status"), session.trip.status)
+            self._emit(record, {"trip_id": session.trip.id, "trip_request_id": session.trip_request.id,
+                                "status": session.trip.status})
+            return True
+
+        return False
+
+    async def _run_one(self, record, session_id, session, previous):
+        if previous is not None:
+            await previous
+        try:
+            replayed = await self._replay(record, session_id, session)
+        except grpc.aio.AioRpcError as e:
+            # The recording shows this step succeeding
+            self.mismatches.append(Mismatch(record.ts, record.event_type, session_id, "error", None, e.code().name))
+            return
+        if replayed:
+            self.replayed += 1
+        else:
+            self.skipped[record.event_type] += 1
+
+    # -----------------------------
+    # Timeline
+    # -----------------------------
+    async def run(self, records: list) -> ReplayResult:
+        sessions = collections.defaultdict(Session)
+        tasks = []
+        start = time.perf_counter()
+        first = records[0].ts if records else 0.0
+
+        for record, session_id in zip(records, sessions_of(records)):
+            if session_id is None:
+                self.skipped[record.event_type] += 1
+                continue
+            if self.speed:
+                delay = start + (record.ts - first) / self.speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            session = sessions[session_id]
+            session.tail = asyncio.create_task(self._run_one(record, session_id, session, session.tail))
+            tasks.append(session.tail)
+
+        await asyncio.gather(*tasks)
+        span = records[-1].ts - first if records else 0.0
+        return ReplayResult(self.replayed, dict(self.skipped), self.mismatches, time.perf_counter() - start, span,
+                            dict(self.histograms))
+
+
+REPLAYED_SERVICES = ("trip_request", "matching", "trip")
+
+
+async def replay(targets: dict, records: list, **kwargs) -> ReplayResult:
+    """Replay against {"trip_request" | "matching" | "trip": host:port} (aio channels, one per address)."""
+    channels = {address: grpc.aio.insecure_channel(address) for address in set(targets.values())}
+    try:
+        replayer = Replayer(TripRequestServiceStub(channels[targets["trip_request"]]),
+                            MatchingServiceStub(channels[targets["matching"]]),
+                            TripServiceStub(channels[targets["trip"]]), **kwargs)
+        return await replayer.run(records)
+    finally:
+        for channel in channels.values():
+            await channel.close()
+
+
+# -----------------------------
+# Report
+# -----------------------------
+def report(result: ReplayResult):
+    print(f"replayed {result.replayed} events  skipped {result.skipped or 0}  "
+          f"recorded span {result.span:.2f} s  replay {result.elapsed:.2f} s  mismatches {len(result.mismatches)}")
+    print(f"{'event':>20} {'count':>7} {'p50 ms':>9} {'p99 ms':>9} {'p999 ms':>9} {'max ms':>9}")
+    for name, hist in sorted(result.histograms.items()):
+        s = hist.summary()
+        print(f"{name:>20} {s['count']:7d} {s['p50'] * 1000:9.2f} {s['p99'] * 1000:9.2f} "
+              f"{s['p999'] * 1000:9.2f} {s['max'] * 1000:9.2f}")
+    for m in result.mismatches[:20]:
+        print(f"  MISMATCH {format_timestamp(m.ts)} {m.event_type} [{m.session}] {m.field}: "
+              f"recorded {m.expected!r}, replayed {m.actual!r}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded trip events and diff the responses")
+    parser.add_argument("inputs", nargs="+", help="log_event JSON line files and/or telemetry data dirs")
+    parser.add_argument("--speed", default="1", help="time compression factor, or 'max'")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="matching seed when none was recorded")
+    parser.add_argument("--target", help="host:port serving TripRequest, Matching and Trip, or 'services' "
+                                         "for their SERVICE_TARGETS addresses (default: in-process)")
+    parser.add_argument("--drivers", type=int, default=500, help="in-process: drivers in the index")
+    parser.add_argument("--namespace", default=None, help="passenger id prefix (default: a fresh one per run)")
+    parser.add_argument("--record", help="write the replay as log_event lines to this file")
+    args = parser.parse_args()
+
+    speed = None if args.speed == "max" else float(args.speed)
+    records = load_records(args.inputs)
+    namespace = args.namespace if args.namespace is not None else uuid.uuid4().hex[:8]
+
+    backend = None
+    if args.target == "services":
+        targets = {name: resolve_target(name) for name in REPLAYED_SERVICES}
+    else:
+        target = args.target
+        if target is None:
+            backend = InProcessBackend(args.drivers, seed=0)
+            target = backend.start()
+        targets = dict.fromkeys(REPLAYED_SERVICES, target)
+
+    recorded = []
+    try:
+        # In-process services print per request; keep that out of the report
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            result = asyncio.run(replay(targets, records, speed=speed, seed=args.seed, namespace=namespace,
+                                        record=recorded.append))
+    finally:
+        if backend is not None:
+            backend.stop()
+
+    if args.record:
+        with open(args.record, "w") as f:
+            # Sessions finish out of order; keep the file in timeline order
+            for entry in sorted(recorded, key=lambda entry: parse_timestamp(entry["timestamp"])):
+                f.write(json.dumps(entry) + "\n")
+    report(result)
+    sys.exit(1 if result.mismatches else 0)
@@ -0,0 +1,145 @@
+# workflow_concurrency.py
+# Threaded TripWorkflow vs AsyncTripWorkflow under concurrent load.
+#
+#   python benchmarks/workflow_concurrency.py --trips 2000 --concurrency 500 --latency-ms 20
+#
+# Both workflows run the same five-step saga against fake_services (every
+# RPC sleeps --latency-ms). The threaded run uses a ThreadPoolExecutor with
+# --concurrency workers; the async run uses one event loop with at most
+# --concurrency sagas in flight. Idempotency keys stay in process memory
+# (MemoryBackend) so only the gRPC path is measured; the async run's claims
+# still hop to a worker thread, as they would against Redis.
+# Throughput is only latency-bound with spare cores; on a single core both
+# runs are CPU-bound and the difference shows in threads held (one per
+# in-flight saga vs. a handful).
+#
+# --speculative-pricing quotes the route while matching runs: four
+# sequential RPC latencies per trip instead of five.
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from concurrent import futures
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../generated/python"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "../services/python"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "../workflow"))
+
+import grpc
+
+from trip_request_pb2_grpc import TripRequestServiceStub
+from matching_pb2_grpc import MatchingServiceStub
+from pricing_pb2_grpc import PricingServiceStub
+from driver_status_pb2_grpc import DriverStatusServiceStub
+from trip_service_pb2_grpc import TripServiceStub
+from telemetry_pb2_grpc import TelemetryServiceStub
+from common_pb2 import Location
+
+import trip_workflow_1
+from trip_workflow_async import AsyncTripWorkflow
+from idempotency import IdempotencyCache, MemoryBackend
+from driver_features import DriverFeatureStore   # fake backend has no QueryMetrics to feed it
+
+from fake_services import start_fake_backend
+
+
+def stubs(channel) -> list:
+    return [cls(channel) for cls in (TripRequestServiceStub, MatchingServiceStub, PricingServiceStub,
+                                     DriverStatusServiceStub, TripServiceStub)]
+
+
+def report(name: str, latencies: list, elapsed: float, failures: int, threads: int):
+    latencies = sorted(latencies)
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(f"{name:>9}: {len(latencies) / elapsed:8.1f} trips/s  "
+          f"p50 {p(0.50):7.1f} ms  p99 {p(0.99):7.1f} ms  mean {statistics.mean(latencies) * 1000:7.1f} ms  "
+          f"failed {failures}  peak threads {threads}")
+
+
+# -----------------------------
+# Threaded workflow
+# -----------------------------
+def run_threaded(target: str, trips: int, concurrency: int, speculative_pricing: bool = False):
+    channel = grpc.insecure_channel(target)
+    workflow = trip_workflow_1.TripWorkflow(*stubs(channel), TelemetryServiceStub(channel),
+                                            speculative_pricing=speculative_pricing,
+                                            idempotency=IdempotencyCache(MemoryBackend()),
+                                            driver_features=DriverFeatureStore())
+    origin, destination = Location(lat=40.28, lon=69.62), Location(lat=40.29, lon=69.63)
+    peak_threads = threading.active_count()
+
+    def one(_):
+        nonlocal peak_threads
+        start = time.perf_counter()
+        workflow.create_trip("passenger_1", origin, destination, str(uuid.uuid4()))
+        peak_threads = max(peak_threads, threading.active_count())
+        return time.perf_counter() - start
+
+    latencies, failures = [], 0
+    start = time.perf_counter()
+    with futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for f in [pool.submit(one, i) for i in range(trips)]:
+            try:
+                latencies.append(f.result())
+            except Exception:
+                failures += 1
+    elapsed = time.perf_counter() - start
+    workflow.close()
+    channel.close()
+    report("threaded", latencies, elapsed, failures, peak_threads)
+
+
+# -----------------------------
+# Async workflow
+# -----------------------------
+async def run_async(target: str, trips: int, concurrency: int, speculative_pricing: bool = False):
+    telemetry_channel = grpc.insecure_channel(target)
+    async with grpc.aio.insecure_channel(target) as channel:
+        workflow = AsyncTripWorkflow(*stubs(channel), TelemetryServiceStub(telemetry_channel),
+                                     idempotency=IdempotencyCache(MemoryBackend()),
+                                     speculative_pricing=speculative_pricing, driver_features=DriverFeatureStore())
+        origin, destination = Location(lat=40.28, lon=69.62), Location(lat=40.29, lon=69.63)
+        limit = asyncio.Semaphore(concurrency)
+        peak_threads = threading.active_count()
+
+        async def one():
+            nonlocal peak_threads
+            async with limit:
+                start = time.perf_counter()
+                await workflow.create_trip("passenger_1", origin, destination, str(uuid.uuid4()))
+                peak_threads = max(peak_threads, threading.active_count())
+                return time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(trips)), return_exceptions=True)
+        elapsed = time.perf_counter() - start
+    workflow.close()
+    telemetry_channel.close()
+    latencies = [r for r in results if not isinstance(r, BaseException)]
+    report("asyncio", latencies, elapsed, len(results) - len(latencies), peak_threads)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Threaded vs asyncio TripWorkflow throughput")
+    parser.add_argument("--trips", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--backend-processes", type=int, default=4)
+    parser.add_argument("--speculative-pricing", action="store_true", help="price concurrently with matching")
+    args = parser.parse_args()
+
+    backend, port = start_fake_backend(args.latency_ms / 1000, args.backend_processes)
+    target = f"localhost:{port}"
+    print(f"{args.trips} trips, {args.concurrency} concurrent, {args.latency_ms} ms per RPC, 5 RPCs per trip"
+          + (" (pricing speculative)" if args.speculative_pricing else ""))
+    try:
+        run_threaded(target, args.trips, args.concurrency, args.speculative_pricing)
+        asyncio.run(run_async(target, args.trips, args.concurrency, args.speculative_pricing))
+    finally:
+        for process in backend:
+            process.terminate()
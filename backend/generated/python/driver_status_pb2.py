@@ -26,7 +26,7 @@ from google.protobuf import timestamp_pb2 as google_dot_protobuf_dot_timestamp__
 import common_pb2 as common__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x13\x64river_status.proto\x12\x12\x64gdo.driver_status\x1a\x1fgoogle/protobuf/timestamp.proto\x1a\x0c\x63ommon.proto\"@\n\x0bVehicleInfo\x12\x0c\n\x04make\x18\x01 \x01(\t\x12\r\n\x05model\x18\x02 \x01(\t\x12\x14\n\x0cplate_number\x18\x03 \x01(\t\"\xa1\x02\n\x0c\x44riverStatus\x12\x11\n\tdriver_id\x18\x01 \x01(\t\x12\x14\n\x0cis_available\x18\x02 \x01(\x08\x12\x17\n\x0f\x63urrent_trip_id\x18\x03 \x01(\t\x12/\n\x10\x63urrent_location\x18\x04 \x01(\x0b\x32\x15.dgdo.common.Location\x12-\n\tlast_seen\x18\x05 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12\x35\n\x0cvehicle_info\x18\x06 \x01(\x0b\x32\x1f.dgdo.driver_status.VehicleInfo\x12\x0f\n\x07version\x18\x07 \x01(\x05\x12\'\n\x08metadata\x18\x08 \x01(\x0b\x32\x15.dgdo.common.Metadata\"\xa8\x01\n\x19UpdateDriverStatusRequest\x12\x11\n\tdriver_id\x18\x01 \x01(\t\x12\x14\n\x0cis_available\x18\x02 \x01(\x08\x12/\n\x10\x63urrent_location\x18\x03 \x01(\x0b\x32\x15.dgdo.common.Location\x12\x17\n\x0fidempotency_key\x18\x04 \x01(\t\x12\x18\n\x10\x65xpected_version\x18\x05 \x01(\x05\"Z\n\x1aGetAvailableDriversRequest\x12\'\n\x08location\x18\x01 \x01(\x0b\x32\x15.dgdo.common.Location\x12\x13\n\x0bmax_results\x18\x02 \x01(\r2\xe7\x01\n\x13\x44riverStatusService\x12\x65\n\x12UpdateDriverStatus\x12-.dgdo.driver_status.UpdateDriverStatusRequest\x1a .dgdo.driver_status.DriverStatus\x12i\n\x13GetAvailableDrivers\x12..dgdo.driver_status.GetAvailableDriversRequest\x1a .dgdo.driver_status.DriverStatus0\x01\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x13\x64river_status.proto\x12\x12\x64gdo.driver_status\x1a\x1fgoogle/protobuf/timestamp.proto\x1a\x0c\x63ommon.proto\"@\n\x0bVehicleInfo\x12\x0c\n\x04make\x18\x01 \x01(\t\x12\r\n\x05model\x18\x02 \x01(\t\x12\x14\n\x0cplate_number\x18\x03 \x01(\t\"\xa1\x02\n\x0c\x44riverStatus\x12\x11\n\tdriver_id\x18\x01 \x01(\t\x12\x14\n\x0cis_available\x18\x02 \x01(\x08\x12\x17\n\x0f\x63urrent_trip_id\x18\x03 \x01(\t\x12/\n\x10\x63urrent_location\x18\x04 \x01(\x0b\x32\x15.dgdo.common.Location\x12-\n\tlast_seen\x18\x05 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12\x35\n\x0cvehicle_info\x18\x06 \x01(\x0b\x32\x1f.dgdo.driver_status.VehicleInfo\x12\x0f\n\x07version\x18\x07 \x01(\x05\x12\'\n\x08metadata\x18\x08 \x01(\x0b\x32\x15.dgdo.common.Metadata\"\xa8\x01\n\x19UpdateDriverStatusRequest\x12\x11\n\tdriver_id\x18\x01 \x01(\t\x12\x14\n\x0cis_available\x18\x02 \x01(\x08\x12/\n\x10\x63urrent_location\x18\x03 \x01(\x0b\x32\x15.dgdo.common.Location\x12\x17\n\x0fidempotency_key\x18\x04 \x01(\t\x12\x18\n\x10\x65xpected_version\x18\x05 \x01(\x05\"Z\n\x1aGetAvailableDriversRequest\x12\'\n\x08location\x18\x01 \x01(\x0b\x32\x15.dgdo.common.Location\x12\x13\n\x0bmax_results\x18\x02 \x01(\r\"\x92\x01\n\x12\x44riverLocationPing\x12\x11\n\tdriver_id\x18\x01 \x01(\t\x12\'\n\x08location\x18\x02 \x01(\x0b\x32\x15.dgdo.common.Location\x12-\n\ttimestamp\x18\x03 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12\x11\n\tspeed_mps\x18\x04 \x01(\x01\"g\n\x1cStreamDriverLocationsSummary\x12\x16\n\x0epings_received\x18\x01 \x01(\x04\x12\x16\n\x0epings_rejected\x18\x02 \x01(\x04\x12\x17\n\x0f\x64rivers_updated\x18\x03 \x01(\x04\"3\n\x1cWatchAvailableDriversRequest\x12\x13\n\x0bmax_seconds\x18\x01 \x01(\r2\xcb\x03\n\x13\x44riverStatusService\x12\x65\n\x12UpdateDriverStatus\x12-.dgdo.driver_status.UpdateDriverStatusRequest\x1a .dgdo.driver_status.DriverStatus\x12i\n\x13GetAvailableDrivers\x12..dgdo.driver_status.GetAvailableDriversRequest\x1a .dgdo.driver_status.DriverStatus0\x01\x12s\n\x15StreamDriverLocations\x12&.dgdo.driver_status.DriverLocationPing\x1a\x30.dgdo.driver_status.StreamDriverLocationsSummary(\x01\x12m\n\x15WatchAvailableDrivers\x12\x30.dgdo.driver_status.WatchAvailableDriversRequest\x1a .dgdo.driver_status.DriverStatus0\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -41,6 +41,12 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_UPDATEDRIVERSTATUSREQUEST']._serialized_end=617
   _globals['_GETAVAILABLEDRIVERSREQUEST']._serialized_start=619
   _globals['_GETAVAILABLEDRIVERSREQUEST']._serialized_end=709
-  _globals['_DRIVERSTATUSSERVICE']._serialized_start=712
-  _globals['_DRIVERSTATUSSERVICE']._serialized_end=943
+  _globals['_DRIVERLOCATIONPING']._serialized_start=712
+  _globals['_DRIVERLOCATIONPING']._serialized_end=858
+  _globals['_STREAMDRIVERLOCATIONSSUMMARY']._serialized_start=860
+  _globals['_STREAMDRIVERLOCATIONSSUMMARY']._serialized_end=963
+  _globals['_WATCHAVAILABLEDRIVERSREQUEST']._serialized_start=965
+  _globals['_WATCHAVAILABLEDRIVERSREQUEST']._serialized_end=1016
+  _globals['_DRIVERSTATUSSERVICE']._serialized_start=1019
+  _globals['_DRIVERSTATUSSERVICE']._serialized_end=1478
 # @@protoc_insertion_point(module_scope)
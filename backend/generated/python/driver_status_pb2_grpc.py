@@ -47,6 +47,16 @@ class DriverStatusServiceStub(object):
                 request_serializer=driver__status__pb2.GetAvailableDriversRequest.SerializeToString,
                 response_deserializer=driver__status__pb2.DriverStatus.FromString,
                 _registered_method=True)
+        self.StreamDriverLocations = channel.stream_unary(
+                '/dgdo.driver_status.DriverStatusService/StreamDriverLocations',
+                request_serializer=driver__status__pb2.DriverLocationPing.SerializeToString,
+                response_deserializer=driver__status__pb2.StreamDriverLocationsSummary.FromString,
+                _registered_method=True)
+        self.WatchAvailableDrivers = channel.unary_stream(
+                '/dgdo.driver_status.DriverStatusService/WatchAvailableDrivers',
+                request_serializer=driver__status__pb2.WatchAvailableDriversRequest.SerializeToString,
+                response_deserializer=driver__status__pb2.DriverStatus.FromString,
+                _registered_method=True)
 
 
 class DriverStatusServiceServicer(object):
@@ -67,6 +77,22 @@ class DriverStatusServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def StreamDriverLocations(self, request_iterator, context):
+        """Many drivers multiplexed over one stream (e.g. from a gateway);
+        only the latest ping per driver per tick reaches the index
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def WatchAvailableDrivers(self, request, context):
+        """One DriverStatus (is_available, current_location) each time an
+        available driver enters a grid cell, e.g. to wake queued requests
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_DriverStatusServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -80,6 +106,16 @@ def add_DriverStatusServiceServicer_to_server(servicer, server):
                     request_deserializer=driver__status__pb2.GetAvailableDriversRequest.FromString,
                     response_serializer=driver__status__pb2.DriverStatus.SerializeToString,
             ),
+            'StreamDriverLocations': grpc.stream_unary_rpc_method_handler(
+                    servicer.StreamDriverLocations,
+                    request_deserializer=driver__status__pb2.DriverLocationPing.FromString,
+                    response_serializer=driver__status__pb2.StreamDriverLocationsSummary.SerializeToString,
+            ),
+            'WatchAvailableDrivers': grpc.unary_stream_rpc_method_handler(
+                    servicer.WatchAvailableDrivers,
+                    request_deserializer=driver__status__pb2.WatchAvailableDriversRequest.FromString,
+                    response_serializer=driver__status__pb2.DriverStatus.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'dgdo.driver_status.DriverStatusService', rpc_method_handlers)
@@ -147,3 +183,57 @@ class DriverStatusService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def StreamDriverLocations(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(
+            request_iterator,
+            target,
+            '/dgdo.driver_status.DriverStatusService/StreamDriverLocations',
+            driver__status__pb2.DriverLocationPing.SerializeToString,
+            driver__status__pb2.StreamDriverLocationsSummary.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def WatchAvailableDrivers(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/dgdo.driver_status.DriverStatusService/WatchAvailableDrivers',
+            driver__status__pb2.WatchAvailableDriversRequest.SerializeToString,
+            driver__status__pb2.DriverStatus.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -40,7 +40,7 @@ class MLFeedbackServiceStub(object):
         self.SendFeedback = channel.unary_unary(
                 '/dgdo.ml_feedback.MLFeedbackService/SendFeedback',
                 request_serializer=ml__feedback__pb2.Feedback.SerializeToString,
-                response_deserializer=ml__feedback__pb2.Feedback.FromString,
+                response_deserializer=ml__feedback__pb2.FeedbackAck.FromString,
                 _registered_method=True)
         self.GetTrainingBatch = channel.unary_stream(
                 '/dgdo.ml_feedback.MLFeedbackService/GetTrainingBatch',
@@ -56,7 +56,7 @@ class MLFeedbackServiceServicer(object):
     """
 
     def SendFeedback(self, request, context):
-        """Send feedback after trip completion
+        """Send feedback after trip completion; idempotent per trip_request_id
         """
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
@@ -75,7 +75,7 @@ def add_MLFeedbackServiceServicer_to_server(servicer, server):
             'SendFeedback': grpc.unary_unary_rpc_method_handler(
                     servicer.SendFeedback,
                     request_deserializer=ml__feedback__pb2.Feedback.FromString,
-                    response_serializer=ml__feedback__pb2.Feedback.SerializeToString,
+                    response_serializer=ml__feedback__pb2.FeedbackAck.SerializeToString,
             ),
             'GetTrainingBatch': grpc.unary_stream_rpc_method_handler(
                     servicer.GetTrainingBatch,
@@ -112,7 +112,7 @@ class MLFeedbackService(object):
             target,
             '/dgdo.ml_feedback.MLFeedbackService/SendFeedback',
             ml__feedback__pb2.Feedback.SerializeToString,
-            ml__feedback__pb2.Feedback.FromString,
+            ml__feedback__pb2.FeedbackAck.FromString,
             options,
             channel_credentials,
             insecure,
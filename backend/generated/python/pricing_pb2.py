@@ -22,17 +22,25 @@ _runtime_version.ValidateProtobufRuntimeVersion(
 _sym_db = _symbol_database.Default()
 
 
+import common_pb2 as common__pb2
+from google.protobuf import timestamp_pb2 as google_dot_protobuf_dot_timestamp__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rpricing.proto\x12\x0c\x64gdo.pricing\"x\n\x04\x46\x61re\x12\x0f\n\x07trip_id\x18\x01 \x01(\t\x12\x11\n\tbase_fare\x18\x02 \x01(\x01\x12\x10\n\x08\x64istance\x18\x03 \x01(\x01\x12\x0c\n\x04time\x18\x04 \x01(\x01\x12\x18\n\x10surge_multiplier\x18\x05 \x01(\x01\x12\x12\n\nfinal_fare\x18\x06 \x01(\x01\x32\x82\x01\n\x0ePricingService\x12\x37\n\rCalculateFare\x12\x12.dgdo.pricing.Fare\x1a\x12.dgdo.pricing.Fare\x12\x37\n\rApplyDiscount\x12\x12.dgdo.pricing.Fare\x1a\x12.dgdo.pricing.Fareb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rpricing.proto\x12\x0c\x64gdo.pricing\x1a\x0c\x63ommon.proto\x1a\x1fgoogle/protobuf/timestamp.proto\"\xdb\x03\n\x17PriceCalculationRequest\x12\x17\n\x0ftrip_request_id\x18\x01 \x01(\t\x12\x14\n\x0cpassenger_id\x18\x02 \x01(\t\x12\x19\n\x11matched_driver_id\x18\x03 \x01(\t\x12%\n\x06origin\x18\x04 \x01(\x0b\x32\x15.dgdo.common.Location\x12*\n\x0b\x64\x65stination\x18\x05 \x01(\x0b\x32\x15.dgdo.common.Location\x12\x30\n\x0crequest_time\x18\x06 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12!\n\x19\x65stimated_distance_meters\x18\x07 \x01(\x05\x12\"\n\x1a\x65stimated_duration_seconds\x18\x08 \x01(\x05\x12\x19\n\x11\x64\x65mand_multiplier\x18\t \x01(\x01\x12\x19\n\x11supply_multiplier\x18\n \x01(\x01\x12\x1e\n\x16\x64river_acceptance_rate\x18\x0b \x01(\x01\x12\x15\n\rdriver_rating\x18\x0c \x01(\x01\x12\x14\n\x0cpricing_seed\x18\r \x01(\x03\x12\'\n\x08metadata\x18\x0e \x01(\x0b\x32\x15.dgdo.common.Metadata\"\xb4\x06\n\x18PriceCalculationResponse\x12\x17\n\x0ftrip_request_id\x18\x01 \x01(\t\x12\x16\n\x0e\x63\x61lculation_id\x18\x02 \x01(\t\x12\x1c\n\x14passenger_fare_total\x18\x03 \x01(\x01\x12\x1b\n\x13\x64river_payout_total\x18\x04 \x01(\x01\x12\x1b\n\x13platform_commission\x18\x05 \x01(\x01\x12Q\n\x13passenger_breakdown\x18\x06 \x01(\x0b\x32\x34.dgdo.pricing.PriceCalculationResponse.FareBreakdown\x12N\n\x10\x64river_breakdown\x18\x07 \x01(\x0b\x32\x34.dgdo.pricing.PriceCalculationResponse.FareBreakdown\x12!\n\x19\x65stimated_distance_meters\x18\x08 \x01(\x01\x12\"\n\x1a\x65stimated_duration_seconds\x18\t \x01(\x01\x12$\n\x1c\x64\x65mand_multiplier_at_request\x18\n \x01(\x01\x12\x1d\n\x15pricing_model_version\x18\x0b \x01(\t\x12\x14\n\x0cpricing_tier\x18\x0c \x01(\t\x12\x34\n\x10price_expires_at\x18\r \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12\x31\n\rcalculated_at\x18\x0e \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12\x33\n\x14\x63\x61lculation_metadata\x18\x0f \x01(\x0b\x32\x15.dgdo.common.Metadata\x1a\xab\x01\n\rFareBreakdown\x12\x11\n\tbase_fare\x18\x01 \x01(\x01\x12\x15\n\rdistance_fare\x18\x02 \x01(\x01\x12\x11\n\ttime_fare\x18\x03 \x01(\x01\x12\x18\n\x10surge_multiplier\x18\x04 \x01(\x01\x12\x1e\n\x16\x63\x61ncellation_surcharge\x18\x05 \x01(\x01\x12\x12\n\nsafety_fee\x18\x06 \x01(\x01\x12\x0f\n\x07vat_tax\x18\x07 \x01(\x01\"\xeb\x01\n\x15\x46\x61llbackPricingConfig\x12\x15\n\rbase_rate_kzt\x18\x01 \x01(\x01\x12\x1a\n\x12per_meter_rate_kzt\x18\x02 \x01(\x01\x12\x1b\n\x13per_second_rate_kzt\x18\x03 \x01(\x01\x12\x18\n\x10minimum_fare_kzt\x18\x04 \x01(\x01\x12 \n\x18platform_commission_rate\x18\x05 \x01(\x01\x12\x16\n\x0e\x63onfig_version\x18\x06 \x01(\t\x12.\n\nvalid_from\x18\x07 \x01(\x0b\x32\x1a.google.protobuf.Timestamp2\xb2\x02\n\x0ePricingService\x12_\n\x0e\x43\x61lculatePrice\x12%.dgdo.pricing.PriceCalculationRequest\x1a&.dgdo.pricing.PriceCalculationResponse\x12]\n\x11GetFallbackConfig\x12#.dgdo.pricing.FallbackPricingConfig\x1a#.dgdo.pricing.FallbackPricingConfig\x12`\n\x14UpdateFallbackConfig\x12#.dgdo.pricing.FallbackPricingConfig\x1a#.dgdo.pricing.FallbackPricingConfigb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'pricing_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
-  _globals['_FARE']._serialized_start=31
-  _globals['_FARE']._serialized_end=151
-  _globals['_PRICINGSERVICE']._serialized_start=154
-  _globals['_PRICINGSERVICE']._serialized_end=284
+  _globals['_PRICECALCULATIONREQUEST']._serialized_start=79
+  _globals['_PRICECALCULATIONREQUEST']._serialized_end=554
+  _globals['_PRICECALCULATIONRESPONSE']._serialized_start=557
+  _globals['_PRICECALCULATIONRESPONSE']._serialized_end=1377
+  _globals['_PRICECALCULATIONRESPONSE_FAREBREAKDOWN']._serialized_start=1206
+  _globals['_PRICECALCULATIONRESPONSE_FAREBREAKDOWN']._serialized_end=1377
+  _globals['_FALLBACKPRICINGCONFIG']._serialized_start=1380
+  _globals['_FALLBACKPRICINGCONFIG']._serialized_end=1615
+  _globals['_PRICINGSERVICE']._serialized_start=1618
+  _globals['_PRICINGSERVICE']._serialized_end=1924
 # @@protoc_insertion_point(module_scope)
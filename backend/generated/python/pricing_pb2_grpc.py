@@ -26,7 +26,9 @@ if _version_not_supported:
 
 
 class PricingServiceStub(object):
-    """Pricing service
+    """---------------------------------------------------------------
+    SERVICE DEFINITION
+    ---------------------------------------------------------------
     """
 
     def __init__(self, channel):
@@ -35,30 +37,46 @@ class PricingServiceStub(object):
         Args:
             channel: A grpc.Channel.
         """
-        self.CalculateFare = channel.unary_unary(
-                '/dgdo.pricing.PricingService/CalculateFare',
-                request_serializer=pricing__pb2.Fare.SerializeToString,
-                response_deserializer=pricing__pb2.Fare.FromString,
+        self.CalculatePrice = channel.unary_unary(
+                '/dgdo.pricing.PricingService/CalculatePrice',
+                request_serializer=pricing__pb2.PriceCalculationRequest.SerializeToString,
+                response_deserializer=pricing__pb2.PriceCalculationResponse.FromString,
                 _registered_method=True)
-        self.ApplyDiscount = channel.unary_unary(
-                '/dgdo.pricing.PricingService/ApplyDiscount',
-                request_serializer=pricing__pb2.Fare.SerializeToString,
-                response_deserializer=pricing__pb2.Fare.FromString,
+        self.GetFallbackConfig = channel.unary_unary(
+                '/dgdo.pricing.PricingService/GetFallbackConfig',
+                request_serializer=pricing__pb2.FallbackPricingConfig.SerializeToString,
+                response_deserializer=pricing__pb2.FallbackPricingConfig.FromString,
+                _registered_method=True)
+        self.UpdateFallbackConfig = channel.unary_unary(
+                '/dgdo.pricing.PricingService/UpdateFallbackConfig',
+                request_serializer=pricing__pb2.FallbackPricingConfig.SerializeToString,
+                response_deserializer=pricing__pb2.FallbackPricingConfig.FromString,
                 _registered_method=True)
 
 
 class PricingServiceServicer(object):
-    """Pricing service
+    """---------------------------------------------------------------
+    SERVICE DEFINITION
+    ---------------------------------------------------------------
     """
 
-    def CalculateFare(self, request, context):
-        """Missing associated documentation comment in .proto file."""
+    def CalculatePrice(self, request, context):
+        """Core pricing operation - must be deterministic and idempotent
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetFallbackConfig(self, request, context):
+        """Fallback mechanism for system degradation
+        """
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
-    def ApplyDiscount(self, request, context):
-        """Missing associated documentation comment in .proto file."""
+    def UpdateFallbackConfig(self, request, context):
+        """Admin operations (versioned, audited)
+        """
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
@@ -66,15 +84,20 @@ class PricingServiceServicer(object):
 
 def add_PricingServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
-            'CalculateFare': grpc.unary_unary_rpc_method_handler(
-                    servicer.CalculateFare,
-                    request_deserializer=pricing__pb2.Fare.FromString,
-                    response_serializer=pricing__pb2.Fare.SerializeToString,
+            'CalculatePrice': grpc.unary_unary_rpc_method_handler(
+                    servicer.CalculatePrice,
+                    request_deserializer=pricing__pb2.PriceCalculationRequest.FromString,
+                    response_serializer=pricing__pb2.PriceCalculationResponse.SerializeToString,
             ),
-            'ApplyDiscount': grpc.unary_unary_rpc_method_handler(
-                    servicer.ApplyDiscount,
-                    request_deserializer=pricing__pb2.Fare.FromString,
-                    response_serializer=pricing__pb2.Fare.SerializeToString,
+            'GetFallbackConfig': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetFallbackConfig,
+                    request_deserializer=pricing__pb2.FallbackPricingConfig.FromString,
+                    response_serializer=pricing__pb2.FallbackPricingConfig.SerializeToString,
+            ),
+            'UpdateFallbackConfig': grpc.unary_unary_rpc_method_handler(
+                    servicer.UpdateFallbackConfig,
+                    request_deserializer=pricing__pb2.FallbackPricingConfig.FromString,
+                    response_serializer=pricing__pb2.FallbackPricingConfig.SerializeToString,
             ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
@@ -85,11 +108,40 @@ def add_PricingServiceServicer_to_server(servicer, server):
 
  # This class is part of an EXPERIMENTAL API.
 class PricingService(object):
-    """Pricing service
+    """---------------------------------------------------------------
+    SERVICE DEFINITION
+    ---------------------------------------------------------------
     """
 
     @staticmethod
-    def CalculateFare(request,
+    def CalculatePrice(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/dgdo.pricing.PricingService/CalculatePrice',
+            pricing__pb2.PriceCalculationRequest.SerializeToString,
+            pricing__pb2.PriceCalculationResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetFallbackConfig(request,
             target,
             options=(),
             channel_credentials=None,
@@ -102,9 +154,9 @@ class PricingService(object):
         return grpc.experimental.unary_unary(
             request,
             target,
-            '/dgdo.pricing.PricingService/CalculateFare',
-            pricing__pb2.Fare.SerializeToString,
-            pricing__pb2.Fare.FromString,
+            '/dgdo.pricing.PricingService/GetFallbackConfig',
+            pricing__pb2.FallbackPricingConfig.SerializeToString,
+            pricing__pb2.FallbackPricingConfig.FromString,
             options,
             channel_credentials,
             insecure,
@@ -116,7 +168,7 @@ class PricingService(object):
             _registered_method=True)
 
     @staticmethod
-    def ApplyDiscount(request,
+    def UpdateFallbackConfig(request,
             target,
             options=(),
             channel_credentials=None,
@@ -129,9 +181,9 @@ class PricingService(object):
         return grpc.experimental.unary_unary(
             request,
             target,
-            '/dgdo.pricing.PricingService/ApplyDiscount',
-            pricing__pb2.Fare.SerializeToString,
-            pricing__pb2.Fare.FromString,
+            '/dgdo.pricing.PricingService/UpdateFallbackConfig',
+            pricing__pb2.FallbackPricingConfig.SerializeToString,
+            pricing__pb2.FallbackPricingConfig.FromString,
             options,
             channel_credentials,
             insecure,
@@ -26,7 +26,7 @@ from google.protobuf import timestamp_pb2 as google_dot_protobuf_dot_timestamp__
 import common_pb2 as common__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0ftelemetry.proto\x12\x0e\x64gdo.telemetry\x1a\x1fgoogle/protobuf/timestamp.proto\x1a\x0c\x63ommon.proto\"\xa4\x01\n\x0eTelemetryEvent\x12\x12\n\nevent_type\x18\x01 \x01(\t\x12-\n\ttimestamp\x18\x02 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12\x11\n\tentity_id\x18\x03 \x01(\t\x12\'\n\x08metadata\x18\x04 \x01(\x0b\x32\x15.dgdo.common.Metadata\x12\x13\n\x0breason_code\x18\x05 \x01(\t2\xa7\x01\n\x10TelemetryService\x12J\n\x08LogEvent\x12\x1e.dgdo.telemetry.TelemetryEvent\x1a\x1e.dgdo.telemetry.TelemetryEvent\x12G\n\x0cQueryMetrics\x12\x15.dgdo.common.Metadata\x1a\x1e.dgdo.telemetry.TelemetryEvent0\x01\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0ftelemetry.proto\x12\x0e\x64gdo.telemetry\x1a\x1fgoogle/protobuf/timestamp.proto\x1a\x0c\x63ommon.proto\"\xa4\x01\n\x0eTelemetryEvent\x12\x12\n\nevent_type\x18\x01 \x01(\t\x12-\n\ttimestamp\x18\x02 \x01(\x0b\x32\x1a.google.protobuf.Timestamp\x12\x11\n\tentity_id\x18\x03 \x01(\t\x12\'\n\x08metadata\x18\x04 \x01(\x0b\x32\x15.dgdo.common.Metadata\x12\x13\n\x0breason_code\x18\x05 \x01(\t\"2\n\x0cLogEventsAck\x12\x10\n\x08\x61\x63\x63\x65pted\x18\x01 \x01(\x04\x12\x10\n\x08rejected\x18\x02 \x01(\x04\x32\xf4\x01\n\x10TelemetryService\x12J\n\x08LogEvent\x12\x1e.dgdo.telemetry.TelemetryEvent\x1a\x1e.dgdo.telemetry.TelemetryEvent\x12K\n\tLogEvents\x12\x1e.dgdo.telemetry.TelemetryEvent\x1a\x1c.dgdo.telemetry.LogEventsAck(\x01\x12G\n\x0cQueryMetrics\x12\x15.dgdo.common.Metadata\x1a\x1e.dgdo.telemetry.TelemetryEvent0\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -35,6 +35,8 @@ if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
   _globals['_TELEMETRYEVENT']._serialized_start=83
   _globals['_TELEMETRYEVENT']._serialized_end=247
-  _globals['_TELEMETRYSERVICE']._serialized_start=250
-  _globals['_TELEMETRYSERVICE']._serialized_end=417
+  _globals['_LOGEVENTSACK']._serialized_start=249
+  _globals['_LOGEVENTSACK']._serialized_end=299
+  _globals['_TELEMETRYSERVICE']._serialized_start=302
+  _globals['_TELEMETRYSERVICE']._serialized_end=546
 # @@protoc_insertion_point(module_scope)
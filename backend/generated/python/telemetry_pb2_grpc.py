@@ -41,6 +41,11 @@ class TelemetryServiceStub(object):
                 request_serializer=telemetry__pb2.TelemetryEvent.SerializeToString,
                 response_deserializer=telemetry__pb2.TelemetryEvent.FromString,
                 _registered_method=True)
+        self.LogEvents = channel.stream_unary(
+                '/dgdo.telemetry.TelemetryService/LogEvents',
+                request_serializer=telemetry__pb2.TelemetryEvent.SerializeToString,
+                response_deserializer=telemetry__pb2.LogEventsAck.FromString,
+                _registered_method=True)
         self.QueryMetrics = channel.unary_stream(
                 '/dgdo.telemetry.TelemetryService/QueryMetrics',
                 request_serializer=common__pb2.Metadata.SerializeToString,
@@ -58,6 +63,12 @@ class TelemetryServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def LogEvents(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def QueryMetrics(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -72,6 +83,11 @@ def add_TelemetryServiceServicer_to_server(servicer, server):
                     request_deserializer=telemetry__pb2.TelemetryEvent.FromString,
                     response_serializer=telemetry__pb2.TelemetryEvent.SerializeToString,
             ),
+            'LogEvents': grpc.stream_unary_rpc_method_handler(
+                    servicer.LogEvents,
+                    request_deserializer=telemetry__pb2.TelemetryEvent.FromString,
+                    response_serializer=telemetry__pb2.LogEventsAck.SerializeToString,
+            ),
             'QueryMetrics': grpc.unary_stream_rpc_method_handler(
                     servicer.QueryMetrics,
                     request_deserializer=common__pb2.Metadata.FromString,
@@ -116,6 +132,33 @@ class TelemetryService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def LogEvents(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(
+            request_iterator,
+            target,
+            '/dgdo.telemetry.TelemetryService/LogEvents',
+            telemetry__pb2.TelemetryEvent.SerializeToString,
+            telemetry__pb2.LogEventsAck.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def QueryMetrics(request,
             target,
@@ -0,0 +1,114 @@
+# dedupe_cache.py
+# TTL-bounded, memory-capped idempotency cache.
+#
+# Keys live in a fixed number of time buckets. Writes go to the newest
+# bucket; when a bucket's time slice is over (or it is full) a fresh bucket
+# is pushed and the oldest one is dropped wholesale. Expiry therefore costs
+# nothing per key, and memory never exceeds buckets * max_per_bucket entries.
+#
+# reserve() marks a key in flight before the guarded write runs, so a
+# concurrent duplicate waits for put() (and gets the committed value)
+# instead of racing the write itself.
+
+import threading
+import time
+from collections import deque
+
+# -----------------------------
+# Defaults
+# -----------------------------
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_BUCKETS = 10
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_WAIT_SECONDS = 5.0
+
+
+class DedupeCache:
+
+    def __init__(self, ttl_seconds: float = DEFAULT_TTL_SECONDS, buckets: int = DEFAULT_BUCKETS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, clock=time.monotonic):
+        self.num_buckets = buckets
+        self.bucket_seconds = ttl_seconds / buckets
+        self.max_per_bucket = max(1, max_entries // buckets)
+        self.clock = clock
+        self.lock = threading.Lock()
+
+        self.buckets = deque([{}])
+        self.bucket_started = clock()
+        self.inflight = {}   # key -> Event set by put() / release()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        with self.lock:
+            return sum(len(b) for b in self.buckets)
+
+    def _push_bucket(self):
+        self.buckets.append({})
+        if len(self.buckets) > self.num_buckets:
+            self.buckets.popleft()
+
+    def _rotate(self):
+        """Advance past every bucket slice that has elapsed since the last call."""
+        elapsed = int((self.clock() - self.bucket_started) / self.bucket_seconds)
+        if elapsed <= 0:
+            return
+        for _ in range(min(elapsed, self.num_buckets)):
+            self._push_bucket()
+        self.bucket_started += elapsed * self.bucket_seconds
+
+    def _lookup(self, key):
+        self._rotate()
+        for bucket in reversed(self.buckets):
+            value = bucket.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def get(self, key):
+        """Return the value stored for key, or None if unseen or expired."""
+        with self.lock:
+            return self._lookup(key)
+
+    def reserve(self, key, timeout: float = DEFAULT_WAIT_SECONDS):
+        """
+        Returns (True, None) when the caller now owns key and must finish with
+        put() or release(); (False, value) when key is already committed; and
+        (False, None) when another owner still holds it after timeout.
+        """
+        deadline = self.clock() + timeout
+        while True:
+            with self.lock:
+                value = self._lookup(key)
+                if value is not None:
+                    return False, value
+                event = self.inflight.get(key)
+                if event is None:
+                    self.inflight[key] = threading.Event()
+                    return True, None
+            if not event.wait(max(0.0, deadline - self.clock())):
+                return False, None
+
+    def release(self, key):
+        """Give up a reservation without storing anything; waiters retry."""
+        with self.lock:
+            event = self.inflight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def put(self, key, value):
+        """
+        Store value for key. A full newest bucket is rotated early, which
+        shortens the effective TTL under load instead of growing memory.
+        """
+        with self.lock:
+            self._rotate()
+            if len(self.buckets[-1]) >= self.max_per_bucket:
+                self._push_bucket()
+            self.buckets[-1][key] = value
+            event = self.inflight.pop(key, None)
+        if event is not None:
+            event.set()
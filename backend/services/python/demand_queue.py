@@ -0,0 +1,257 @@
+# demand_queue.py
+# Cold-start queue: trip requests that found no driver wait here until
+# supply appears near them (domain law 1.4: persist and queue, no
+# synchronous retries or busy-waiting).
+#
+# Pending requests are bucketed by the same lat/lon grid as DriverIndex.
+# on_driver_available(driver_id, lat, lon) (a DriverIndex listener, or any
+# other availability feed) only marks the driver's cell as woken. A worker
+# thread coalesces wakeups for batch_window seconds, then hands rematch()
+# one batch: the oldest requests in and around the woken cells, at most
+# per_driver per newly available driver. Requests rematch() returns are
+# still unmatched and go back in the queue with their original position.
+# Requests older than max_wait are dropped through on_expired().
+#
+# Outside the DriverStatusService process, AvailabilityFeed feeds the queue
+# from the WatchAvailableDrivers stream, reconnecting whenever it ends.
+
+import logging
+import math
+import threading
+import time
+from collections import namedtuple
+
+import grpc
+
+from driver_status_pb2 import WatchAvailableDriversRequest
+
+from driver_index import DEFAULT_CELL_DEG
+
+# -----------------------------
+# Defaults
+# -----------------------------
+DEFAULT_RADIUS_CELLS = 1              # also wake requests in the 8 neighbouring cells
+DEFAULT_REQUESTS_PER_DRIVER = 2       # re-match attempts per arriving driver
+DEFAULT_BATCH_WINDOW_SECONDS = 0.2
+DEFAULT_MAX_WAIT_SECONDS = 300.0
+EXPIRY_CHECK_SECONDS = 1.0
+DEFAULT_WATCH_SECONDS = 60            # per WatchAvailableDrivers stream before reconnecting
+WATCH_TIMEOUT_MARGIN_SECONDS = 5.0    # client deadline past the server's own cut-off
+DEFAULT_WATCH_RETRY_SECONDS = 1.0
+
+PendingRequest = namedtuple("PendingRequest", ["request_id", "lat", "lon", "cell", "enqueued_at", "payload"])
+
+
+class NoDriversAvailable(Exception):
+    """Matching returned no candidates."""
+
+
+class DemandQueue:
+
+    def __init__(self, rematch, cell_deg: float = DEFAULT_CELL_DEG, radius_cells: int = DEFAULT_RADIUS_CELLS,
+                 per_driver: int = DEFAULT_REQUESTS_PER_DRIVER,
+                 batch_window: float = DEFAULT_BATCH_WINDOW_SECONDS, max_wait: float = DEFAULT_MAX_WAIT_SECONDS,
+                 on_expired=None, clock=time.monotonic):
+        """
+        rematch(batch) -> the PendingRequests still unmatched; on_expired(request)
+        is called for each request that waited longer than max_wait.
+        """
+        self.rematch = rematch
+        self.on_expired = on_expired
+        self.cell_deg = cell_deg
+        self.radius_cells = radius_cells
+        self.per_driver = per_driver
+        self.batch_window = batch_window
+        self.max_wait = max_wait
+        self.clock = clock
+
+        self.lock = threading.Lock()
+        self.pending = {}    # request_id -> PendingRequest
+        self.cells = {}      # cell -> {request_id: PendingRequest}, insertion-ordered
+        self.woken = {}      # cell -> drivers that became available there since the last batch
+        self.wakeup = threading.Event()
+        self.closed = False
+        self.thread = None
+
+        # Counters (for monitoring)
+        self.matched = 0
+        self.expired = 0
+
+    def __len__(self):
+        with self.lock:
+            return len(self.pending)
+
+    def cell_key(self, lat: float, lon: float):
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    # -----------------------------
+    # Queue
+    # -----------------------------
+    def _insert(self, request: PendingRequest):
+        self.pending[request.request_id] = request
+        self.cells.setdefault(request.cell, {})[request.request_id] = request
+
+    def _remove(self, request_id: str):
+        request = self.pending.pop(request_id, None)
+        if request is not None:
+            members = self.cells[request.cell]
+            del members[request_id]
+            if not members:
+                del self.cells[request.cell]
+        return request
+
+    def add(self, request_id: str, lat: float, lon: float, payload=None) -> int:
+        """Queue a request (re-adding an id replaces it); returns the queue length."""
+        with self.lock:
+            self._remove(request_id)
+            self._insert(PendingRequest(request_id, lat, lon, self.cell_key(lat, lon), self.clock(), payload))
+            return len(self.pending)
+
+    def remove(self, request_id: str):
+        """Withdraw a request (e.g. the passenger cancelled); returns it or None."""
+        with self.lock:
+            return self._remove(request_id)
+
+    # -----------------------------
+    # Wakeups and batches
+    # -----------------------------
+    def on_driver_available(self, driver_id: str, lat: float, lon: float):
+        with self.lock:
+            cell = self.cell_key(lat, lon)
+            self.woken[cell] = self.woken.get(cell, 0) + 1
+        self.wakeup.set()
+
+    def _take_batch(self) -> list:
+        with self.lock:
+            woken, self.woken = self.woken, {}
+            batch = []
+            r = self.radius_cells
+            for (row, col), arrivals in woken.items():
+                nearby = [
+                    request
+                    for dr in range(-r, r + 1)
+                    for dc in range(-r, r + 1)
+                    for request in self.cells.get((row + dr, col + dc), {}).values()
+                ]
+                nearby.sort(key=lambda request: request.enqueued_at)
+                for request in nearby[:arrivals * self.per_driver]:
+                    batch.append(self._remove(request.request_id))
+            return batch
+
+    def _take_expired(self) -> list:
+        cutoff = self.clock() - self.max_wait
+        with self.lock:
+            stale = [request_id for request_id, request in self.pending.items() if request.enqueued_at <= cutoff]
+            return [self._remove(request_id) for request_id in stale]
+
+    def run_once(self) -> int:
+        """Expire old requests and re-match one batch; returns how many were matched."""
+        for request in self._take_expired():
+            self.expired += 1
+            if self.on_expired is not None:
+                try:
+                    self.on_expired(request)
+                except Exception as e:
+                    logging.error(f"on_expired failed for {request.request_id}: {e}")
+
+        batch = self._take_batch()
+        if not batch:
+            return 0
+        try:
+            unmatched = list(self.rematch(batch) or [])
+        except Exception as e:
+            logging.error(f"Re-match of {len(batch)} queued requests failed: {e}")
+            unmatched = batch
+        with self.lock:
+            for request in unmatched:
+                if request.request_id not in self.pending:
+                    self._insert(request)
+        matched = len(batch) - len(unmatched)
+        self.matched += matched
+        return matched
+
+    # -----------------------------
+    # Worker
+    # -----------------------------
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="demand-queue", daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.closed = True
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _run(self):
+        while not self.closed:
+            if self.wakeup.wait(EXPIRY_CHECK_SECONDS):
+                self.wakeup.clear()
+                # Let a burst of arrivals (e.g. a shift starting) land in one batch
+                time.sleep(self.batch_window)
+            if not self.closed:
+                self.run_once()
+
+
+# -----------------------------
+# Availability feed
+# -----------------------------
+class AvailabilityFeed:
+    """
+    Follows DriverStatusService.WatchAvailableDrivers and passes each arrival
+    to queue.on_driver_available. The server ends every stream after
+    stream_seconds and the feed reopens it at once; after a failed stream
+    it waits retry_seconds first. Arrivals between two streams are missed.
+    """
+
+    def __init__(self, queue: DemandQueue, driver_status_stub, stream_seconds: int = DEFAULT_WATCH_SECONDS,
+                 retry_seconds: float = DEFAULT_WATCH_RETRY_SECONDS):
+        self.queue = queue
+        self.driver_status_stub = driver_status_stub
+        self.stream_seconds = stream_seconds
+        self.retry_seconds = retry_seconds
+        self.stopped = threading.Event()
+        self.call = None
+        self.thread = None
+
+        # Counters (for monitoring)
+        self.received = 0
+        self.failed_streams = 0
+
+    def follow_once(self):
+        """Open one stream and feed the queue until it ends."""
+        self.call = self.driver_status_stub.WatchAvailableDrivers(
+            WatchAvailableDriversRequest(max_seconds=self.stream_seconds),
+            timeout=self.stream_seconds + WATCH_TIMEOUT_MARGIN_SECONDS,
+        )
+        if self.stopped.is_set():
+            self.call.cancel()
+        for status in self.call:
+            if status.HasField("current_location"):
+                self.received += 1
+                self.queue.on_driver_available(status.driver_id, status.current_location.lat,
+                                               status.current_location.lon)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="availability-feed", daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.stopped.set()
+        if self.call is not None:
+            self.call.cancel()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                self.follow_once()
+            except grpc.RpcError as e:
+                if self.stopped.is_set():
+                    return
+                self.failed_streams += 1
+                logging.warning(f"Availability feed stream failed: {e.code()}")
+                self.stopped.wait(self.retry_seconds)
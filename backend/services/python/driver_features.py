@@ -0,0 +1,260 @@
+# driver_features.py
+# In-memory per-driver features for matching and pricing.
+#
+# PriceCalculationRequest wants driver_acceptance_rate ("last 100 offers")
+# and driver_rating. Both are maintained incrementally from events:
+#   - acceptance: a 100-bit ring per driver (1 = accepted) plus a running
+#     count of set bits, so recording an offer and reading the rate are O(1)
+#   - rating: running sum and count, so the mean is O(1)
+# State lives in slot-indexed NumPy columns (as in driver_index), which
+# keeps per-driver overhead to a few dozen bytes and lets get_many() answer
+# a whole candidate list with one fancy-indexing pass.
+#
+# The events come from telemetry, not from the workflows: a
+# TelemetryFeatureFeed polls TelemetryService for offer and rating events and
+# applies them to the process-wide store returned by shared_features(), which
+# every workflow in the process prices from. A driver with no history is
+# priced at the baseline defaults.
+# Nothing emits FEATURE_EVENTS yet: assignment is automatic (no offers) and
+# trips carry no rating. Until an offer / rating flow logs them, every driver
+# prices at the baseline.
+
+import logging
+import threading
+from collections import namedtuple
+
+import grpc
+import numpy as np
+
+from common_pb2 import Metadata
+
+from telemetry_store import event_time
+
+# -----------------------------
+# Defaults
+# -----------------------------
+OFFER_WINDOW = 100
+# Until a driver has history: the pricing baseline
+DEFAULT_ACCEPTANCE_RATE = 0.95
+DEFAULT_RATING = 4.8
+
+# Telemetry event types understood by apply_event(); the driver is
+# metadata["driver_id"], else entity_id. Ratings come from metadata["rating"].
+# (driver_assigned is not an offer outcome: automatic assignment never asks.)
+OFFER_ACCEPTED_EVENTS = ("offer_accepted",)
+OFFER_REJECTED_EVENTS = ("offer_rejected", "offer_expired")
+RATING_EVENTS = ("trip_completed", "trip_rated")
+FEATURE_EVENTS = OFFER_ACCEPTED_EVENTS + OFFER_REJECTED_EVENTS + RATING_EVENTS
+
+DEFAULT_POLL_SECONDS = 5.0
+DEFAULT_POLL_TIMEOUT_SECONDS = 10.0
+
+DriverFeatures = namedtuple("DriverFeatures", ["acceptance_rate", "rating", "offers", "ratings"])
+
+
+class DriverFeatureStore:
+
+    def __init__(self, capacity: int = 1024):
+        self.lock = threading.Lock()
+        self.slots = {}   # driver_id -> slot
+        self.capacity = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        ring_bytes = (OFFER_WINDOW + 7) // 8
+        columns = {
+            "bits": np.zeros((capacity, ring_bytes), dtype=np.uint8),
+            "head": np.zeros(capacity, dtype=np.int16),       # next ring position to write
+            "offers": np.zeros(capacity, dtype=np.int16),     # offers in the ring, <= OFFER_WINDOW
+            "accepted": np.zeros(capacity, dtype=np.int16),   # set bits in the ring
+            "rating_sum": np.zeros(capacity, dtype=np.float64),
+            "rating_count": np.zeros(capacity, dtype=np.int64),
+        }
+        for name, column in columns.items():
+            if self.capacity:
+                column[:self.capacity] = getattr(self, name)
+            setattr(self, name, column)
+        self.capacity = capacity
+
+    def _slot_for(self, driver_id: str) -> int:
+        slot = self.slots.get(driver_id)
+        if slot is None:
+            slot = len(self.slots)
+            if slot == self.capacity:
+                self._allocate(self.capacity * 2)
+            self.slots[driver_id] = slot
+        return slot
+
+    # -----------------------------
+    # Updates
+    # -----------------------------
+    def record_offer(self, driver_id: str, accepted: bool):
+        with self.lock:
+            slot = self._slot_for(driver_id)
+            pos = int(self.head[slot])
+            byte, mask = pos >> 3, 1 << (pos & 7)
+            bits = self.bits[slot]
+            if self.offers[slot] == OFFER_WINDOW:
+                # Overwriting the oldest offer
+                if bits[byte] & mask:
+                    self.accepted[slot] -= 1
+            else:
+                self.offers[slot] += 1
+            if accepted:
+                bits[byte] |= mask
+                self.accepted[slot] += 1
+            else:
+                bits[byte] &= ~mask & 0xFF
+            self.head[slot] = (pos + 1) % OFFER_WINDOW
+
+    def record_rating(self, driver_id: str, rating: float):
+        if not 0.0 <= rating <= 5.0:
+            raise ValueError(f"rating must be within 0.0-5.0, got {rating}")
+        with self.lock:
+            slot = self._slot_for(driver_id)
+            self.rating_sum[slot] += rating
+            self.rating_count[slot] += 1
+
+    def apply_event(self, event) -> bool:
+        """Update from a TelemetryEvent; returns False if its type is not a feature event."""
+        data = event.metadata.data
+        driver_id = data.get("driver_id") or event.entity_id
+        if event.event_type in OFFER_ACCEPTED_EVENTS:
+            self.record_offer(driver_id, True)
+        elif event.event_type in OFFER_REJECTED_EVENTS:
+            self.record_offer(driver_id, False)
+        elif event.event_type in RATING_EVENTS and data.get("rating"):
+            self.record_rating(driver_id, float(data["rating"]))
+        else:
+            return False
+        return True
+
+    # -----------------------------
+    # Lookups
+    # -----------------------------
+    def get(self, driver_id: str) -> DriverFeatures:
+        with self.lock:
+            slot = self.slots.get(driver_id)
+            if slot is None:
+                return DriverFeatures(DEFAULT_ACCEPTANCE_RATE, DEFAULT_RATING, 0, 0)
+            offers, ratings = int(self.offers[slot]), int(self.rating_count[slot])
+            return DriverFeatures(
+                acceptance_rate=float(self.accepted[slot]) / offers if offers else DEFAULT_ACCEPTANCE_RATE,
+                rating=float(self.rating_sum[slot]) / ratings if ratings else DEFAULT_RATING,
+                offers=offers,
+                ratings=ratings,
+            )
+
+    def get_many(self, driver_ids: list):
+        """(acceptance_rates, ratings) as float64 arrays aligned with driver_ids."""
+        with self.lock:
+            slots = np.fromiter((self.slots.get(d, -1) for d in driver_ids), dtype=np.int64, count=len(driver_ids))
+            known = slots >= 0
+            idx = slots[known]
+            offers = self.offers[idx]
+            ratings = self.rating_count[idx]
+            accepted = self.accepted[idx]
+            rating_sum = self.rating_sum[idx]
+
+        rates = np.full(len(driver_ids), DEFAULT_ACCEPTANCE_RATE)
+        means = np.full(len(driver_ids), DEFAULT_RATING)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rates[known] = np.where(offers > 0, accepted / offers, DEFAULT_ACCEPTANCE_RATE)
+            means[known] = np.where(ratings > 0, rating_sum / ratings, DEFAULT_RATING)
+        return rates, means
+
+
+# -----------------------------
+# Telemetry feed
+# -----------------------------
+class TelemetryFeatureFeed:
+    """
+    Polls QueryMetrics for each FEATURE_EVENTS type and applies new events to
+    a DriverFeatureStore. Each type keeps a cursor at the newest event time
+    seen; start_time is inclusive, so events at exactly the cursor that were
+    already applied are recognised by their bytes and skipped. An event that
+    reaches TelemetryService with a timestamp older than its type's cursor
+    is missed.
+    """
+
+    def __init__(self, store: DriverFeatureStore, telemetry_stub, interval: float = DEFAULT_POLL_SECONDS,
+                 timeout: float = DEFAULT_POLL_TIMEOUT_SECONDS):
+        self.store = store
+        self.telemetry_stub = telemetry_stub
+        self.interval = interval
+        self.timeout = timeout
+        # event_type -> (newest event time applied, bytes of the events at that time)
+        self.cursors = {event_type: (None, set()) for event_type in FEATURE_EVENTS}
+        self.stopped = threading.Event()
+        self.thread = None
+
+        # Counters (for monitoring)
+        self.applied = 0
+        self.failed_polls = 0
+
+    def poll(self) -> int:
+        """Apply every feature event not applied yet; returns how many were applied."""
+        applied = 0
+        for event_type in FEATURE_EVENTS:
+            start, seen = self.cursors[event_type]
+            query = {"event_type": event_type}
+            if start is not None:
+                query["start_time"] = repr(start)
+            newest, at_newest = start, seen
+            for event in self.telemetry_stub.QueryMetrics(Metadata(data=query), timeout=self.timeout):
+                ts, data = event_time(event), event.SerializeToString()
+                if start is not None and (ts < start or (ts == start and data in seen)):
+                    continue
+                try:
+                    self.store.apply_event(event)
+                    applied += 1
+                except ValueError as e:
+                    logging.warning(f"Skipping {event_type} for {event.entity_id}: {e}")
+                if newest is None or ts > newest:
+                    newest, at_newest = ts, set()
+                if ts == newest:
+                    at_newest.add(data)
+            self.cursors[event_type] = (newest, at_newest)
+        self.applied += applied
+        return applied
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="driver-features-feed", daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                self.poll()
+            except grpc.RpcError as e:
+                self.failed_polls += 1
+                logging.warning(f"Driver feature feed poll failed: {e.code()}")
+            self.stopped.wait(self.interval)
+
+
+# -----------------------------
+# Process-wide store
+# -----------------------------
+_shared_store = None
+_shared_feed = None
+_shared_lock = threading.Lock()
+
+
+def shared_features(telemetry_stub=None) -> DriverFeatureStore:
+    """
+    The process-wide DriverFeatureStore. The first call given a telemetry
+    stub starts the TelemetryFeatureFeed that keeps it current.
+    """
+    global _shared_store, _shared_feed
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = DriverFeatureStore()
+        if _shared_feed is None and telemetry_stub is not None:
+            _shared_feed = TelemetryFeatureFeed(_shared_store, telemetry_stub).start()
+        return _shared_store
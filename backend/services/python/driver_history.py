@@ -0,0 +1,80 @@
+# driver_history.py
+# Fixed-size per-driver location history for DriverStatusService.
+#
+# All drivers share one preallocated (slots x window) NumPy structured array;
+# each row is a ring buffer of the driver's last `window` fixes. Appends are
+# O(1) writes into the row, memory depends only on the number of slots (never
+# on how long a driver stays online), and reads hand out views into the pool.
+
+import numpy as np
+
+# -----------------------------
+# Layout
+# -----------------------------
+HISTORY_DTYPE = np.dtype([
+    ("ts", np.float64),       # unix seconds of the fix
+    ("lat", np.float64),
+    ("lon", np.float64),
+    ("speed", np.float32),    # meters per second
+])
+
+DEFAULT_WINDOW = 64
+
+
+class LocationHistory:
+
+    def __init__(self, capacity: int, window: int = DEFAULT_WINDOW):
+        self.window = window
+        self.pool = np.zeros((capacity, window), dtype=HISTORY_DTYPE)
+        self.head = np.zeros(capacity, dtype=np.int32)    # next write position
+        self.count = np.zeros(capacity, dtype=np.int32)   # valid entries, <= window
+
+    def grow(self, capacity: int):
+        """Resize to at least capacity slots (called when the owning index grows)."""
+        if capacity <= len(self.pool):
+            return
+        pool = np.zeros((capacity, self.window), dtype=HISTORY_DTYPE)
+        pool[:len(self.pool)] = self.pool
+        self.pool = pool
+        for name in ("head", "count"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def append(self, slot: int, ts: float, lat: float, lon: float, speed: float):
+        pos = self.head[slot]
+        self.pool[slot, pos] = (ts, lat, lon, speed)
+        self.head[slot] = (pos + 1) % self.window
+        if self.count[slot] < self.window:
+            self.count[slot] += 1
+
+    def last(self, slot: int):
+        """Most recent fix as a structured scalar, or None if empty."""
+        if not self.count[slot]:
+            return None
+        return self.pool[slot, (self.head[slot] - 1) % self.window]
+
+    def window_views(self, slot: int, n: int = None) -> tuple:
+        """
+        Up to n most recent fixes, oldest first, as one or two views into the
+        pool (two when the window wraps around the end of the row). No data is
+        copied; the views are only stable while the caller holds the index lock.
+        """
+        count = int(self.count[slot])
+        n = count if n is None else min(n, count)
+        if n == 0:
+            return ()
+        row = self.pool[slot]
+        head = int(self.head[slot])
+        start = (head - n) % self.window
+        if start + n <= self.window:
+            return (row[start:start + n],)
+        return (row[start:], row[:head])
+
+    def snapshot(self, slot: int, n: int = None) -> np.ndarray:
+        """Contiguous copy of window_views(slot, n), safe to keep after the lock is released."""
+        views = self.window_views(slot, n)
+        if not views:
+            return np.empty(0, dtype=HISTORY_DTYPE)
+        return np.concatenate(views)
@@ -0,0 +1,415 @@
+# driver_index.py
+# In-memory geospatial index of driver state for DriverStatusService.
+#
+# Driver state lives in flat NumPy arrays addressed by a slot number
+# (driver_id -> slot). Available drivers with a known location are bucketed
+# into a uniform lat/lon grid; nearest-driver queries expand ring by ring
+# around the query cell and stop as soon as the requested number of drivers
+# is proven to be the closest ones.
+#
+# Drivers that stop sending updates are evicted through a min-heap of
+# last_seen deadlines holding at most one entry per indexed driver: a popped
+# entry whose driver has been seen since is simply pushed back with its new
+# deadline, so there is never a full sweep over the fleet.
+#
+# Listeners (add_listener) hear about supply appearing: fn(driver_id, lat,
+# lon) whenever an available driver enters a grid cell (went available,
+# or moved to a new cell while available). They are called after the lock
+# is released, on the writer's thread, so they must be quick.
+
+import heapq
+import math
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from driver_history import LocationHistory, DEFAULT_WINDOW
+
+# -----------------------------
+# Constants
+# -----------------------------
+EARTH_RADIUS_M = 6371000.0
+METERS_PER_DEG_LAT = math.pi * EARTH_RADIUS_M / 180.0
+DEFAULT_CELL_DEG = 0.01       # ~1.1 km in latitude
+DEFAULT_STALE_AFTER_SECONDS = 30.0
+INITIAL_CAPACITY = 1024
+MAX_DRIVER_ID_BYTES = 64      # utf-8; the width of the shared-memory id column
+
+# Immutable view of one driver, copied out of the arrays under the lock
+DriverSnapshot = namedtuple(
+    "DriverSnapshot",
+    ["driver_id", "is_available", "lat", "lon", "has_location", "version", "last_seen", "distance_m"],
+)
+
+
+class VersionConflict(Exception):
+    """expected_version did not match the stored driver version."""
+
+
+class InvalidDriverId(ValueError):
+    """driver_id is longer than MAX_DRIVER_ID_BYTES in utf-8."""
+
+
+class IndexFull(Exception):
+    """A new driver needs a slot but the mirror table has none left."""
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def haversine_m(lat, lon, lats, lons):
+    """Great-circle distance in meters from (lat, lon) to arrays of points."""
+    lat1 = math.radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlon = np.radians(lons) - math.radians(lon)
+    a = np.sin(dlat / 2.0) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+# -----------------------------
+# Index
+# -----------------------------
+class DriverIndex:
+
+    def __init__(self, cell_deg: float = DEFAULT_CELL_DEG, capacity: int = INITIAL_CAPACITY,
+                 stale_after: float = DEFAULT_STALE_AFTER_SECONDS, history_window: int = DEFAULT_WINDOW,
+                 mirror=None):
+        self.cell_deg = cell_deg
+        self.stale_after = stale_after
+        self.lock = threading.Lock()
+
+        # driver_id <-> slot
+        self.slots = {}
+        self.driver_ids = []
+
+        # Per-slot state
+        self.lat = np.zeros(capacity, dtype=np.float64)
+        self.lon = np.zeros(capacity, dtype=np.float64)
+        self.has_location = np.zeros(capacity, dtype=np.bool_)
+        self.available = np.zeros(capacity, dtype=np.bool_)
+        self.version = np.zeros(capacity, dtype=np.int32)
+        self.last_seen = np.zeros(capacity, dtype=np.float64)
+        self.scheduled = np.zeros(capacity, dtype=np.bool_)
+
+        # Recent fixes per slot: (ts, lat, lon, speed) ring buffers in one pool
+        self.history = LocationHistory(capacity, history_window)
+
+        # Grid: cell key -> set of slots; only available drivers with a location
+        self.cells = {}
+        self.cell_of = {}
+
+        # Stale-driver eviction: (deadline, slot), one entry per scheduled slot
+        self.expiry_heap = []
+        self.evictions = 0
+
+        # Device-timestamped fixes older than the driver's latest (for monitoring)
+        self.out_of_order = 0
+        # Location-only registrations refused for id length / capacity (for monitoring)
+        self.rejected_registrations = 0
+
+        # Optional SharedDriverTable that reader processes query directly
+        self.mirror = mirror
+
+        # fn(driver_id, lat, lon) when an available driver enters a cell
+        self.listeners = []
+
+    def __len__(self):
+        return len(self.driver_ids)
+
+    # -----------------------------
+    # Slot management
+    # -----------------------------
+    def _grow(self):
+        capacity = len(self.lat) * 2
+        for name in ("lat", "lon", "has_location", "available", "version", "last_seen", "scheduled"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+        self.history.grow(capacity)
+
+    def _slot_for(self, driver_id: str) -> int:
+        slot = self.slots.get(driver_id)
+        if slot is None:
+            # Validate before any state changes, so a rejected driver leaves no slot
+            if len(driver_id.encode("utf-8")) > MAX_DRIVER_ID_BYTES:
+                raise InvalidDriverId(driver_id)
+            slot = len(self.driver_ids)
+            if self.mirror is not None and slot >= self.mirror.capacity:
+                raise IndexFull(f"shared driver table is full ({self.mirror.capacity} slots)")
+            if slot == len(self.lat):
+                self._grow()
+            self.slots[driver_id] = slot
+            self.driver_ids.append(driver_id)
+            # Keep mirror slots dense even if this update is later rejected
+            self._publish(slot)
+        return slot
+
+    # -----------------------------
+    # Grid maintenance
+    # -----------------------------
+    def cell_key(self, lat: float, lon: float):
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def _reindex(self, slot: int):
+        """Move slot to the cell matching its current state (or drop it); returns True if it entered a cell."""
+        old = self.cell_of.get(slot)
+        new = None
+        if self.available[slot] and self.has_location[slot]:
+            new = self.cell_key(self.lat[slot], self.lon[slot])
+        if old == new:
+            return False
+        if old is not None:
+            members = self.cells[old]
+            members.discard(slot)
+            if not members:
+                del self.cells[old]
+            del self.cell_of[slot]
+        if new is not None:
+            self.cells.setdefault(new, set()).add(slot)
+            self.cell_of[slot] = new
+            if not self.scheduled[slot]:
+                heapq.heappush(self.expiry_heap, (self.last_seen[slot] + self.stale_after, slot))
+                self.scheduled[slot] = True
+        return new is not None
+
+    # -----------------------------
+    # Listeners
+    # -----------------------------
+    def add_listener(self, fn):
+        """Call fn(driver_id, lat, lon) whenever an available driver enters a grid cell."""
+        self.listeners.append(fn)
+
+    def _notify(self, arrivals: list):
+        for driver_id, lat, lon in arrivals:
+            for fn in self.listeners:
+                fn(driver_id, lat, lon)
+
+    def _record_fix(self, slot: int, lat: float, lon: float, ts: float, speed: float = None):
+        """Store a fix as the current position and append it to the slot's history."""
+        if speed is None:
+            # Derive speed from the previous fix when the client did not send one
+            speed = 0.0
+            prev = self.history.last(slot)
+            if prev is not None and ts > prev["ts"]:
+                meters = haversine_m(lat, lon, prev["lat"], prev["lon"])
+                speed = float(meters) / (ts - float(prev["ts"]))
+        self.lat[slot] = lat
+        self.lon[slot] = lon
+        self.has_location[slot] = True
+        self.history.append(slot, ts, lat, lon, speed)
+
+    def _publish(self, slot: int):
+        if self.mirror is not None:
+            self.mirror.publish(
+                slot, self.driver_ids[slot], self.lat[slot], self.lon[slot],
+                slot in self.cell_of, self.version[slot], self.last_seen[slot],
+            )
+
+    def _snapshot(self, slot: int, distance_m: float = None) -> DriverSnapshot:
+        return DriverSnapshot(
+            driver_id=self.driver_ids[slot],
+            is_available=bool(self.available[slot]),
+            lat=float(self.lat[slot]),
+            lon=float(self.lon[slot]),
+            has_location=bool(self.has_location[slot]),
+            version=int(self.version[slot]),
+            last_seen=float(self.last_seen[slot]),
+            distance_m=distance_m,
+        )
+
+    # -----------------------------
+    # Writes
+    # -----------------------------
+    def update(self, driver_id: str, is_available: bool, location, expected_version: int, now: float) -> DriverSnapshot:
+        """
+        Apply a status update.
+
+        location is a (lat, lon) tuple or None. expected_version == 0 skips the
+        optimistic-locking check. The version is bumped on registration and on
+        availability changes only, so location heartbeats never invalidate a
+        version held by a workflow.
+        """
+        with self.lock:
+            is_new = driver_id not in self.slots
+            slot = self._slot_for(driver_id)
+            if expected_version and int(self.version[slot]) != expected_version:
+                raise VersionConflict(driver_id)
+
+            if is_new or bool(self.available[slot]) != is_available:
+                self.version[slot] += 1
+            self.available[slot] = is_available
+            if location is not None:
+                self._record_fix(slot, location[0], location[1], now)
+            self.last_seen[slot] = now
+
+            entered = self._reindex(slot)
+            self._publish(slot)
+            snap = self._snapshot(slot)
+        if entered and self.listeners:
+            self._notify([(driver_id, snap.lat, snap.lon)])
+        return snap
+
+    def update_locations(self, locations: dict, now: float) -> int:
+        """
+        Apply a coalesced batch of location pings under a single lock
+        acquisition. Values are (lat, lon) or (lat, lon, fix_ts, speed), where
+        fix_ts / speed may be None to use server time / derive from history.
+        Availability and version are left untouched; unknown drivers are
+        registered as unavailable (or skipped if their id is too long or the
+        mirror is full). A fix whose device timestamp is older than
+        the driver's latest fix arrived out of order and is dropped. Returns
+        the number of fixes applied.
+        """
+        arrivals = []
+        applied = 0
+        with self.lock:
+            for driver_id, fix in locations.items():
+                lat, lon = fix[0], fix[1]
+                fix_ts = fix[2] if len(fix) > 2 and fix[2] else now
+                speed = fix[3] if len(fix) > 3 else None
+                if driver_id not in self.slots:
+                    try:
+                        slot = self._slot_for(driver_id)
+                    except (InvalidDriverId, IndexFull):
+                        self.rejected_registrations += 1
+                        continue
+                    self.version[slot] = 1
+                else:
+                    slot = self.slots[driver_id]
+                    prev = self.history.last(slot)
+                    if len(fix) > 2 and fix[2] and prev is not None and fix_ts < prev["ts"]:
+                        self.out_of_order += 1
+                        continue
+                applied += 1
+                self._record_fix(slot, lat, lon, fix_ts, speed)
+                self.last_seen[slot] = now
+                if self._reindex(slot):
+                    arrivals.append((driver_id, lat, lon))
+                self._publish(slot)
+        if arrivals and self.listeners:
+            self._notify(arrivals)
+        return applied
+
+    # -----------------------------
+    # Stale-driver eviction
+    # -----------------------------
+    def next_expiry(self):
+        """Earliest scheduled deadline, or None if nothing is scheduled."""
+        with self.lock:
+            return self.expiry_heap[0][0] if self.expiry_heap else None
+
+    def evict_stale(self, now: float) -> list:
+        """
+        Flip every available driver not seen for stale_after seconds to
+        unavailable and drop it from the grid. O(log n) per popped entry.
+        """
+        evicted = []
+        with self.lock:
+            heap = self.expiry_heap
+            while heap and heap[0][0] <= now:
+                _, slot = heapq.heappop(heap)
+                if slot not in self.cell_of:
+                    # Went unavailable on its own; reschedule when re-indexed
+                    self.scheduled[slot] = False
+                    continue
+                deadline = self.last_seen[slot] + self.stale_after
+                if deadline > now:
+                    heapq.heappush(heap, (deadline, slot))
+                    continue
+                self.scheduled[slot] = False
+                self.available[slot] = False
+                self.version[slot] += 1
+                self._reindex(slot)
+                self._publish(slot)
+                evicted.append(self.driver_ids[slot])
+            self.evictions += len(evicted)
+        return evicted
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "drivers": len(self.driver_ids),
+                "available_indexed": len(self.cell_of),
+                "occupied_cells": len(self.cells),
+                "evictions_total": self.evictions,
+            }
+
+    # -----------------------------
+    # Reads
+    # -----------------------------
+    def get(self, driver_id: str):
+        with self.lock:
+            slot = self.slots.get(driver_id)
+            return None if slot is None else self._snapshot(slot)
+
+    def trace(self, driver_id: str, n: int = None):
+        """Copy of the driver's last n fixes (HISTORY_DTYPE records, oldest first), or None."""
+        with self.lock:
+            slot = self.slots.get(driver_id)
+            return None if slot is None else self.history.snapshot(slot, n)
+
+    def _ring(self, row: int, col: int, k: int):
+        if k == 0:
+            yield (row, col)
+            return
+        for dc in range(-k, k + 1):
+            yield (row - k, col + dc)
+            yield (row + k, col + dc)
+        for dr in range(-k + 1, k):
+            yield (row + dr, col - k)
+            yield (row + dr, col + k)
+
+    def _collect(self, lat: float, lon: float, cells, seen: set, out: list):
+        """Push (distance, slot, snapshot) for every unseen slot in cells onto out."""
+        slots = [s for cell in cells for s in self.cells.get(cell, ()) if s not in seen]
+        if not slots:
+            return
+        idx = np.fromiter(slots, dtype=np.int64, count=len(slots))
+        dists = haversine_m(lat, lon, self.lat[idx], self.lon[idx])
+        for slot, d in zip(slots, dists.tolist()):
+            seen.add(slot)
+            heapq.heappush(out, (d, slot, self._snapshot(slot, d)))
+
+    def nearest(self, lat: float, lon: float, max_results: int):
+        """
+        Yield DriverSnapshots of available drivers, nearest first.
+
+        The lock is held only while one ring of cells is scanned, never while
+        the caller consumes results, so a slow stream cannot stall writers.
+        A driver is yielded once a ring has been scanned that proves nothing
+        unscanned can be closer.
+        """
+        row, col = self.cell_key(lat, lon)
+        lat_step_m = self.cell_deg * METERS_PER_DEG_LAT
+        seen = set()
+        pending = []
+        emitted = 0
+        k = 0
+
+        while emitted < max_results:
+            with self.lock:
+                ring = list(self._ring(row, col, k))
+                exhaustive = len(ring) >= len(self.cells)
+                if exhaustive:
+                    # Sparse grid: cheaper to scan every occupied cell once
+                    ring = list(self.cells)
+                self._collect(lat, lon, ring, seen, pending)
+
+            if exhaustive:
+                bound = math.inf
+            else:
+                # Anything outside rings 0..k is at least k cells away
+                edge_lat = min(abs(lat) + (k + 1) * self.cell_deg, 90.0)
+                lon_step_m = lat_step_m * math.cos(math.radians(edge_lat))
+                bound = k * min(lat_step_m, lon_step_m)
+
+            while pending and pending[0][0] <= bound and emitted < max_results:
+                yield heapq.heappop(pending)[2]
+                emitted += 1
+
+            if exhaustive:
+                return
+            k += 1
@@ -0,0 +1,192 @@
+# driver_shm.py
+# Driver position table in multiprocessing.shared_memory.
+#
+# One writer process (the DriverStatusService that ingests updates) mirrors
+# every slot of its DriverIndex into this table; N reader processes attach to
+# the same block and answer nearest-driver queries straight from it, with no
+# IPC per lookup.
+#
+# Layout (fixed at creation, slots are never reused):
+#   header   int64[4]   capacity, published slot count, reserved
+#   seq      uint64[n]  per-slot seqlock counter (odd = write in progress)
+#   lat/lon  float64[n]
+#   last_seen float64[n]
+#   version  int32[n]
+#   available uint8[n]  1 = available with a known location
+#   ids      S64[n]     driver_id, utf-8, NUL padded
+#
+# Writers bump seq to odd, write the fields, then bump it back to even.
+# Readers copy seq, copy the fields, re-read seq and retry any slot whose
+# counter was odd or moved. The scheme relies on the store ordering of the
+# host CPU (x86-64 / TSO), which is where the services are deployed.
+
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from driver_index import haversine_m, MAX_DRIVER_ID_BYTES
+
+# -----------------------------
+# Layout
+# -----------------------------
+DEFAULT_CAPACITY = 65536
+ID_WIDTH = MAX_DRIVER_ID_BYTES   # DriverIndex rejects longer ids, so none is truncated
+HEADER_FIELDS = 4
+MAX_READ_RETRIES = 8
+
+_COLUMNS = (
+    ("seq", np.uint64),
+    ("lat", np.float64),
+    ("lon", np.float64),
+    ("last_seen", np.float64),
+    ("version", np.int32),
+    ("available", np.uint8),
+    ("ids", "S%d" % ID_WIDTH),
+)
+
+
+def _layout(capacity: int):
+    """Byte offset of every column for a table of the given capacity."""
+    offsets = {}
+    offset = HEADER_FIELDS * 8
+    for name, dtype in _COLUMNS:
+        offsets[name] = offset
+        size = np.dtype(dtype).itemsize * capacity
+        offset += -(-size // 8) * 8   # keep columns 8-byte aligned
+    return offsets, offset
+
+
+class SharedDriverTable:
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        self.capacity = int(self.header[0])
+
+        offsets, _ = _layout(self.capacity)
+        for name, dtype in _COLUMNS:
+            setattr(self, name, np.ndarray((self.capacity,), dtype=dtype, buffer=shm.buf, offset=offsets[name]))
+
+        # Reader-side driver_id -> slot map, extended as new slots are published
+        self.slots = {}
+        self.known = 0
+
+    @classmethod
+    def create(cls, capacity: int = DEFAULT_CAPACITY, name: str = None):
+        _, size = _layout(capacity)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[0] = capacity
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str):
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def close(self):
+        # Drop our views before closing, otherwise the buffer stays exported
+        for name, _ in _COLUMNS:
+            setattr(self, name, None)
+        self.header = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    # -----------------------------
+    # Writer
+    # -----------------------------
+    def publish(self, slot: int, driver_id: str, lat: float, lon: float,
+                available: bool, version: int, last_seen: float):
+        """
+        Write one slot. Single writer only; slot numbers must be dense and
+        below capacity (DriverIndex refuses new drivers once it is full).
+        """
+        if slot >= self.capacity:
+            raise IndexError(f"shared driver table is full ({self.capacity} slots)")
+        self.seq[slot] += 1
+        self.lat[slot] = lat
+        self.lon[slot] = lon
+        self.last_seen[slot] = last_seen
+        self.version[slot] = version
+        self.available[slot] = available
+        if slot >= self.header[1]:
+            self.ids[slot] = driver_id.encode("utf-8")
+        self.seq[slot] += 1
+        if slot >= self.header[1]:
+            # Publish the slot only once its id and fields are in place
+            self.header[1] = slot + 1
+
+    # -----------------------------
+    # Readers
+    # -----------------------------
+    def _refresh_ids(self) -> int:
+        count = int(self.header[1])
+        if count > self.known:
+            for slot in range(self.known, count):
+                self.slots[self.ids[slot].decode("utf-8")] = slot
+            self.known = count
+        return count
+
+    def read(self, idx: np.ndarray):
+        """
+        Consistent copy of (lat, lon, available, version, last_seen) for the
+        given slots. Torn slots are re-read; a slot that is still being
+        rewritten after MAX_READ_RETRIES attempts is reported unavailable.
+        """
+        lat = np.empty(len(idx)); lon = np.empty(len(idx)); last_seen = np.empty(len(idx))
+        version = np.empty(len(idx), dtype=np.int32); available = np.zeros(len(idx), dtype=np.bool_)
+        todo = np.arange(len(idx))
+        for _ in range(MAX_READ_RETRIES):
+            slots = idx[todo]
+            before = self.seq[slots]
+            lat[todo] = self.lat[slots]
+            lon[todo] = self.lon[slots]
+            last_seen[todo] = self.last_seen[slots]
+            version[todo] = self.version[slots]
+            available[todo] = self.available[slots] != 0
+            after = self.seq[slots]
+            torn = (before != after) | (before & 1).astype(np.bool_)
+            todo = todo[torn]
+            if not len(todo):
+                break
+        available[todo] = False
+        return lat, lon, available, version, last_seen
+
+    def lookup(self, driver_id: str):
+        """(lat, lon, available, version, last_seen) for one driver, or None."""
+        self._refresh_ids()
+        slot = self.slots.get(driver_id)
+        if slot is None:
+            return None
+        lat, lon, available, version, last_seen = self.read(np.array([slot]))
+        return float(lat[0]), float(lon[0]), bool(available[0]), int(version[0]), float(last_seen[0])
+
+    def nearest(self, lat: float, lon: float, max_results: int):
+        """
+        [(driver_id, distance_m, lat, lon, version, last_seen)] for the nearest
+        available drivers, nearest first. A vectorized scan over every slot:
+        readers hold no grid, so the cost is O(slots) NumPy work per query.
+        """
+        count = self._refresh_ids()
+        if not count or max_results <= 0:
+            return []
+        idx = np.arange(count)
+        lats, lons, available, versions, last_seen = self.read(idx)
+        idx = idx[available]
+        if not len(idx):
+            return []
+        dists = haversine_m(lat, lon, lats[idx], lons[idx])
+        k = min(max_results, len(idx))
+        top = np.argpartition(dists, k - 1)[:k] if k < len(idx) else np.arange(len(idx))
+        top = top[np.argsort(dists[top], kind="stable")]
+        return [
+            (self.ids[idx[i]].decode("utf-8"), float(dists[i]), float(lats[idx[i]]),
+             float(lons[idx[i]]), int(versions[idx[i]]), float(last_seen[idx[i]]))
+            for i in top
+        ]
@@ -0,0 +1,343 @@
+# driver_status_server.py
+
+import grpc
+from concurrent import futures
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from google.protobuf.timestamp_pb2 import Timestamp
+
+from driver_status_pb2_grpc import DriverStatusServiceServicer, add_DriverStatusServiceServicer_to_server
+from driver_status_pb2 import (
+    DriverStatus,
+    UpdateDriverStatusRequest,
+    GetAvailableDriversRequest,
+    StreamDriverLocationsSummary,
+    WatchAvailableDriversRequest,
+)
+from common_pb2 import Location
+
+from driver_index import DriverIndex, DriverSnapshot, VersionConflict, InvalidDriverId, IndexFull, MAX_DRIVER_ID_BYTES
+from dedupe_cache import DedupeCache
+from driver_shm import SharedDriverTable
+
+# -----------------------------
+# Constants
+# -----------------------------
+DEFAULT_MAX_RESULTS = 10
+
+# Location streams are coalesced per driver and flushed to the index once per
+# tick, or earlier if a tick accumulates this many distinct drivers
+LOCATION_TICK_SECONDS = 0.5
+LOCATION_MAX_BATCH = 5000
+
+# WatchAvailableDrivers: streams end after WATCH_MAX_SECONDS (clients
+# reconnect), a watcher further than WATCH_QUEUE_SIZE arrivals behind loses
+# the overflow, and is_active() is checked every WATCH_POLL_SECONDS
+WATCH_MAX_SECONDS = 60
+WATCH_QUEUE_SIZE = 10_000
+WATCH_POLL_SECONDS = 1.0
+
+WRITER_PORT = 50057
+READER_PORT = 50058   # shared by all reader processes via SO_REUSEPORT
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def seconds_to_timestamp(seconds: float) -> Timestamp:
+    ts = Timestamp()
+    ts.FromNanoseconds(int(seconds * 1e9))
+    return ts
+
+def snapshot_to_proto(snap) -> DriverStatus:
+    status = DriverStatus(
+        driver_id=snap.driver_id,
+        is_available=snap.is_available,
+        last_seen=seconds_to_timestamp(snap.last_seen),
+        version=snap.version,
+    )
+    if snap.has_location:
+        status.current_location.CopyFrom(Location(lat=snap.lat, lon=snap.lon))
+    if snap.distance_m is not None:
+        status.metadata.data["distance_meters"] = f"{snap.distance_m:.1f}"
+    return status
+
+# -----------------------------
+# DriverStatusService
+# -----------------------------
+class DriverStatusService(DriverStatusServiceServicer):
+
+    def __init__(self, index: DriverIndex = None, dedupe: DedupeCache = None):
+        self.index = index if index is not None else DriverIndex()
+        # (driver_id, idempotency_key) -> serialized DriverStatus already committed
+        self.dedupe = dedupe if dedupe is not None else DedupeCache()
+        # One queue of (driver_id, lat, lon, seen) per open WatchAvailableDrivers stream
+        self.watchers = set()
+        self.watchers_lock = threading.Lock()
+        self.watch_dropped = 0
+        self.index.add_listener(self._driver_available)
+
+    def UpdateDriverStatus(self, request: UpdateDriverStatusRequest, context):
+        if not request.driver_id:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details("driver_id is required")
+            return DriverStatus()
+
+        # Retries with a known key are answered without touching the index;
+        # the key is reserved first so a concurrent duplicate waits for us
+        dedupe_key = (request.driver_id, request.idempotency_key) if request.idempotency_key else None
+        if dedupe_key:
+            owner, committed = self.dedupe.reserve(dedupe_key)
+            if committed is not None:
+                return DriverStatus.FromString(committed)
+            if not owner:
+                context.set_code(grpc.StatusCode.ABORTED)
+                context.set_details("Duplicate update still in flight")
+                return DriverStatus()
+
+        location = None
+        if request.HasField("current_location"):
+            location = (request.current_location.lat, request.current_location.lon)
+
+        try:
+            snap = self.index.update(
+                request.driver_id,
+                request.is_available,
+                location,
+                request.expected_version,
+                time.time(),
+            )
+        except VersionConflict:
+            if dedupe_key:
+                self.dedupe.release(dedupe_key)
+            context.set_code(grpc.StatusCode.ABORTED)
+            context.set_details("Version mismatch")
+            return DriverStatus()
+        except InvalidDriverId:
+            if dedupe_key:
+                self.dedupe.release(dedupe_key)
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(f"driver_id is longer than {MAX_DRIVER_ID_BYTES} bytes")
+            return DriverStatus()
+        except IndexFull as e:
+            if dedupe_key:
+                self.dedupe.release(dedupe_key)
+            context.set_code(grpc.StatusCode.RESOURCE_EXHAUSTED)
+            context.set_details(str(e))
+            return DriverStatus()
+        except Exception:
+            if dedupe_key:
+                self.dedupe.release(dedupe_key)
+            raise
+
+        status = snapshot_to_proto(snap)
+        if dedupe_key:
+            self.dedupe.put(dedupe_key, status.SerializeToString())
+        return status
+
+    def GetAvailableDrivers(self, request: GetAvailableDriversRequest, context):
+        max_results = request.max_results or DEFAULT_MAX_RESULTS
+        for snap in self.index.nearest(request.location.lat, request.location.lon, max_results):
+            if not context.is_active():
+                return
+            yield snapshot_to_proto(snap)
+
+    def StreamDriverLocations(self, request_iterator, context):
+        """
+        Ingest a multiplexed stream of location pings.
+
+        Pings are folded into a per-stream dict keyed by driver_id, so a tick
+        costs one index write per distinct driver no matter how many pings
+        arrived. A per-stream flusher thread applies the dict every tick, so a
+        sparse long-lived stream never leaves a position pending; a full batch
+        is flushed on arrival, and whatever is pending when the stream closes
+        is flushed before the summary is returned. Of two pings for a driver,
+        the one with the later device timestamp wins.
+        """
+        received = rejected = updated = 0
+        pending = {}
+        lock = threading.Lock()         # guards pending
+        flush_lock = threading.Lock()   # keeps this stream's batches in order
+        closed = threading.Event()
+
+        def flush():
+            nonlocal pending, updated
+            with flush_lock:
+                with lock:
+                    batch, pending = pending, {}
+                if batch:
+                    applied = self.index.update_locations(batch, time.time())
+                    with lock:
+                        updated += applied
+
+        def flusher():
+            while not closed.wait(LOCATION_TICK_SECONDS):
+                flush()
+
+        thread = threading.Thread(target=flusher, name="location-flusher", daemon=True)
+        thread.start()
+        try:
+            for ping in request_iterator:
+                received += 1
+                if (not ping.driver_id or not ping.HasField("location")
+                        or len(ping.driver_id.encode("utf-8")) > MAX_DRIVER_ID_BYTES):
+                    rejected += 1
+                    continue
+                fix_ts = ping.timestamp.ToNanoseconds() / 1e9 if ping.HasField("timestamp") else None
+                fix = (ping.location.lat, ping.location.lon, fix_ts, ping.speed_mps or None)
+                with lock:
+                    previous = pending.get(ping.driver_id)
+                    if fix_ts is not None and previous is not None and previous[2] and fix_ts < previous[2]:
+                        continue   # out of order within the tick
+                    pending[ping.driver_id] = fix
+                    full = len(pending) >= LOCATION_MAX_BATCH
+                if full:
+                    flush()
+        finally:
+            closed.set()
+            thread.join()
+        flush()
+
+        return StreamDriverLocationsSummary(
+            pings_received=received,
+            pings_rejected=rejected,
+            drivers_updated=updated,
+        )
+
+    def _driver_available(self, driver_id: str, lat: float, lon: float):
+        """DriverIndex listener: hand the arrival to every open watch stream."""
+        seen = time.time()
+        with self.watchers_lock:
+            for watcher in self.watchers:
+                try:
+                    watcher.put_nowait((driver_id, lat, lon, seen))
+                except queue.Full:
+                    self.watch_dropped += 1
+
+    def WatchAvailableDrivers(self, request: WatchAvailableDriversRequest, context):
+        """
+        Stream every available driver entering a grid cell from now on, until
+        the client leaves or max_seconds pass. Arrivals while no stream is
+        open are not replayed.
+        """
+        watcher = queue.Queue(WATCH_QUEUE_SIZE)
+        with self.watchers_lock:
+            self.watchers.add(watcher)
+        deadline = time.monotonic() + (request.max_seconds or WATCH_MAX_SECONDS)
+        try:
+            while context.is_active():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    driver_id, lat, lon, seen = watcher.get(timeout=min(WATCH_POLL_SECONDS, remaining))
+                except queue.Empty:
+                    continue
+                yield DriverStatus(
+                    driver_id=driver_id,
+                    is_available=True,
+                    current_location=Location(lat=lat, lon=lon),
+                    last_seen=seconds_to_timestamp(seen),
+                )
+        finally:
+            with self.watchers_lock:
+                self.watchers.discard(watcher)
+
+# -----------------------------
+# Read replica over shared memory
+# -----------------------------
+class SharedDriverStatusReader(DriverStatusServiceServicer):
+    """
+    GetAvailableDrivers answered from a SharedDriverTable inside a reader
+    process. Writes stay with the single writer; other RPCs are UNIMPLEMENTED.
+    """
+
+    def __init__(self, table: SharedDriverTable):
+        self.table = table
+
+    def GetAvailableDrivers(self, request: GetAvailableDriversRequest, context):
+        max_results = request.max_results or DEFAULT_MAX_RESULTS
+        for driver_id, distance_m, lat, lon, version, last_seen in self.table.nearest(
+            request.location.lat, request.location.lon, max_results
+        ):
+            if not context.is_active():
+                return
+            yield snapshot_to_proto(DriverSnapshot(
+                driver_id=driver_id,
+                is_available=True,
+                lat=lat,
+                lon=lon,
+                has_location=True,
+                version=version,
+                last_seen=last_seen,
+                distance_m=distance_m,
+            ))
+
+# -----------------------------
+# Stale-driver eviction
+# -----------------------------
+def run_evictor(index: DriverIndex, stop_event: threading.Event):
+    """Sleep until the earliest last_seen deadline, evict, repeat."""
+    while not stop_event.is_set():
+        evicted = index.evict_stale(time.time())
+        if evicted:
+            print(f"[{datetime.utcnow()}] Evicted {len(evicted)} stale drivers (evictions_total={index.evictions})")
+        next_expiry = index.next_expiry()
+        wait = index.stale_after if next_expiry is None else max(0.0, next_expiry - time.time())
+        stop_event.wait(wait)
+
+# -----------------------------
+# Server setup
+# -----------------------------
+def serve(service: DriverStatusService = None):
+    service = service if service is not None else DriverStatusService()
+    stop_event = threading.Event()
+    threading.Thread(target=run_evictor, args=(service.index, stop_event), daemon=True).start()
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    add_DriverStatusServiceServicer_to_server(service, server)
+    server.add_insecure_port(f"[::]:{WRITER_PORT}")
+    server.start()
+    print(f"DriverStatusService running on port {WRITER_PORT}")
+    server.wait_for_termination()
+    stop_event.set()
+
+def run_reader(table_name: str, port: int = READER_PORT):
+    """Entry point of one reader process."""
+    table = SharedDriverTable.attach(table_name)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10), options=[("grpc.so_reuseport", 1)])
+    add_DriverStatusServiceServicer_to_server(SharedDriverStatusReader(table), server)
+    server.add_insecure_port(f"[::]:{port}")
+    server.start()
+    print(f"DriverStatusService reader {os.getpid()} running on port {port}")
+    server.wait_for_termination()
+
+def serve_multiprocess(readers: int):
+    """
+    One writer process ingesting updates on WRITER_PORT, mirrored into shared
+    memory, plus `readers` processes answering GetAvailableDrivers on
+    READER_PORT without any per-lookup IPC.
+    """
+    table = SharedDriverTable.create()
+    # Spawn readers before this process creates any gRPC server
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=run_reader, args=(table.name,), daemon=True) for _ in range(readers)]
+    for p in processes:
+        p.start()
+    try:
+        serve(DriverStatusService(DriverIndex(mirror=table)))
+    finally:
+        for p in processes:
+            p.terminate()
+        table.close()
+
+if __name__ == "__main__":
+    readers = int(os.environ.get("DRIVER_STATUS_READERS", "0"))
+    if readers:
+        serve_multiprocess(readers)
+    else:
+        serve()
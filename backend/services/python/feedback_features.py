@@ -0,0 +1,142 @@
+# feedback_features.py
+# Flattens ML feedback into fixed-width feature matrices for training.
+#
+# Each shard is a float32 .npy matrix of `shard_rows` rows (one per Feedback,
+# in store order; only a shard flushed at shutdown is shorter, and the
+# manifest records each shard's rows) and len(feature_names) columns, written with
+# np.lib.format.open_memmap; trainers np.load(..., mmap_mode="r") it
+# directly. manifest.json lists the feature names and the shards; new shards
+# are appended to it. The exporter keeps a cursor into the store, so each run
+# only flattens feedback that arrived after the last shard. The store lives
+# in server memory, so the cursor does too: one exporter per store, started
+# with it. Feedback replaced after its shard was written (last write wins in
+# feedback_store) keeps its exported values. Missing values (padding
+# candidates, no snapshot) are NaN.
+
+import json
+import os
+
+import numpy as np
+
+from ml_feedback_pb2 import Feedback
+
+from feedback_store import FeedbackStore
+
+# -----------------------------
+# Defaults
+# -----------------------------
+DEFAULT_SHARD_ROWS = 65_536
+DEFAULT_MAX_CANDIDATES = 8
+
+MANIFEST_FILE = "manifest.json"
+
+CANDIDATE_FEATURES = ("probability", "distance_m", "eta_s")
+SNAPSHOT_FEATURES = ("snapshot_present", "snapshot_is_available", "snapshot_lat", "snapshot_lon",
+                     "snapshot_age_s", "snapshot_version")
+
+
+def feature_names(max_candidates: int) -> list:
+    names = ["label_success", "num_candidates", "matched_rank",
+             "matched_probability", "matched_distance_m", "matched_eta_s"]
+    for i in range(max_candidates):
+        names.extend(f"cand{i}_{f}" for f in CANDIDATE_FEATURES)
+    names.extend(SNAPSHOT_FEATURES)
+    return names
+
+
+def flatten_into(row: np.ndarray, feedback: Feedback, max_candidates: int):
+    """Write one Feedback into a feature row laid out as feature_names(max_candidates)."""
+    row[:] = np.nan
+    candidates = feedback.candidate_list
+    rank = next((i for i, c in enumerate(candidates) if c.driver_id == feedback.matched_driver_id), -1)
+    row[0] = 1.0 if feedback.success_flag else 0.0
+    row[1] = len(candidates)
+    row[2] = rank
+    if rank >= 0:
+        matched = candidates[rank]
+        row[3:6] = (matched.probability, matched.distance_meters, matched.eta_seconds)
+
+    base = 6
+    for i, c in enumerate(candidates[:max_candidates]):
+        row[base + 3 * i:base + 3 * i + 3] = (c.probability, c.distance_meters, c.eta_seconds)
+
+    base += 3 * max_candidates
+    row[base] = 0.0
+    if feedback.HasField("driver_status_snapshot"):
+        snap = feedback.driver_status_snapshot
+        row[base] = 1.0
+        row[base + 1] = 1.0 if snap.is_available else 0.0
+        if snap.HasField("current_location"):
+            row[base + 2:base + 4] = (snap.current_location.lat, snap.current_location.lon)
+        if snap.HasField("last_seen") and feedback.HasField("timestamp"):
+            row[base + 4] = (feedback.timestamp.ToNanoseconds() - snap.last_seen.ToNanoseconds()) / 1e9
+        row[base + 5] = snap.version
+
+
+class FeatureExporter:
+
+    def __init__(self, store: FeedbackStore, out_dir: str, shard_rows: int = DEFAULT_SHARD_ROWS,
+                 max_candidates: int = DEFAULT_MAX_CANDIDATES):
+        self.store = store
+        self.out_dir = out_dir
+        self.max_candidates = max_candidates
+        self.next_row = 0   # first store row not exported yet
+        os.makedirs(out_dir, exist_ok=True)
+
+        self.manifest_path = os.path.join(out_dir, MANIFEST_FILE)
+        names = feature_names(max_candidates)
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+            if self.manifest["feature_names"] != names or self.manifest["shard_rows"] != shard_rows:
+                raise ValueError(f"{out_dir} holds shards with a different layout")
+        else:
+            self.manifest = {"feature_names": names, "shard_rows": shard_rows, "shards": []}
+
+    @property
+    def shard_rows(self) -> int:
+        return self.manifest["shard_rows"]
+
+    def _save_manifest(self):
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp, self.manifest_path)
+
+    def _write_shard(self, first_row: int, rows: int):
+        name = f"shard_{len(self.manifest['shards']):06d}.npy"
+        path = os.path.join(self.out_dir, name)
+        records, _ = self.store.page(first_row, first_row + rows, rows)
+        matrix = np.lib.format.open_memmap(path + ".tmp", mode="w+", dtype=np.float32,
+                                           shape=(rows, len(self.manifest["feature_names"])))
+        for i, data in enumerate(records):
+            flatten_into(matrix[i], Feedback.FromString(data), self.max_candidates)
+        matrix.flush()
+        del matrix
+        os.replace(path + ".tmp", path)
+        self.manifest["shards"].append({"file": name, "rows": rows})
+        self._save_manifest()
+        self.next_row = first_row + rows
+
+    def export(self, flush: bool = False) -> int:
+        """
+        Write every complete shard of not-yet-exported feedback; with flush,
+        also a final short shard for the remainder. Returns shards written.
+        """
+        written = 0
+        available = len(self.store)
+        while True:
+            pending = available - self.next_row
+            if pending >= self.shard_rows or (flush and pending > 0):
+                self._write_shard(self.next_row, min(pending, self.shard_rows))
+                written += 1
+            else:
+                return written
+
+
+def load_shards(out_dir: str):
+    """(feature_names, [memory-mapped shard matrices]) for an export directory."""
+    with open(os.path.join(out_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    shards = [np.load(os.path.join(out_dir, s["file"]), mmap_mode="r") for s in manifest["shards"]]
+    return manifest["feature_names"], shards
@@ -0,0 +1,167 @@
+# feedback_store.py
+# Raw-bytes store for MLFeedbackService.
+#
+# Feedback messages are kept as the serialized bytes they arrived as, in a
+# RecordLog (contiguous byte chunks plus an offset index). A training batch
+# streams those bytes back without parsing them.
+#
+# The fields training batches filter on are extracted at ingest: success_flag
+# into a boolean column and each metadata (key, value) pair into a posting
+# list of rows. Rows are never removed or reordered, so "rows below N" is a consistent
+# snapshot that a paged reader can walk with a row cursor while new feedback
+# keeps arriving.
+#
+# trip_request_id is the idempotency key: an index maps it to its row, a
+# byte-identical retry is a no-op and a changed Feedback (e.g. a later
+# success_flag) replaces the row in place, last write wins. Either way the
+# key keeps exactly one row. (The replaced bytes stay in their chunk as
+# garbage; replacements are rare next to inserts and retries.)
+
+import bisect
+import threading
+
+import numpy as np
+
+from ml_feedback_pb2 import Feedback
+
+from record_buffers import RecordLog, INITIAL_INDEX_CAPACITY
+
+# put() outcomes
+INSERTED = "inserted"
+DUPLICATE = "duplicate"
+REPLACED = "replaced"
+
+
+class FeedbackStore:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records = RecordLog()
+        self.success = np.zeros(INITIAL_INDEX_CAPACITY, dtype=bool)
+        # (metadata key, value) -> list of rows, ascending
+        self.postings = {}
+        # trip_request_id -> row
+        self.by_key = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    def put(self, data: bytes, feedback: Feedback = None):
+        """
+        Store one serialized Feedback (`feedback` is its parsed form, if at
+        hand). Returns (row, INSERTED | DUPLICATE | REPLACED). Feedback
+        without a trip_request_id is always inserted.
+        """
+        if feedback is None:
+            feedback = Feedback.FromString(data)
+        key = feedback.trip_request_id
+        with self.lock:
+            row = self.by_key.get(key) if key else None
+            if row is None:
+                row = self._insert(data, feedback)
+                if key:
+                    self.by_key[key] = row
+                return row, INSERTED
+            if self.records.get(row) == data:
+                return row, DUPLICATE
+            self._replace(row, data, feedback)
+            return row, REPLACED
+
+    def _insert(self, data: bytes, feedback: Feedback) -> int:
+        row = self.records.append(data)
+        if row == len(self.success):
+            success = np.zeros(len(self.success) * 2, dtype=bool)
+            success[:row] = self.success
+            self.success = success
+        self.success[row] = feedback.success_flag
+        for term in feedback.metadata.data.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                self.postings[term] = posting = []
+            posting.append(row)
+        return row
+
+    def _replace(self, row: int, data: bytes, feedback: Feedback):
+        old_terms = set(Feedback.FromString(self.records.get(row)).metadata.data.items())
+        new_terms = set(feedback.metadata.data.items())
+        for term in old_terms - new_terms:
+            posting = self.postings[term]
+            del posting[bisect.bisect_left(posting, row)]
+            if not posting:
+                del self.postings[term]
+        for term in new_terms - old_terms:
+            bisect.insort(self.postings.setdefault(term, []), row)
+        self.records.replace(row, data)
+        self.success[row] = feedback.success_flag
+
+    def scan(self):
+        """Yield serialized Feedback in arrival order, up to the rows present at the call."""
+        with self.lock:
+            rows = len(self.records)
+        for row in range(rows):
+            with self.lock:
+                data = self.records.get(row)
+            yield data
+
+    def matching_rows(self, start: int, end: int, limit: int, metadata: dict = None, success: bool = None):
+        """
+        Up to `limit` rows in start <= row < end whose metadata contains every
+        `metadata` entry and, if given, whose success_flag equals `success`.
+        Returns (rows, next_start); next_start is None once no matching rows
+        below `end` remain. Work is proportional to the rows walked to find
+        limit + 1 matches, not to the size of the store.
+        """
+        want = limit + 1   # one match past the page tells whether there is more
+        with self.lock:
+            if metadata:
+                rows = self._intersect(start, end, want, list(metadata.items()), success)
+            elif success is not None:
+                rows = self._scan_success(start, end, want, success)
+            else:
+                rows = np.arange(start, min(end, start + want), dtype=np.int64)
+        selected = rows[:limit]
+        next_start = int(selected[-1]) + 1 if len(rows) > limit and len(selected) else None
+        return selected, next_start
+
+    def _intersect(self, start: int, end: int, want: int, terms: list, success) -> np.ndarray:
+        """Walk the shortest posting list from `start`, bisecting forward in the others."""
+        postings = sorted((self.postings.get(term, []) for term in terms), key=len)
+        first, others = postings[0], postings[1:]
+        cursors = [bisect.bisect_left(p, start) for p in others]
+        out = []
+        for i in range(bisect.bisect_left(first, start), len(first)):
+            row = first[i]
+            if row >= end or len(out) == want:
+                break
+            for j, posting in enumerate(others):
+                cursors[j] = bisect.bisect_left(posting, row, cursors[j])
+                if cursors[j] == len(posting):
+                    return np.asarray(out, dtype=np.int64)   # no later row can match
+                if posting[cursors[j]] != row:
+                    break
+            else:
+                if success is None or self.success[row] == success:
+                    out.append(row)
+        return np.asarray(out, dtype=np.int64)
+
+    def _scan_success(self, start: int, end: int, want: int, success: bool) -> np.ndarray:
+        """Scan the success column in doubling windows until `want` rows match."""
+        found, count = [], 0
+        window = max(want, 1024)
+        while start < end and count < want:
+            stop = min(end, start + window)
+            rows = np.flatnonzero(self.success[start:stop] == success) + start
+            found.append(rows)
+            count += len(rows)
+            start, window = stop, window * 2
+        return np.concatenate(found)[:want] if found else np.zeros(0, dtype=np.int64)
+
+    def get_rows(self, rows) -> list:
+        """Serialized Feedback stored at each of `rows`."""
+        with self.lock:
+            return [self.records.get(int(row)) for row in rows]
+
+    def page(self, start: int, end: int, limit: int, metadata: dict = None, success: bool = None):
+        """matching_rows() plus their serialized Feedback: (records, next_start)."""
+        rows, next_start = self.matching_rows(start, end, limit, metadata, success)
+        return self.get_rows(rows), next_start
@@ -0,0 +1,224 @@
+# grpc_channels.py
+# Process-wide gRPC channel pool and stub factory.
+#
+# Channels are expensive (TCP + HTTP/2 handshake, name resolution) and are
+# meant to be shared; stubs are cheap. ChannelPool keeps channels_per_target
+# channels per target, each on its own subchannel pool so they really are
+# separate HTTP/2 connections, and hands out stubs that round-robin calls
+# over them. warmup() connects everything up front (channel_ready_future) so
+# the first request does not pay connection setup.
+#
+# stub(..., hedge=True) also hedges the stub's idempotent methods across
+# those connections (see grpc_hedging).
+#
+# The process-wide pool puts grpc_resilience interceptors (per-method
+# deadlines, per-target circuit breakers) on every channel.
+#
+# Targets are addressed by service name ("pricing", "trip", ...) resolved
+# through SERVICE_TARGETS, overridable per service with <NAME>_SERVICE_ADDR,
+# or by a literal "host:port".
+
+import itertools
+import logging
+import os
+import threading
+
+import grpc
+
+from grpc_resilience import client_interceptors
+from grpc_hedging import HEDGEABLE_METHODS, HedgeBudget, HedgedCallable
+
+# -----------------------------
+# Defaults
+# -----------------------------
+SERVICE_TARGETS = {
+    "matching": "localhost:50051",
+    "trip_request": "localhost:50052",
+    "trip": "localhost:50053",
+    "telemetry": "localhost:50054",
+    "ml_feedback": "localhost:50055",
+    "pricing": "localhost:50056",
+    "driver_status": "localhost:50057",
+}
+
+DEFAULT_CHANNELS_PER_TARGET = 2
+DEFAULT_WARMUP_TIMEOUT_SECONDS = 5.0
+MAX_MESSAGE_BYTES = 16 * 1024 * 1024
+
+CHANNEL_OPTIONS = [
+    # Ping idle connections so dead peers and NAT timeouts are noticed
+    # before a request is sent on them
+    ("grpc.keepalive_time_ms", 30_000),
+    ("grpc.keepalive_timeout_ms", 10_000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+    ("grpc.max_send_message_length", MAX_MESSAGE_BYTES),
+    ("grpc.max_receive_message_length", MAX_MESSAGE_BYTES),
+    # Without this, channels with identical args share one subchannel
+    # (one TCP connection) and extra channels spread nothing
+    ("grpc.use_local_subchannel_pool", 1),
+]
+
+
+def resolve_target(service: str) -> str:
+    """Address for a service name, or service itself if it is already host:port."""
+    if ":" in service:
+        return service
+    override = os.environ.get(f"{service.upper()}_SERVICE_ADDR")
+    if override:
+        return override
+    try:
+        return SERVICE_TARGETS[service]
+    except KeyError:
+        raise ValueError(f"unknown service {service!r}; expected one of {sorted(SERVICE_TARGETS)} or host:port")
+
+
+class PooledStub:
+    """Stub facade: each method lookup takes the next channel's stub, round-robin; hedged methods span all of them."""
+
+    def __init__(self, stubs: list, hedged: tuple = ()):
+        self._stubs = itertools.cycle(stubs)
+        # One budget per stub: hedges stay a fraction of this stub's traffic
+        budget = HedgeBudget()
+        self.hedged = {name: HedgedCallable([getattr(stub, name) for stub in stubs], budget) for name in hedged}
+
+    def __getattr__(self, name):
+        hedged = self.hedged.get(name)
+        if hedged is not None:
+            return hedged
+        return getattr(next(self._stubs), name)
+
+
+class ChannelPool:
+
+    def __init__(self, channels_per_target: int = DEFAULT_CHANNELS_PER_TARGET, options: list = None, aio: bool = False,
+                 interceptors=None):
+        """
+        aio=True builds grpc.aio channels (use them from one event loop).
+        interceptors(target) -> list of client interceptors for that target's
+        channels (sync pools only).
+        """
+        if channels_per_target < 1:
+            raise ValueError("channels_per_target must be >= 1")
+        self.channels_per_target = channels_per_target
+        self.options = list(options if options is not None else CHANNEL_OPTIONS)
+        self.aio = aio
+        if aio and interceptors is not None:
+            raise ValueError("interceptors are supported on sync pools only")
+        self.interceptors = interceptors
+        self.lock = threading.Lock()
+        self.channels = {}   # target -> [channel]
+        self.stubs = {}      # (stub class, target, hedged methods) -> PooledStub
+
+    def _channels_for(self, target: str) -> list:
+        with self.lock:
+            channels = self.channels.get(target)
+            if channels is None:
+                factory = grpc.aio.insecure_channel if self.aio else grpc.insecure_channel
+                channels = [factory(target, options=self.options) for _ in range(self.channels_per_target)]
+                if self.interceptors is not None:
+                    # One interceptor set per target: its channels share a breaker
+                    interceptors = self.interceptors(target)
+                    channels = [grpc.intercept_channel(channel, *interceptors) for channel in channels]
+                self.channels[target] = channels
+            return channels
+
+    def channel(self, service: str):
+        """One channel to service (the first of its set), e.g. for a servicer constructor."""
+        return self._channels_for(resolve_target(service))[0]
+
+    def stub(self, stub_class, service: str, hedge=False) -> PooledStub:
+        """
+        hedge: True for the class's HEDGEABLE_METHODS, or a tuple of method
+        names; only for idempotent unary methods, on sync pools.
+        """
+        target = resolve_target(service)
+        if hedge is True:
+            hedge = HEDGEABLE_METHODS.get(stub_class.__name__, ())
+        hedged = tuple(hedge or ())
+        if hedged and self.aio:
+            raise ValueError("hedging is supported on sync pools only")
+        key = (stub_class, target, hedged)
+        stub = self.stubs.get(key)
+        if stub is None:
+            stub = PooledStub([stub_class(channel) for channel in self._channels_for(target)], hedged)
+            with self.lock:
+                stub = self.stubs.setdefault(key, stub)
+        return stub
+
+    # -----------------------------
+    # Warmup
+    # -----------------------------
+    def warmup(self, services: list, timeout: float = DEFAULT_WARMUP_TIMEOUT_SECONDS) -> dict:
+        """
+        Connect every channel to services; returns {target: ready}. A target
+        that is not up yet is logged and left to connect on first use.
+        """
+        if self.aio:
+            raise TypeError("use await warmup_async() on an aio pool")
+        pending = [(resolve_target(s), grpc.channel_ready_future(ch))
+                   for s in services for ch in self._channels_for(resolve_target(s))]
+        ready = {}
+        for target, future in pending:
+            try:
+                future.result(timeout=timeout)
+                ready.setdefault(target, True)
+            except grpc.FutureTimeoutError:
+                future.cancel()
+                ready[target] = False
+        for target, ok in ready.items():
+            if not ok:
+                logging.warning(f"gRPC target {target} not ready after {timeout}s")
+        return ready
+
+    async def warmup_async(self, services: list, timeout: float = DEFAULT_WARMUP_TIMEOUT_SECONDS) -> dict:
+        import asyncio
+        targets = [resolve_target(s) for s in services]
+        ready = {}
+        for target in targets:
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*(ch.channel_ready() for ch in self._channels_for(target))), timeout)
+                ready[target] = True
+            except asyncio.TimeoutError:
+                logging.warning(f"gRPC target {target} not ready after {timeout}s")
+                ready[target] = False
+        return ready
+
+    def close(self):
+        """Close all channels (sync pools; aio pools use close_async)."""
+        with self.lock:
+            channels = [ch for chs in self.channels.values() for ch in chs]
+            self.channels.clear()
+            self.stubs.clear()
+        for channel in channels:
+            channel.close()
+
+    async def close_async(self):
+        with self.lock:
+            channels = [ch for chs in self.channels.values() for ch in chs]
+            self.channels.clear()
+            self.stubs.clear()
+        for channel in channels:
+            await channel.close()
+
+
+# -----------------------------
+# Process-wide pool
+# -----------------------------
+_default_pool = None
+_default_lock = threading.Lock()
+
+
+def default_pool() -> ChannelPool:
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = ChannelPool(int(os.environ.get("GRPC_CHANNELS_PER_TARGET", DEFAULT_CHANNELS_PER_TARGET)),
+                                        interceptors=client_interceptors)
+        return _default_pool
+
+
+def get_stub(stub_class, service: str, hedge=False) -> PooledStub:
+    """Stub on the process-wide pool."""
+    return default_pool().stub(stub_class, service, hedge)
@@ -0,0 +1,159 @@
+# grpc_hedging.py
+# Opt-in request hedging for idempotent unary RPCs.
+#
+# A hedged call sends the request on one channel; if no response has come
+# back by the method's observed p95 latency, it sends the same request on
+# another channel (another HTTP/2 connection, see grpc_channels). The first
+# successful response wins and the other attempt is cancelled. Only safe for
+# calls that are idempotent by design (seed-deterministic matching,
+# trip_request_id-keyed pricing, reads).
+#
+# The hedge gets only what is left of the call's timeout, so a hedged call
+# never takes longer than an unhedged one would. LatencyTracker records
+# whole-call latency (hedge wait included), so a p95 that hedging improves
+# is not mistaken for a faster server.
+#
+# Hedges are capped by a HedgeBudget token bucket: every call earns
+# `ratio` of a token, every hedge spends one, so at most ~ratio of traffic
+# is duplicated even when a whole replica is slow. No hedging happens until
+# LatencyTracker has min_samples successful latencies to take a p95 from.
+
+import itertools
+import queue
+import threading
+import time
+
+# -----------------------------
+# Defaults
+# -----------------------------
+DEFAULT_HEDGE_QUANTILE = 0.95
+DEFAULT_HEDGE_RATIO = 0.05     # hedges per call, long-run
+DEFAULT_HEDGE_BURST = 10       # hedges available at once
+DEFAULT_WINDOW = 1000          # latencies kept per method
+DEFAULT_MIN_SAMPLES = 100
+DEFAULT_REFRESH_EVERY = 50     # re-sort the window every N samples
+
+# Idempotent methods per stub class, hedged when a stub is requested with hedge=True
+HEDGEABLE_METHODS = {
+    "MatchingServiceStub": ("GetCandidates",),
+    "PricingServiceStub": ("CalculatePrice",),
+    "TripServiceStub": ("GetTripById", "GetTripByRequestId"),
+}
+
+
+class LatencyTracker:
+    """Sliding window of successful call latencies; threshold() is its quantile (None until warm)."""
+
+    def __init__(self, quantile: float = DEFAULT_HEDGE_QUANTILE, window: int = DEFAULT_WINDOW,
+                 min_samples: int = DEFAULT_MIN_SAMPLES, refresh_every: int = DEFAULT_REFRESH_EVERY):
+        self.quantile = quantile
+        self.window = window
+        self.min_samples = min_samples
+        self.refresh_every = refresh_every
+        self.lock = threading.Lock()
+        self.samples = [0.0] * window
+        self.count = 0
+        self._threshold = None
+
+    def record(self, seconds: float):
+        with self.lock:
+            self.samples[self.count % self.window] = seconds
+            self.count += 1
+            if self.count >= self.min_samples and self.count % self.refresh_every == 0:
+                ordered = sorted(self.samples[:min(self.count, self.window)])
+                self._threshold = ordered[int(self.quantile * (len(ordered) - 1))]
+
+    def threshold(self):
+        return self._threshold
+
+
+class HedgeBudget:
+
+    def __init__(self, ratio: float = DEFAULT_HEDGE_RATIO, burst: float = DEFAULT_HEDGE_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+        self.lock = threading.Lock()
+        self.denied = 0
+
+    def earn(self):
+        with self.lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def spend(self) -> bool:
+        with self.lock:
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return True
+            self.denied += 1
+            return False
+
+
+class HedgedCallable:
+    """
+    Drop-in for a unary-unary multicallable spread over several channels.
+    Only plain calls are hedged; .future()/.with_call() pass through to one
+    channel.
+    """
+
+    def __init__(self, callables: list, budget: HedgeBudget = None, tracker: LatencyTracker = None):
+        self.callables = callables
+        self.budget = budget if budget is not None else HedgeBudget()
+        self.tracker = tracker if tracker is not None else LatencyTracker()
+        self._next = itertools.cycle(range(len(callables)))
+
+        # Counters (approximate under concurrency, for monitoring only)
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def __getattr__(self, name):
+        return getattr(self.callables[next(self._next)], name)
+
+    def __call__(self, request, timeout=None, metadata=None, **kwargs):
+        i = next(self._next)
+        primary = self.callables[i]
+        backup = self.callables[(i + 1) % len(self.callables)]
+        self.calls += 1
+        self.budget.earn()
+
+        done = queue.SimpleQueue()
+        attempts = []
+        call_start = time.monotonic()
+        deadline = None if timeout is None else call_start + timeout
+
+        def launch(callable_, attempt_timeout):
+            future = callable_.future(request, timeout=attempt_timeout, metadata=metadata, **kwargs)
+            attempts.append(future)
+            future.add_done_callback(done.put)
+
+        launch(primary, timeout)
+        delay = self.tracker.threshold()
+        hedge_at = None if delay is None else call_start + delay
+        pending, error = 1, None
+        while pending:
+            wait = None if hedge_at is None else max(0.0, hedge_at - time.monotonic())
+            try:
+                future = done.get(timeout=wait)
+            except queue.Empty:
+                hedge_at = None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if (remaining is None or remaining > 0) and self.budget.spend():
+                    self.hedged += 1
+                    launch(backup, remaining)
+                    pending += 1
+                continue
+            pending -= 1
+            hedge_at = None   # the primary has answered; never hedge a failure
+            if future.cancelled():
+                continue
+            if future.exception() is None:
+                self.tracker.record(time.monotonic() - call_start)
+                for other in attempts:
+                    if other is not future:
+                        other.cancel()
+                if future is not attempts[0]:
+                    self.hedge_wins += 1
+                return future.result()
+            error = error or future.exception()
+        raise error
@@ -0,0 +1,284 @@
+# grpc_resilience.py
+# Client-side deadlines and circuit breakers for inter-service calls.
+#
+# ResilienceInterceptor sits on every channel to a target (see
+# grpc_channels.ChannelPool) and, per call:
+#   - sets a deadline: the caller's timeout, else METHOD_DEADLINES[method],
+#     else DEFAULT_DEADLINE_SECONDS; never more than what is left of the
+#     enclosing deadline_scope(), so a downstream call cannot outlive its
+#     caller. Servers enter inherit_deadline(context) to pass their own
+#     caller's deadline on.
+#   - consults the target's CircuitBreaker: after failure_threshold
+#     consecutive failures (unavailable / timed out / overloaded, or slower
+#     than slow_call_seconds) the breaker opens and calls fail immediately
+#     with UNAVAILABLE instead of waiting on a sick server. After
+#     reset_timeout one probe call is let through; its outcome closes or
+#     re-opens the breaker.
+# Rejected calls come back as failed calls (grpc.RpcError), so callers keep
+# their usual error handling and can route to a fallback.
+
+import contextvars
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager, nullcontext
+
+import grpc
+
+# -----------------------------
+# Defaults
+# -----------------------------
+DEFAULT_DEADLINE_SECONDS = 2.0
+METHOD_DEADLINES = {
+    "/dgdo.triprequest.TripRequestService/CreateTripRequest": 1.0,
+    "/dgdo.triprequest.TripRequestService/CancelTripRequest": 1.0,
+    "/dgdo.matching.MatchingService/GetCandidates": 1.0,
+    "/dgdo.pricing.PricingService/CalculatePrice": 0.5,
+    "/dgdo.pricing.PricingService/GetFallbackConfig": 0.5,
+    "/dgdo.driver_status.DriverStatusService/UpdateDriverStatus": 0.5,
+    # Includes TripService's own CalculatePrice call
+    "/dgdo.tripservice.TripService/CreateTrip": 1.5,
+}
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_SLOW_CALL_SECONDS = 1.0
+DEFAULT_RESET_TIMEOUT_SECONDS = 5.0
+
+# Codes that say the server (not the request) is in trouble. UNKNOWN and
+# INTERNAL are left out: a handler raising on one bad request must not open
+# the breaker for every caller.
+FAILURE_CODES = frozenset({
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+})
+
+# Absolute time.monotonic() deadline of the enclosing scope, if any
+_deadline = contextvars.ContextVar("grpc_deadline", default=None)
+
+
+# -----------------------------
+# Deadline propagation
+# -----------------------------
+@contextmanager
+def deadline_scope(seconds: float):
+    """Bound every intercepted call in the block by one overall budget; nested scopes only tighten it."""
+    deadline = time.monotonic() + seconds
+    enclosing = _deadline.get()
+    if enclosing is not None and enclosing < deadline:
+        deadline = enclosing
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def inherit_deadline(context):
+    """deadline_scope for a server handler: downstream calls get what is left of the caller's deadline."""
+    remaining = context.time_remaining()
+    if remaining is None:
+        return nullcontext()
+    return deadline_scope(remaining)
+
+
+def remaining_budget():
+    """Seconds left in the enclosing deadline_scope, or None outside one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+# -----------------------------
+# Circuit breaker
+# -----------------------------
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 slow_call_seconds: float = DEFAULT_SLOW_CALL_SECONDS,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT_SECONDS, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+        # Counters (for monitoring)
+        self.rejected = 0
+        self.opened = 0
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.state == self.OPEN:
+                if self.clock() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self.probing = False
+            if self.state == self.HALF_OPEN:
+                if self.probing:
+                    self.rejected += 1
+                    return False
+                self.probing = True
+            return True
+
+    def record(self, code, elapsed: float):
+        """Outcome of an allowed call; code None means it was cancelled by the caller (no verdict)."""
+        with self.lock:
+            if code is None or code == grpc.StatusCode.CANCELLED:
+                self.probing = False
+                return
+            if code in FAILURE_CODES or elapsed > self.slow_call_seconds:
+                self.failures += 1
+                if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                    if self.state != self.OPEN:
+                        self.opened += 1
+                    self.state = self.OPEN
+                    self.opened_at = self.clock()
+            else:
+                self.failures = 0
+                self.state = self.CLOSED
+            self.probing = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(target: str) -> CircuitBreaker:
+    """The process-wide breaker for target (shared by every channel to it)."""
+    with _breakers_lock:
+        breaker = _breakers.get(target)
+        if breaker is None:
+            breaker = _breakers[target] = CircuitBreaker()
+        return breaker
+
+
+# -----------------------------
+# Rejected call
+# -----------------------------
+class RejectedCall(grpc.RpcError, grpc.Call, grpc.Future):
+    """A call failed on the client without being sent (circuit open / no budget left)."""
+
+    def __init__(self, code, details: str):
+        super().__init__(details)
+        self._code = code
+        self._details = details
+
+    def code(self):
+        return self._code
+
+    def details(self):
+        return self._details
+
+    def initial_metadata(self):
+        return ()
+
+    def trailing_metadata(self):
+        return ()
+
+    # Future / RpcContext
+    def result(self, timeout=None):
+        raise self
+
+    def exception(self, timeout=None):
+        return self
+
+    def traceback(self, timeout=None):
+        return None
+
+    def add_done_callback(self, fn):
+        fn(self)
+
+    def add_callback(self, callback):
+        callback()
+        return True
+
+    def cancel(self):
+        return False
+
+    def cancelled(self):
+        return False
+
+    def running(self):
+        return False
+
+    def done(self):
+        return True
+
+    def is_active(self):
+        return False
+
+    def time_remaining(self):
+        return 0
+
+    # Response iterator (unary-stream)
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        raise self
+
+
+# -----------------------------
+# Interceptor
+# -----------------------------
+class _CallDetails(namedtuple("_CallDetails", ["method", "timeout", "metadata", "credentials",
+                                                "wait_for_ready", "compression"]),
+                   grpc.ClientCallDetails):
+    pass
+
+
+class ResilienceInterceptor(grpc.UnaryUnaryClientInterceptor, grpc.UnaryStreamClientInterceptor):
+
+    def __init__(self, target: str, breaker: CircuitBreaker = None, deadlines: dict = None,
+                 default_deadline: float = DEFAULT_DEADLINE_SECONDS):
+        self.target = target
+        self.breaker = breaker if breaker is not None else breaker_for(target)
+        self.deadlines = METHOD_DEADLINES if deadlines is None else deadlines
+        self.default_deadline = default_deadline
+
+    def _prepare(self, details):
+        """(details with the effective timeout, None) or (None, RejectedCall)."""
+        timeout = details.timeout
+        if timeout is None:
+            timeout = self.deadlines.get(details.method, self.default_deadline)
+        budget = remaining_budget()
+        if budget is not None:
+            timeout = min(timeout, budget)
+        if timeout <= 0:
+            return None, RejectedCall(grpc.StatusCode.DEADLINE_EXCEEDED,
+                                      f"no deadline budget left for {details.method}")
+        if not self.breaker.allow():
+            return None, RejectedCall(grpc.StatusCode.UNAVAILABLE,
+                                      f"circuit open for {self.target}, {details.method} not sent")
+        return _CallDetails(details.method, timeout, details.metadata, details.credentials,
+                            details.wait_for_ready, details.compression), None
+
+    def intercept_unary_unary(self, continuation, client_call_details, request):
+        details, rejected = self._prepare(client_call_details)
+        if rejected is not None:
+            return rejected
+        start = time.monotonic()
+        call = continuation(details, request)
+        call.add_done_callback(lambda c: self.breaker.record(
+            None if c.cancelled() else c.code(), time.monotonic() - start))
+        return call
+
+    def intercept_unary_stream(self, continuation, client_call_details, request):
+        details, rejected = self._prepare(client_call_details)
+        if rejected is not None:
+            return rejected
+        call = continuation(details, request)
+        # A stream's duration depends on how much it returns, so only its status counts
+        call.add_callback(lambda: self.breaker.record(call.code(), 0.0))
+        return call
+
+
+def client_interceptors(target: str) -> list:
+    """Interceptors for a ChannelPool target."""
+    return [ResilienceInterceptor(target)]
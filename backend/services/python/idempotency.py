@@ -0,0 +1,367 @@
+# idempotency.py
+# Two-tier idempotency cache for workflows.
+#
+#   claim = cache.claim(key)
+#   if claim.done:
+#       return claim.value            # finished earlier (here or elsewhere)
+#   try:
+#       result = ...                  # only one caller gets here per key
+#       cache.complete(claim, result, ttl)
+#   except Exception:
+#       cache.release(claim)          # let a retry / duplicate take over
+#       raise
+#
+# Tiers:
+#   - local: an in-process LRU of finished results; a repeat costs no
+#     round trip at all
+#   - backend: shared by every process. Claiming is one round trip: with
+#     RedisBackend a pipelined SET key <in-flight marker> NX EX + GET key.
+#     The marker tells other callers the key is being worked on; it expires
+#     after claim_ttl in case its owner dies.
+# Duplicates wait instead of both executing: in the same process on an
+# Event set by the owner, across processes by polling the backend until
+# the result appears (or the marker is released / expires and they claim
+# it themselves). After wait_timeout they give up with DuplicateInFlight.
+# complete() only stores the result while the key still holds our marker:
+# if the claim expired and another caller took the key over, its result
+# stands. MemoryBackend is a pure-Python backend for tests and
+# single-process use. AsyncIdempotencyCache runs the same protocol for
+# asyncio callers, backend steps on its own worker threads.
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# -----------------------------
+# Defaults
+# -----------------------------
+DEFAULT_LOCAL_ENTRIES = 10_000
+DEFAULT_LOCAL_TTL_SECONDS = 60.0
+DEFAULT_CLAIM_TTL_SECONDS = 30
+DEFAULT_WAIT_TIMEOUT_SECONDS = 10.0
+DEFAULT_POLL_INTERVAL_SECONDS = 0.05
+DEFAULT_ASYNC_WORKERS = 16
+
+INFLIGHT_PREFIX = "__inflight__:"
+
+# Delete key only if it still holds our marker
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Store the result only if key still holds our marker
+COMPLETE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    redis.call('set', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+class DuplicateInFlight(RuntimeError):
+    """Another caller is still working on this key after wait_timeout."""
+
+
+class Claim:
+    __slots__ = ("key", "marker", "value")
+
+    def __init__(self, key: str, marker: str = None, value: str = None):
+        self.key = key
+        self.marker = marker   # set when this caller owns the key
+        self.value = value     # set when the key was already finished
+
+    @property
+    def done(self) -> bool:
+        return self.value is not None
+
+
+# -----------------------------
+# Backends
+# -----------------------------
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class RedisBackend:
+
+    def __init__(self, client):
+        self.client = client
+
+    def claim(self, key: str, marker: str, ttl: int):
+        """(claimed, current value) in one round trip."""
+        pipe = self.client.pipeline(transaction=False)
+        pipe.set(key, marker, nx=True, ex=ttl)
+        pipe.get(key)
+        claimed, current = pipe.execute()
+        return bool(claimed), _decode(current)
+
+    def get(self, key: str):
+        return _decode(self.client.get(key))
+
+    def complete(self, key: str, marker: str, value: str, ttl: int) -> bool:
+        """Replace our marker with value; False if the key no longer holds the marker."""
+        return bool(self.client.eval(COMPLETE_SCRIPT, 1, key, marker, value, ttl))
+
+    def put(self, key: str, value: str, ttl: int):
+        self.client.set(key, value, ex=ttl)
+
+    def release(self, key: str, marker: str):
+        self.client.eval(RELEASE_SCRIPT, 1, key, marker)
+
+
+class MemoryBackend:
+    """Same contract as RedisBackend, in process memory."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.data = {}   # key -> (value, expires_at)
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] <= self.clock():
+            del self.data[key]
+            return None
+        return entry
+
+    def claim(self, key: str, marker: str, ttl: int):
+        with self.lock:
+            entry = self._live(key)
+            if entry is None:
+                self.data[key] = (marker, self.clock() + ttl)
+                return True, marker
+            return False, entry[0]
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self._live(key)
+            return None if entry is None else entry[0]
+
+    def complete(self, key: str, marker: str, value: str, ttl: int) -> bool:
+        with self.lock:
+            entry = self._live(key)
+            if entry is None or entry[0] != marker:
+                return False
+            self.data[key] = (value, self.clock() + ttl)
+            return True
+
+    def put(self, key: str, value: str, ttl: int):
+        with self.lock:
+            self.data[key] = (value, self.clock() + ttl)
+
+    def release(self, key: str, marker: str):
+        with self.lock:
+            entry = self._live(key)
+            if entry is not None and entry[0] == marker:
+                del self.data[key]
+
+
+# -----------------------------
+# Cache
+# -----------------------------
+class IdempotencyCache:
+
+    def __init__(self, backend, local_entries: int = DEFAULT_LOCAL_ENTRIES,
+                 local_ttl: float = DEFAULT_LOCAL_TTL_SECONDS, claim_ttl: int = DEFAULT_CLAIM_TTL_SECONDS,
+                 wait_timeout: float = DEFAULT_WAIT_TIMEOUT_SECONDS,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL_SECONDS, clock=time.monotonic):
+        self.backend = backend
+        self.local_entries = local_entries
+        self.local_ttl = local_ttl
+        self.claim_ttl = claim_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.local = OrderedDict()   # key -> (value, expires_at), finished results only
+        self.inflight = {}           # key -> Event, keys this process is working on
+
+        # Counters (for monitoring)
+        self.local_hits = 0
+        self.waits = 0
+        self.lost_claims = 0
+
+    def _local_get(self, key: str):
+        with self.lock:
+            entry = self.local.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= self.clock():
+                del self.local[key]
+                return None
+            self.local.move_to_end(key)
+            self.local_hits += 1
+            return entry[0]
+
+    def _local_put(self, key: str, value: str, ttl: float):
+        with self.lock:
+            self.local[key] = (value, self.clock() + min(ttl, self.local_ttl))
+            self.local.move_to_end(key)
+            while len(self.local) > self.local_entries:
+                self.local.popitem(last=False)
+
+    def _finish(self, key: str):
+        with self.lock:
+            event = self.inflight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def claim(self, key: str) -> Claim:
+        deadline = self.clock() + self.wait_timeout
+        while True:
+            value = self._local_get(key)
+            if value is not None:
+                return Claim(key, value=value)
+
+            with self.lock:
+                event = self.inflight.get(key)
+                owner = event is None
+                if owner:
+                    self.inflight[key] = threading.Event()
+            if not owner:
+                # Same-process duplicate: wait for the owner to finish or give up
+                self.waits += 1
+                if not event.wait(max(0.0, deadline - self.clock())):
+                    raise DuplicateInFlight(key)
+                continue
+
+            marker = INFLIGHT_PREFIX + uuid.uuid4().hex
+            try:
+                claimed, current = self.backend.claim(key, marker, self.claim_ttl)
+            except Exception:
+                self._finish(key)
+                raise
+            if claimed:
+                return Claim(key, marker=marker)
+
+            self._finish(key)
+            if current is not None and not current.startswith(INFLIGHT_PREFIX):
+                self._local_put(key, current, self.local_ttl)
+                return Claim(key, value=current)
+
+            # Another process owns it: poll until it finishes, releases or expires
+            self.waits += 1
+            if self.clock() >= deadline:
+                raise DuplicateInFlight(key)
+            time.sleep(self.poll_interval)
+
+    def complete(self, claim: Claim, value: str, ttl: int) -> bool:
+        """
+        Store the result for an owned claim. False if the claim had expired
+        and the key was taken over meanwhile; the other result is kept.
+        """
+        try:
+            stored = self.backend.complete(claim.key, claim.marker, value, ttl)
+            if stored:
+                self._local_put(claim.key, value, ttl)
+            else:
+                self.lost_claims += 1
+                logging.warning(f"Idempotency claim on {claim.key} expired before completion")
+            return stored
+        finally:
+            self._finish(claim.key)
+
+    def put(self, key: str, value: str, ttl: int):
+        """Overwrite a finished key (e.g. a queued request that has since got its trip)."""
+        self.backend.put(key, value, ttl)
+        self._local_put(key, value, ttl)
+
+    def discard(self, key: str, value: str):
+        """
+        Forget a finished key if it still holds value (e.g. a queued request
+        whose trip could not be made), so a retry with the key starts over.
+        """
+        self.backend.release(key, value)
+        with self.lock:
+            entry = self.local.get(key)
+            if entry is not None and entry[0] == value:
+                del self.local[key]
+
+    def release(self, claim: Claim):
+        """Give up an owned claim (the work failed); waiters may then claim it."""
+        if claim.marker is None:
+            return
+        try:
+            self.backend.release(claim.key, claim.marker)
+        finally:
+            self._finish(claim.key)
+
+
+class AsyncIdempotencyCache:
+    """
+    IdempotencyCache for coroutines, with the same claim / complete /
+    release protocol. Duplicates in this event loop wait on an asyncio.Event
+    for the owning coroutine; only the owner's backend round trips (and any
+    cross-process wait) run on the worker threads, so waiting duplicates can
+    never occupy the threads the owner needs to finish.
+    """
+
+    def __init__(self, cache: IdempotencyCache, workers: int = DEFAULT_ASYNC_WORKERS):
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="idempotency")
+        self.inflight = {}   # key -> asyncio.Event, keys a coroutine here is working on
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    def _finish(self, key: str):
+        event = self.inflight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    async def claim(self, key: str) -> Claim:
+        deadline = self.cache.clock() + self.cache.wait_timeout
+        while key in self.inflight:
+            self.cache.waits += 1
+            try:
+                await asyncio.wait_for(self.inflight[key].wait(), max(0.0, deadline - self.cache.clock()))
+            except asyncio.TimeoutError:
+                raise DuplicateInFlight(key) from None
+        self.inflight[key] = asyncio.Event()
+
+        task = asyncio.ensure_future(self._run(self.cache.claim, key))
+        try:
+            claim = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # The claim still finishes on its thread; hand it straight back
+            task.add_done_callback(lambda t: self._abandon(key, t))
+            raise
+        except Exception:
+            self._finish(key)
+            raise
+        if claim.marker is None:
+            self._finish(key)
+        return claim
+
+    def _abandon(self, key: str, task):
+        if not task.cancelled() and task.exception() is None and task.result().marker is not None:
+            asyncio.ensure_future(self.release(task.result()))
+        else:
+            self._finish(key)
+
+    async def complete(self, claim: Claim, value: str, ttl: int) -> bool:
+        try:
+            return await self._run(self.cache.complete, claim, value, ttl)
+        finally:
+            self._finish(claim.key)
+
+    async def put(self, key: str, value: str, ttl: int):
+        await self._run(self.cache.put, key, value, ttl)
+
+    async def release(self, claim: Claim):
+        try:
+            await self._run(self.cache.release, claim)
+        finally:
+            self._finish(claim.key)
+
+    def close(self):
+        """Stop the worker threads once pending backend steps are done."""
+        self.executor.shutdown(wait=True)
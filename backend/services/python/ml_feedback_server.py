@@ -1,29 +1,178 @@
 # ml_feedback_server.py
+#
+# Feedback is stored and served as raw bytes: SendFeedback keeps the request
+# as it arrived and GetTrainingBatch streams stored bytes back unchanged, so
+# the service is registered with a generic handler whose (de)serializers are
+# the identity for Feedback payloads. SendFeedback is idempotent per
+# trip_request_id (see feedback_store) and answers with a FeedbackAck.
+#
+# GetTrainingBatch pages through a consistent snapshot: the first call pins
+# the rows present at that moment, and the continuation token returned in
+# trailing metadata carries the row cursor and that snapshot bound.
 
 import grpc
+import hashlib
+import os
+import threading
 from concurrent import futures
-from protos import ml_feedback_pb2_grpc, ml_feedback_pb2
 
-feedback_store = []
+from ml_feedback_pb2 import Feedback, FeedbackAck, TrainingBatchRequest
 
-class MLFeedbackService(ml_feedback_pb2_grpc.MLFeedbackServiceServicer):
+from feedback_store import FeedbackStore, DUPLICATE, REPLACED
+from feedback_features import FeatureExporter
 
-    def SendFeedback(self, request, context):
-        feedback_store.append(request)
-        print(f"ML Feedback received for TripRequest {request.trip_request_id}")
-        return request
+SERVICE_NAME = "dgdo.ml_feedback.MLFeedbackService"
 
-    def GetTrainingBatch(self, request, context):
-        for f in feedback_store:
-            yield f
+# Feature-matrix export (disabled unless FEATURE_EXPORT_DIR is set)
+FEATURE_EXPORT_DIR = os.environ.get("FEATURE_EXPORT_DIR")
+FEATURE_EXPORT_INTERVAL_SECONDS = float(os.environ.get("FEATURE_EXPORT_INTERVAL_SECONDS", "60"))
+
+# -----------------------------
+# GetTrainingBatch paging
+# -----------------------------
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 10_000
+PAGE_CHUNK = 500   # rows copied per store lock acquisition
+
+# TrainingBatchRequest.metadata keys that are not metadata equality filters
+TOKEN_KEY = "continuation_token"
+SUCCESS_KEY = "success_flag"
+# Trailing metadata key carrying the token for the next call
+TOKEN_TRAILER = "continuation-token"
+
+def filters_digest(filters: dict, success) -> str:
+    """Short fingerprint binding a token to the filters it was issued for."""
+    text = repr((sorted(filters.items()), success))
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=6).hexdigest()
+
+def make_token(next_row: int, end: int, digest: str) -> str:
+    return f"{next_row}.{end}.{digest}"
+
+def parse_token(token: str, digest: str):
+    """(next_row, end) from a token; ValueError if malformed or issued for other filters."""
+    next_row, end, token_digest = token.split(".")
+    if token_digest != digest:
+        raise ValueError("continuation_token was issued for different filters")
+    next_row, end = int(next_row), int(end)
+    if not 0 <= next_row <= end:
+        raise ValueError("continuation_token is out of range")
+    return next_row, end
+
+def parse_success(value: str):
+    if value in ("", None):
+        return None
+    if value.lower() in ("true", "1"):
+        return True
+    if value.lower() in ("false", "0"):
+        return False
+    raise ValueError("success_flag must be true or false")
+
+class MLFeedbackService:
+    """
+    MLFeedbackService over raw payloads: Feedback arrives in SendFeedback
+    and leaves GetTrainingBatch as serialized bytes. Register with
+    add_MLFeedbackService_to_server.
+    """
+
+    def __init__(self, store: FeedbackStore = None):
+        self.store = store if store is not None else FeedbackStore()
+
+    def SendFeedback(self, request: bytes, context):
+        feedback = Feedback.FromString(request)
+        if not feedback.trip_request_id:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details("trip_request_id is required")
+            return FeedbackAck()
+        _, outcome = self.store.put(request, feedback)
+        print(f"ML Feedback {outcome} for TripRequest {feedback.trip_request_id}")
+        return FeedbackAck(
+            trip_request_id=feedback.trip_request_id,
+            duplicate=outcome == DUPLICATE,
+            replaced=outcome == REPLACED,
+        )
+
+    def GetTrainingBatch(self, request: TrainingBatchRequest, context):
+        """
+        Stream one page of at most batch_size Feedback (default
+        DEFAULT_BATCH_SIZE, capped at MAX_BATCH_SIZE). Metadata keys:
+          success_flag        - "true" | "false"
+          continuation_token  - from the previous page's trailing metadata
+        Every other key is an equality filter on Feedback.metadata. When more
+        rows match, trailing metadata carries "continuation-token"; pass it
+        back with the same filters to get the next page.
+        """
+        options = request.metadata.data
+        filters = {k: v for k, v in options.items() if k not in (TOKEN_KEY, SUCCESS_KEY)}
+        if request.batch_size < 0:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details("batch_size must not be negative")
+            return
+        batch_size = min(request.batch_size or DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE)
+        try:
+            success = parse_success(options.get(SUCCESS_KEY))
+            digest = filters_digest(filters, success)
+            token = options.get(TOKEN_KEY)
+            cursor, end = parse_token(token, digest) if token else (0, len(self.store))
+        except ValueError as e:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(str(e))
+            return
+
+        # Select the page's rows once, then copy their bytes a chunk at a time
+        rows, cursor = self.store.matching_rows(cursor, end, batch_size, filters, success)
+        for i in range(0, len(rows), PAGE_CHUNK):
+            for data in self.store.get_rows(rows[i:i + PAGE_CHUNK]):
+                if not context.is_active():
+                    return
+                yield data
+
+        if cursor is not None:
+            context.set_trailing_metadata(((TOKEN_TRAILER, make_token(cursor, end, digest)),))
+
+def add_MLFeedbackService_to_server(service: MLFeedbackService, server):
+    """Register service with bytes passed through for Feedback payloads."""
+    handlers = {
+        "SendFeedback": grpc.unary_unary_rpc_method_handler(
+            service.SendFeedback,
+            request_deserializer=None,
+            response_serializer=FeedbackAck.SerializeToString,
+        ),
+        "GetTrainingBatch": grpc.unary_stream_rpc_method_handler(
+            service.GetTrainingBatch,
+            request_deserializer=TrainingBatchRequest.FromString,
+            response_serializer=None,
+        ),
+    }
+    server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler(SERVICE_NAME, handlers),))
+
+def run_feature_export(exporter: FeatureExporter, stop_event: threading.Event):
+    """Write complete feature shards every FEATURE_EXPORT_INTERVAL_SECONDS; flush the rest on stop."""
+    while not stop_event.wait(FEATURE_EXPORT_INTERVAL_SECONDS):
+        written = exporter.export()
+        if written:
+            print(f"Exported {written} feature shard(s) to {exporter.out_dir}")
+    exporter.export(flush=True)
 
 def serve():
+    service = MLFeedbackService()
+    stop_event = threading.Event()
+    exporter_thread = None
+    if FEATURE_EXPORT_DIR:
+        exporter = FeatureExporter(service.store, FEATURE_EXPORT_DIR)
+        exporter_thread = threading.Thread(target=run_feature_export, args=(exporter, stop_event), daemon=True)
+        exporter_thread.start()
+
     server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    ml_feedback_pb2_grpc.add_MLFeedbackServiceServicer_to_server(MLFeedbackService(), server)
+    add_MLFeedbackService_to_server(service, server)
     server.add_insecure_port('[::]:50055')
     server.start()
     print("MLFeedbackService running on port 50055")
-    server.wait_for_termination()
+    try:
+        server.wait_for_termination()
+    finally:
+        stop_event.set()
+        if exporter_thread is not None:
+            exporter_thread.join()
 
 if __name__ == '__main__':
     serve()
@@ -0,0 +1,135 @@
+# pricing_fallback.py
+# The linear fallback pricing model, shared by PricingService and callers.
+#
+# quote_from_config() is the whole model: base + distance + time, times
+# surge, floored at the minimum fare, split by the commission rate.
+# PricingService answers CalculatePrice with it; FallbackPricer lets a
+# caller answer it locally from the last FallbackPricingConfig it fetched
+# (GetFallbackConfig) when PricingService is unavailable, too slow, or its
+# circuit breaker is open. The config is refreshed on a background thread,
+# never on the caller's path (or under the caller's deadline).
+
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import grpc
+from google.protobuf.timestamp_pb2 import Timestamp
+
+from pricing_pb2 import PriceCalculationResponse, FallbackPricingConfig
+
+# -----------------------------
+# Defaults
+# -----------------------------
+MODEL_VERSION = "fallback_linear_v1"
+CLIENT_MODEL_VERSION = "client_fallback_linear_v1"
+
+# How long a calculated price may be honoured (e.g. a quote computed while
+# matching is still running)
+PRICE_VALIDITY_SECONDS = 120
+
+DEFAULT_REFRESH_SECONDS = 60.0
+
+# Errors that mean "no answer from pricing", not "pricing said no"
+FALLBACK_CODES = frozenset({grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED})
+
+
+def now_timestamp(offset_seconds: float = 0):
+    ts = Timestamp()
+    ts.FromDatetime(datetime.utcnow() + timedelta(seconds=offset_seconds))
+    return ts
+
+
+def quote_from_config(request, cfg: FallbackPricingConfig, model_version: str = MODEL_VERSION):
+    """PriceCalculationResponse for request under the linear model cfg."""
+    base = cfg.base_rate_kzt
+    distance_fare = request.estimated_distance_meters * cfg.per_meter_rate_kzt
+    time_fare = request.estimated_duration_seconds * cfg.per_second_rate_kzt
+    surge = max(1.0, request.demand_multiplier)
+
+    passenger_total = (base + distance_fare + time_fare) * surge
+    if passenger_total < cfg.minimum_fare_kzt:
+        passenger_total = cfg.minimum_fare_kzt
+
+    commission = cfg.platform_commission_rate
+    driver_payout = passenger_total * (1.0 - commission)
+    platform_take = passenger_total - driver_payout
+
+    resp = PriceCalculationResponse(
+        trip_request_id=request.trip_request_id,
+        calculation_id=str(uuid.uuid4()),
+        passenger_fare_total=passenger_total,
+        driver_payout_total=driver_payout,
+        platform_commission=platform_take,
+        estimated_distance_meters=request.estimated_distance_meters,
+        estimated_duration_seconds=request.estimated_duration_seconds,
+        demand_multiplier_at_request=request.demand_multiplier,
+        pricing_model_version=model_version,
+        pricing_tier="economy",
+        price_expires_at=now_timestamp(PRICE_VALIDITY_SECONDS),
+        calculated_at=now_timestamp(),
+    )
+
+    # Breakdown
+    resp.passenger_breakdown.base_fare = base
+    resp.passenger_breakdown.distance_fare = distance_fare
+    resp.passenger_breakdown.time_fare = time_fare
+    resp.passenger_breakdown.surge_multiplier = surge
+
+    resp.driver_breakdown.base_fare = base * (1 - commission)
+    resp.driver_breakdown.distance_fare = distance_fare * (1 - commission)
+    resp.driver_breakdown.time_fare = time_fare * (1 - commission)
+    resp.driver_breakdown.surge_multiplier = surge
+
+    resp.calculation_metadata.data["pricing_model"] = model_version
+    resp.calculation_metadata.data["config_version"] = cfg.config_version
+    return resp
+
+
+class FallbackPricer:
+    """CalculatePrice through pricing_stub, priced locally when PricingService gives no answer."""
+
+    def __init__(self, pricing_stub, refresh_seconds: float = DEFAULT_REFRESH_SECONDS):
+        self.pricing_stub = pricing_stub
+        self.refresh_seconds = refresh_seconds
+        self.config = None
+        self.fetched_at = 0.0
+        self.lock = threading.Lock()
+        self.refresher = None   # the in-flight background refresh, if any
+        self.fallbacks = 0
+
+    def refresh(self) -> bool:
+        """Fetch the current FallbackPricingConfig; False (keeping the old one) if pricing is down."""
+        try:
+            self.config = self.pricing_stub.GetFallbackConfig(FallbackPricingConfig())
+        except grpc.RpcError as e:
+            logging.warning(f"GetFallbackConfig failed: {e.code()}")
+            return False
+        self.fetched_at = time.monotonic()
+        return True
+
+    def refresh_in_background(self):
+        """Start refresh() on its own thread unless one is already running."""
+        with self.lock:
+            if self.refresher is not None and self.refresher.is_alive():
+                return
+            self.refresher = threading.Thread(target=self.refresh, name="fallback-config-refresh", daemon=True)
+            self.refresher.start()
+
+    def price(self, request, timeout: float = None):
+        try:
+            response = self.pricing_stub.CalculatePrice(request, timeout=timeout)
+        except grpc.RpcError as e:
+            if e.code() not in FALLBACK_CODES or self.config is None:
+                raise
+            self.fallbacks += 1
+            logging.warning(f"CalculatePrice {e.code()}, priced locally with config {self.config.config_version}")
+            response = quote_from_config(request, self.config, CLIENT_MODEL_VERSION)
+            response.calculation_metadata.data["fallback_reason"] = e.code().name
+            return response
+        # Pricing is healthy: keep the local copy of its config current
+        if self.config is None or time.monotonic() - self.fetched_at > self.refresh_seconds:
+            self.refresh_in_background()
+        return response
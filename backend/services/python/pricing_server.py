@@ -2,15 +2,16 @@
 
 import grpc
 from concurrent import futures
-import uuid
 import threading
 from datetime import datetime
-from google.protobuf.timestamp_pb2 import Timestamp
 
 from pricing_pb2_grpc import PricingServiceServicer, add_PricingServiceServicer_to_server
 from pricing_pb2 import PriceCalculationRequest, PriceCalculationResponse, FallbackPricingConfig
 from common_pb2 import Metadata
 
+# The linear model itself (shared with callers' local fallback)
+from pricing_fallback import quote_from_config
+
 # -----------------------------
 # In-memory fallback configuration
 # -----------------------------
@@ -27,11 +28,6 @@ fallback_config = FallbackPricingConfig(
 # -----------------------------
 # Helpers
 # -----------------------------
-def now_timestamp():
-    ts = Timestamp()
-    ts.FromDatetime(datetime.utcnow())
-    return ts
-
 def positive_unit_economics(passenger_total, driver_payout, operational_cost=50):
     """
     Enforce positive unit economics:
@@ -46,57 +42,18 @@ class PricingService(PricingServiceServicer):
 
     def CalculatePrice(self, request: PriceCalculationRequest, context):
         with fallback_lock:
-            cfg = fallback_config
-
-        # Base components
-        base = cfg.base_rate_kzt
-        distance_fare = request.estimated_distance_meters * cfg.per_meter_rate_kzt
-        time_fare = request.estimated_duration_seconds * cfg.per_second_rate_kzt
-        surge = max(1.0, request.demand_multiplier)
-
-        passenger_total = (base + distance_fare + time_fare) * surge
-        if passenger_total < cfg.minimum_fare_kzt:
-            passenger_total = cfg.minimum_fare_kzt
+            cfg = FallbackPricingConfig()
+            cfg.CopyFrom(fallback_config)
 
-        commission = cfg.platform_commission_rate
-        driver_payout = passenger_total * (1.0 - commission)
-        platform_take = passenger_total - driver_payout
+        resp = quote_from_config(request, cfg)
 
         # Enforce positive unit economics
-        if not positive_unit_economics(passenger_total, driver_payout):
+        if not positive_unit_economics(resp.passenger_fare_total, resp.driver_payout_total):
             context.set_code(grpc.StatusCode.FAILED_PRECONDITION)
             context.set_details("Unit economics violated: adjust pricing configuration")
             return PriceCalculationResponse()
 
-        # Build response
-        resp = PriceCalculationResponse(
-            trip_request_id=request.trip_request_id,
-            calculation_id=str(uuid.uuid4()),
-            passenger_fare_total=passenger_total,
-            driver_payout_total=driver_payout,
-            platform_commission=platform_take,
-            estimated_distance_meters=request.estimated_distance_meters,
-            estimated_duration_seconds=request.estimated_duration_seconds,
-            demand_multiplier_at_request=request.demand_multiplier,
-            pricing_model_version="fallback_linear_v1",
-            pricing_tier="economy",
-            price_expires_at=now_timestamp(),
-            calculated_at=now_timestamp(),
-        )
-
-        # Breakdown
-        resp.passenger_breakdown.base_fare = base
-        resp.passenger_breakdown.distance_fare = distance_fare
-        resp.passenger_breakdown.time_fare = time_fare
-        resp.passenger_breakdown.surge_multiplier = surge
-
-        resp.driver_breakdown.base_fare = base * (1 - commission)
-        resp.driver_breakdown.distance_fare = distance_fare * (1 - commission)
-        resp.driver_breakdown.time_fare = time_fare * (1 - commission)
-        resp.driver_breakdown.surge_multiplier = surge
-
-        resp.calculation_metadata.data["pricing_model"] = resp.pricing_model_version
-        print(f"[{datetime.utcnow()}] Calculated price for trip {request.trip_request_id}: {passenger_total}")
+        print(f"[{datetime.utcnow()}] Calculated price for trip {request.trip_request_id}: {resp.passenger_fare_total}")
         return resp
 
     def GetFallbackConfig(self, request: FallbackPricingConfig, context):
@@ -0,0 +1,139 @@
+# record_buffers.py
+# Raw serialized-message storage for the telemetry and ML feedback stores.
+#
+# Messages are kept exactly as they arrived on the wire, packed back to back
+# into large bytearray chunks; a NumPy offset index (chunk, start, length)
+# locates each record. Compared to lists of parsed protobufs this removes the
+# per-message Python object overhead, and reads can hand the bytes straight
+# back to gRPC without a parse/serialize cycle.
+
+import numpy as np
+
+# -----------------------------
+# Defaults
+# -----------------------------
+DEFAULT_CHUNK_BYTES = 1 << 20
+INITIAL_INDEX_CAPACITY = 1024
+
+
+class _Chunks:
+    """Append-only byte chunks; chunk numbers keep counting after old chunks are released."""
+
+    def __init__(self, chunk_bytes: int):
+        self.chunk_bytes = chunk_bytes
+        self.chunks = [bytearray()]
+        self.first = 0   # chunk number of self.chunks[0]
+
+    def append(self, data: bytes):
+        chunk = self.chunks[-1]
+        if chunk and len(chunk) + len(data) > self.chunk_bytes:
+            chunk = bytearray()
+            self.chunks.append(chunk)
+        start = len(chunk)
+        chunk += data
+        return self.first + len(self.chunks) - 1, start
+
+    def get(self, chunk_no: int, start: int, length: int) -> bytes:
+        return bytes(self.chunks[chunk_no - self.first][start:start + length])
+
+    def release_before(self, chunk_no: int):
+        drop = chunk_no - self.first
+        if drop > 0:
+            del self.chunks[:drop]
+            self.first = chunk_no
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(c) for c in self.chunks)
+
+
+class RecordRing:
+    """
+    Fixed-capacity FIFO of raw records addressed by a monotonically
+    increasing offset. Chunks are released once every record in them has
+    been popped, so memory is bounded by capacity * record size.
+    """
+
+    def __init__(self, capacity: int, chunk_bytes: int = DEFAULT_CHUNK_BYTES):
+        self.capacity = capacity
+        self.bytes = _Chunks(chunk_bytes)
+        self.chunk = np.zeros(capacity, dtype=np.int64)
+        self.start = np.zeros(capacity, dtype=np.int64)
+        self.length = np.zeros(capacity, dtype=np.int64)
+        self.ts = np.zeros(capacity, dtype=np.float64)
+        self.first = 0   # offset of the oldest record
+        self.next = 0    # offset the next record will get
+
+    def __len__(self):
+        return self.next - self.first
+
+    def append(self, data: bytes, ts: float) -> int:
+        if len(self) >= self.capacity:
+            raise OverflowError("record ring is full; pop_oldest() first")
+        offset = self.next
+        i = offset % self.capacity
+        self.chunk[i], self.start[i] = self.bytes.append(data)
+        self.length[i] = len(data)
+        self.ts[i] = ts
+        self.next += 1
+        return offset
+
+    def get(self, offset: int) -> bytes:
+        i = offset % self.capacity
+        return self.bytes.get(int(self.chunk[i]), int(self.start[i]), int(self.length[i]))
+
+    def timestamp(self, offset: int) -> float:
+        return float(self.ts[offset % self.capacity])
+
+    def pop_oldest(self):
+        """Remove and return (offset, ts, data) of the oldest record."""
+        offset = self.first
+        data, ts = self.get(offset), self.timestamp(offset)
+        self.first += 1
+        if len(self):
+            self.bytes.release_before(int(self.chunk[self.first % self.capacity]))
+        return offset, ts, data
+
+    def offsets(self):
+        return range(self.first, self.next)
+
+
+class RecordLog:
+    """
+    Append-only list of raw records addressed by row number. A row can be
+    repointed at a newer record (the old bytes become unreachable garbage).
+    """
+
+    def __init__(self, chunk_bytes: int = DEFAULT_CHUNK_BYTES):
+        self.bytes = _Chunks(chunk_bytes)
+        self.chunk = np.zeros(INITIAL_INDEX_CAPACITY, dtype=np.int64)
+        self.start = np.zeros(INITIAL_INDEX_CAPACITY, dtype=np.int64)
+        self.length = np.zeros(INITIAL_INDEX_CAPACITY, dtype=np.int64)
+        self.rows = 0
+
+    def __len__(self):
+        return self.rows
+
+    def _grow(self):
+        capacity = len(self.chunk) * 2
+        for name in ("chunk", "start", "length"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def append(self, data: bytes) -> int:
+        if self.rows == len(self.chunk):
+            self._grow()
+        row = self.rows
+        self.chunk[row], self.start[row] = self.bytes.append(data)
+        self.length[row] = len(data)
+        self.rows += 1
+        return row
+
+    def replace(self, row: int, data: bytes):
+        self.chunk[row], self.start[row] = self.bytes.append(data)
+        self.length[row] = len(data)
+
+    def get(self, row: int) -> bytes:
+        return self.bytes.get(int(self.chunk[row]), int(self.start[row]), int(self.length[row]))
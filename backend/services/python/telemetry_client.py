@@ -0,0 +1,93 @@
+# telemetry_client.py
+# Fire-and-forget telemetry for callers on the critical path.
+#
+# log() only enqueues; a background thread drains the queue into
+# TelemetryService.LogEvents streams, one stream per batch. A batch is sent
+# when it reaches max_batch events or max_delay seconds after its first
+# event, whichever comes first. When the queue is full, events are dropped
+# and counted instead of blocking the caller.
+
+import logging
+import queue
+import threading
+import time
+
+from telemetry_pb2 import TelemetryEvent
+
+# -----------------------------
+# Defaults
+# -----------------------------
+DEFAULT_MAX_BATCH = 500
+DEFAULT_MAX_DELAY_SECONDS = 0.5
+DEFAULT_MAX_QUEUE = 10_000
+DEFAULT_RPC_TIMEOUT_SECONDS = 5.0
+
+
+class TelemetryBatcher:
+
+    def __init__(self, stub, max_batch: int = DEFAULT_MAX_BATCH, max_delay: float = DEFAULT_MAX_DELAY_SECONDS,
+                 max_queue: int = DEFAULT_MAX_QUEUE, rpc_timeout: float = DEFAULT_RPC_TIMEOUT_SECONDS):
+        self.stub = stub
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.rpc_timeout = rpc_timeout
+        self.queue = queue.Queue(maxsize=max_queue)
+
+        # Counters (approximate under concurrency, for monitoring only)
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="telemetry-batcher", daemon=True)
+        self._thread.start()
+
+    def log(self, event: TelemetryEvent) -> bool:
+        """Enqueue an event without blocking. Returns False if it was dropped."""
+        if not event.HasField("timestamp"):
+            event.timestamp.GetCurrentTime()
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self, timeout: float = None):
+        """Flush what is queued and stop the background thread."""
+        self._closed.set()
+        self._thread.join(timeout)
+
+    # -----------------------------
+    # Background sender
+    # -----------------------------
+    def _next_batch(self) -> list:
+        try:
+            first = self.queue.get(timeout=self.max_delay)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _send(self, batch: list):
+        try:
+            self.stub.LogEvents(iter(batch), timeout=self.rpc_timeout)
+            self.sent += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logging.warning("Telemetry batch of %d events failed: %s", len(batch), e)
+
+    def _run(self):
+        while not (self._closed.is_set() and self.queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._send(batch)
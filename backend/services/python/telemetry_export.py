@@ -0,0 +1,236 @@
+# telemetry_export.py
+# Columnar export of spilled telemetry segments for offline analysis.
+#
+#   python telemetry_export.py <telemetry_data_dir> <export_dir> [--format npy|arrow]
+#
+# Each closed segment (one with an .idx.json sidecar, or any segment but the
+# newest, e.g. one left behind by a crash) is exported once;
+# exported segment names are recorded in <export_dir>/_exported.json, so
+# the command can run repeatedly (e.g. from cron) and only picks up new
+# segments. Rows are partitioned by UTC day and event_type:
+#
+#   <export_dir>/date=YYYY-MM-DD/event_type=<name>/part-<segment>/
+#
+# "npy" layout (default, NumPy only). Every file loads with
+# np.load(path, mmap_mode="r"), so a month of events can be scanned without
+# reading it into RAM:
+#   timestamp_ns.npy               int64
+#   event_type.npy, reason_code.npy int32 codes into <export_dir>/dictionaries.json
+#   duration_ms.npy                float64, NaN when the event carries none
+#   entity_id.offsets.npy          int64, n + 1 offsets into entity_id.data.bin (UTF-8)
+#   metadata.offsets.npy           int64, n + 1 offsets into metadata.data.bin (JSON objects)
+#
+# Dictionary codes are append-only across runs, so codes from different
+# parts are comparable. "arrow" writes the same columns to one Arrow IPC file
+# per part (part-<segment>.arrow) with dictionary-typed event_type and
+# reason_code; it needs pyarrow.
+
+import argparse
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+
+import numpy as np
+
+from telemetry_pb2 import TelemetryEvent
+
+from telemetry_store import read_segment
+from telemetry_rollups import DURATION_KEY
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+EXPORTED_FILE = "_exported.json"
+DICTIONARIES_FILE = "dictionaries.json"
+DICTIONARY_FIELDS = ("event_type", "reason_code")
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def _load_json(path: str, default):
+    if not os.path.exists(path):
+        return default
+    with open(path) as f:
+        return json.load(f)
+
+def _save_json(path: str, value):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(value, f)
+    os.replace(tmp, path)
+
+def _duration_ms(event: TelemetryEvent) -> float:
+    try:
+        return float(event.metadata.data.get(DURATION_KEY) or "nan")
+    except ValueError:
+        return float("nan")
+
+def _string_column(values: list):
+    """(offsets, data) for a list of str: data[offsets[i]:offsets[i + 1]] is values[i] as UTF-8."""
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, b"".join(encoded)
+
+def partition_path(export_dir: str, day: str, event_type: str) -> str:
+    # event_type is free text; keep path separators out of the directory name
+    return os.path.join(export_dir, f"date={day}", f"event_type={event_type.replace(os.sep, '_') or '_'}")
+
+
+# -----------------------------
+# Dictionaries
+# -----------------------------
+class Dictionaries:
+    """Append-only value -> code mappings shared by all exported parts."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.values = _load_json(path, {field: [] for field in DICTIONARY_FIELDS})
+        self.codes = {field: {v: i for i, v in enumerate(values)} for field, values in self.values.items()}
+
+    def code(self, field: str, value: str) -> int:
+        codes = self.codes[field]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self.values[field])
+            self.values[field].append(value)
+        return code
+
+    def save(self):
+        _save_json(self.path, self.values)
+
+
+# -----------------------------
+# Export
+# -----------------------------
+def _partition_rows(path: str) -> dict:
+    """{(day, event_type): [TelemetryEvent]} for one segment, in write order."""
+    partitions = {}
+    for data in read_segment(path):
+        event = TelemetryEvent.FromString(data)
+        day = datetime.fromtimestamp(event.timestamp.seconds, tz=timezone.utc).strftime("%Y-%m-%d")
+        partitions.setdefault((day, event.event_type), []).append(event)
+    return partitions
+
+def _columns(events: list, dictionaries: Dictionaries) -> dict:
+    return {
+        "timestamp_ns": np.array([e.timestamp.ToNanoseconds() for e in events], dtype=np.int64),
+        "event_type": np.array([dictionaries.code("event_type", e.event_type) for e in events], dtype=np.int32),
+        "reason_code": np.array([dictionaries.code("reason_code", e.reason_code) for e in events], dtype=np.int32),
+        "duration_ms": np.array([_duration_ms(e) for e in events], dtype=np.float64),
+        "entity_id": _string_column([e.entity_id for e in events]),
+        "metadata": _string_column([json.dumps(dict(e.metadata.data), sort_keys=True) for e in events]),
+    }
+
+def _write_npy(part_dir: str, columns: dict):
+    tmp = part_dir + ".tmp"
+    os.makedirs(tmp, exist_ok=True)
+    for name, column in columns.items():
+        if isinstance(column, tuple):
+            offsets, data = column
+            np.save(os.path.join(tmp, f"{name}.offsets.npy"), offsets)
+            with open(os.path.join(tmp, f"{name}.data.bin"), "wb") as f:
+                f.write(data)
+        else:
+            np.save(os.path.join(tmp, f"{name}.npy"), column)
+    # A part becomes visible only once complete; a rerun after a crash replaces it
+    if os.path.exists(part_dir):
+        shutil.rmtree(part_dir)
+    os.replace(tmp, part_dir)
+
+def _write_arrow(part_path: str, columns: dict, dictionaries: Dictionaries):
+    arrays, names = [], []
+    for name, column in columns.items():
+        if name in DICTIONARY_FIELDS:
+            array = pa.DictionaryArray.from_arrays(pa.array(column), pa.array(dictionaries.values[name]))
+        elif isinstance(column, tuple):
+            offsets, data = column
+            array = pa.LargeStringArray.from_buffers(len(offsets) - 1, pa.py_buffer(offsets), pa.py_buffer(data))
+        else:
+            array = pa.array(column)
+        arrays.append(array)
+        names.append(name)
+    table = pa.Table.from_arrays(arrays, names=names)
+    tmp = part_path + ".tmp"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, part_path)
+
+def export_segments(data_dir: str, export_dir: str, fmt: str = "npy") -> list:
+    """Export closed segments not exported yet; returns the segment names exported."""
+    if fmt == "arrow" and pa is None:
+        raise RuntimeError("--format arrow needs pyarrow; use --format npy")
+    os.makedirs(export_dir, exist_ok=True)
+    exported_path = os.path.join(export_dir, EXPORTED_FILE)
+    exported = set(_load_json(exported_path, []))
+    dictionaries = Dictionaries(os.path.join(export_dir, DICTIONARIES_FILE))
+
+    done = []
+    names = sorted(n for n in os.listdir(data_dir) if n.startswith("segment_") and n.endswith(".log"))
+    for name in names:
+        if name in exported:
+            continue
+        path = os.path.join(data_dir, name)
+        if name == names[-1] and not os.path.exists(path[:-len(".log")] + ".idx.json"):
+            continue   # still the active segment
+        part = f"part-{name[len('segment_'):-len('.log')]}"
+        partitions = {key: _columns(events, dictionaries) for key, events in _partition_rows(path).items()}
+        # Dictionaries first: an exported part must never reference unsaved codes
+        dictionaries.save()
+        for (day, event_type), columns in partitions.items():
+            partition = partition_path(export_dir, day, event_type)
+            os.makedirs(partition, exist_ok=True)
+            if fmt == "arrow":
+                _write_arrow(os.path.join(partition, part + ".arrow"), columns, dictionaries)
+            else:
+                _write_npy(os.path.join(partition, part), columns)
+        exported.add(name)
+        _save_json(exported_path, sorted(exported))
+        done.append(name)
+    return done
+
+
+# -----------------------------
+# Reading the npy layout
+# -----------------------------
+class StringColumn:
+    """Memory-mapped offsets + UTF-8 data; indexing decodes one value."""
+
+    def __init__(self, part_dir: str, name: str):
+        self.offsets = np.load(os.path.join(part_dir, f"{name}.offsets.npy"), mmap_mode="r")
+        self.data = np.memmap(os.path.join(part_dir, f"{name}.data.bin"), dtype=np.uint8, mode="r") \
+            if self.offsets[-1] else np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+def load_part(part_dir: str) -> dict:
+    """Columns of one npy part, memory-mapped."""
+    columns = {}
+    for name in os.listdir(part_dir):
+        if name.endswith(".offsets.npy"):
+            column = name[:-len(".offsets.npy")]
+            columns[column] = StringColumn(part_dir, column)
+        elif name.endswith(".npy"):
+            columns[name[:-len(".npy")]] = np.load(os.path.join(part_dir, name), mmap_mode="r")
+    return columns
+
+def load_dictionaries(export_dir: str) -> dict:
+    return _load_json(os.path.join(export_dir, DICTIONARIES_FILE), {field: [] for field in DICTIONARY_FIELDS})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export telemetry segments to a columnar layout")
+    parser.add_argument("data_dir")
+    parser.add_argument("export_dir")
+    parser.add_argument("--format", choices=("npy", "arrow"), default="npy")
+    args = parser.parse_args()
+    names = export_segments(args.data_dir, args.export_dir, args.format)
+    print(f"Exported {len(names)} segment(s) to {args.export_dir}")
@@ -0,0 +1,149 @@
+# telemetry_rollups.py
+# Pre-aggregated telemetry metrics maintained at ingest time.
+#
+# Every event increments a counter keyed by (event_type, reason_code) in the
+# current 1s, 1m and 1h bucket. Events that carry a duration in their
+# metadata ("duration_ms") also feed a fixed-boundary latency histogram in
+# the same buckets. Each window keeps a bounded number of buckets, so an
+# aggregate query costs O(buckets in range), independent of event volume.
+
+import bisect
+import threading
+
+# -----------------------------
+# Windows and retention
+# -----------------------------
+WINDOWS = {
+    "1s": 1,
+    "1m": 60,
+    "1h": 3600,
+}
+RETENTION_BUCKETS = {
+    "1s": 3600,   # last hour
+    "1m": 1440,   # last day
+    "1h": 720,    # last 30 days
+}
+
+DURATION_KEY = "duration_ms"
+
+# Upper bounds (ms) of the latency histogram bins; the last bin is open-ended
+LATENCY_BOUNDS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000]
+
+
+class Rollup:
+    """Count plus latency histogram for one (bucket, event_type, reason_code)."""
+
+    __slots__ = ("count", "latency_count", "latency_sum_ms", "latency_bins")
+
+    def __init__(self):
+        self.count = 0
+        self.latency_count = 0
+        self.latency_sum_ms = 0.0
+        self.latency_bins = None
+
+    def add(self, duration_ms: float = None):
+        self.count += 1
+        if duration_ms is None:
+            return
+        if self.latency_bins is None:
+            self.latency_bins = [0] * (len(LATENCY_BOUNDS_MS) + 1)
+        self.latency_bins[bisect.bisect_left(LATENCY_BOUNDS_MS, duration_ms)] += 1
+        self.latency_count += 1
+        self.latency_sum_ms += duration_ms
+
+    def merge(self, other: "Rollup"):
+        self.count += other.count
+        if other.latency_bins is None:
+            return
+        if self.latency_bins is None:
+            self.latency_bins = [0] * (len(LATENCY_BOUNDS_MS) + 1)
+        for i, n in enumerate(other.latency_bins):
+            self.latency_bins[i] += n
+        self.latency_count += other.latency_count
+        self.latency_sum_ms += other.latency_sum_ms
+
+    def percentile_ms(self, q: float):
+        """Upper bound of the bin holding the q-quantile (None without latency data)."""
+        if not self.latency_count:
+            return None
+        rank = q * self.latency_count
+        seen = 0
+        for i, n in enumerate(self.latency_bins):
+            seen += n
+            if seen >= rank and n:
+                return LATENCY_BOUNDS_MS[i] if i < len(LATENCY_BOUNDS_MS) else float("inf")
+        return float("inf")
+
+
+class RollupWindow:
+
+    def __init__(self, seconds: int, retention: int):
+        self.seconds = seconds
+        self.retention = retention
+        self.starts = []         # retained bucket start times, ascending
+        self.buckets = {}        # start -> {(event_type, reason_code): Rollup}
+
+    def bucket_for(self, ts: float):
+        start = int(ts // self.seconds) * self.seconds
+        bucket = self.buckets.get(start)
+        if bucket is not None:
+            return bucket
+        if self.starts and start < self.starts[0]:
+            return None   # older than retention
+        self.buckets[start] = bucket = {}
+        if not self.starts or start > self.starts[-1]:
+            self.starts.append(start)
+        else:
+            # Late event for a gap inside the retained range
+            bisect.insort(self.starts, start)
+        if len(self.starts) > self.retention:
+            for old in self.starts[:-self.retention]:
+                del self.buckets[old]
+            del self.starts[:-self.retention]
+        return bucket
+
+    def between(self, start: float = None, end: float = None):
+        """Yield (bucket_start, {key: Rollup}) for buckets overlapping [start, end]."""
+        starts = self.starts
+        lo = 0 if start is None else bisect.bisect_left(starts, int(start // self.seconds) * self.seconds)
+        hi = len(starts) if end is None else bisect.bisect_right(starts, end)
+        for i in range(lo, hi):
+            yield starts[i], self.buckets[starts[i]]
+
+
+class TelemetryRollups:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.windows = {name: RollupWindow(seconds, RETENTION_BUCKETS[name]) for name, seconds in WINDOWS.items()}
+
+    def add(self, event_type: str, reason_code: str, ts: float, duration_ms: float = None):
+        key = (event_type, reason_code)
+        with self.lock:
+            for window in self.windows.values():
+                bucket = window.bucket_for(ts)
+                if bucket is None:
+                    continue
+                rollup = bucket.get(key)
+                if rollup is None:
+                    bucket[key] = rollup = Rollup()
+                rollup.add(duration_ms)
+
+    def query(self, window: str, start: float = None, end: float = None,
+              event_type: str = None, reason_code: str = None) -> list:
+        """
+        [(bucket_start, event_type, reason_code, Rollup)] for one window,
+        ordered by bucket. Returned rollups are copies, safe to read unlocked.
+        """
+        results = []
+        with self.lock:
+            for bucket_start, bucket in self.windows[window].between(start, end):
+                for (etype, reason), rollup in sorted(bucket.items()):
+                    if event_type is not None and etype != event_type:
+                        continue
+                    if reason_code is not None and reason != reason_code:
+                        continue
+                    copy = Rollup()
+                    copy.merge(rollup)
+                    results.append((bucket_start, etype, reason, copy))
+        return results
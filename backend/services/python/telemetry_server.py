@@ -1,29 +1,177 @@
 # telemetry_server.py
+#
+# Events are handled as raw bytes end to end: ingest parses a message once to
+# read its indexed fields but stores the bytes it arrived as, and
+# QueryMetrics streams stored bytes back unchanged. The service is therefore
+# registered with a generic handler whose (de)serializers are the identity
+# for those payloads, not with add_TelemetryServiceServicer_to_server.
 
 import grpc
 from concurrent import futures
-from protos import telemetry_pb2_grpc, telemetry_pb2
+import os
 
-events = []
+from telemetry_pb2 import TelemetryEvent, LogEventsAck
+from common_pb2 import Metadata
 
-class TelemetryService(telemetry_pb2_grpc.TelemetryServiceServicer):
+from telemetry_store import TelemetryStore, event_time, INDEXED_FIELDS, INDEXED_METADATA_KEYS
+from telemetry_rollups import TelemetryRollups, WINDOWS, DURATION_KEY
 
-    def LogEvent(self, request, context):
-        events.append(request)
-        print(f"Telemetry logged: {request.event_type} for {request.entity_id}")
-        return request
+# -----------------------------
+# Store: recent events in memory, older ones spilled to segment files
+# -----------------------------
+DATA_DIR = os.environ.get("TELEMETRY_DATA_DIR", "telemetry_data")
 
-    def QueryMetrics(self, request, context):
-        for e in events:
-            yield e
+SERVICE_NAME = "dgdo.telemetry.TelemetryService"
+
+# QueryMetrics keys that are not equality filters
+QUERY_OPTION_KEYS = ("start_time", "end_time", "aggregate")
+FILTER_KEYS = INDEXED_FIELDS + INDEXED_METADATA_KEYS
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def parse_time_filter(metadata: Metadata, key: str):
+    """Optional unix-seconds bound from the query Metadata."""
+    value = metadata.data.get(key)
+    return float(value) if value else None
+
+def event_duration_ms(event: TelemetryEvent):
+    value = event.metadata.data.get(DURATION_KEY)
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+def rollup_to_event(window: str, bucket_start: int, event_type: str, reason_code: str, rollup) -> TelemetryEvent:
+    evt = TelemetryEvent(event_type=event_type, reason_code=reason_code)
+    evt.timestamp.FromSeconds(bucket_start)
+    data = evt.metadata.data
+    data["window"] = window
+    data["count"] = str(rollup.count)
+    if rollup.latency_count:
+        data["latency_count"] = str(rollup.latency_count)
+        data["latency_avg_ms"] = f"{rollup.latency_sum_ms / rollup.latency_count:.3f}"
+        for q, name in ((0.5, "latency_p50_ms"), (0.95, "latency_p95_ms"), (0.99, "latency_p99_ms")):
+            data[name] = str(rollup.percentile_ms(q))
+    return evt
+
+# -----------------------------
+# TelemetryService
+# -----------------------------
+class TelemetryService:
+    """
+    TelemetryService over raw payloads: TelemetryEvent requests arrive and
+    responses leave as serialized bytes. Register with
+    add_TelemetryService_to_server.
+    """
+
+    def __init__(self, store: TelemetryStore, rollups: TelemetryRollups = None):
+        self.store = store
+        self.rollups = rollups if rollups is not None else TelemetryRollups()
+
+    def _ingest(self, data: bytes, event: TelemetryEvent) -> bytes:
+        data = self.store.append(data, event)
+        self.rollups.add(event.event_type, event.reason_code, event_time(event), event_duration_ms(event))
+        return data
+
+    def LogEvent(self, request: bytes, context):
+        event = TelemetryEvent.FromString(request)
+        data = self._ingest(request, event)
+        print(f"Telemetry logged: {event.event_type} for {event.entity_id}")
+        return data
+
+    def LogEvents(self, request_iterator, context):
+        accepted = rejected = 0
+        for data in request_iterator:
+            event = TelemetryEvent.FromString(data)
+            if not event.event_type:
+                rejected += 1
+                continue
+            self._ingest(data, event)
+            accepted += 1
+        print(f"Telemetry batch logged: {accepted} accepted, {rejected} rejected")
+        return LogEventsAck(accepted=accepted, rejected=rejected)
+
+    def QueryMetrics(self, request: Metadata, context):
+        """
+        Stream stored events, or pre-aggregated rollups. Supported Metadata keys:
+          start_time / end_time     - unix seconds, inclusive bounds
+          aggregate                 - "1s" | "1m" | "1h": stream one event per
+                                      (bucket, event_type, reason_code) with
+                                      count and latency stats in metadata
+          event_type / reason_code  - equality filters for aggregate queries
+
+        For raw queries every other key is an equality filter and must be one
+        of FILTER_KEYS (event_type, entity_id, reason_code or an indexed
+        metadata key such as trip_id).
+        """
+        try:
+            start = parse_time_filter(request, "start_time")
+            end = parse_time_filter(request, "end_time")
+        except ValueError:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details("start_time / end_time must be unix seconds")
+            return
+
+        window = request.data.get("aggregate")
+        if window:
+            if window not in WINDOWS:
+                context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+                context.set_details(f"aggregate must be one of {', '.join(WINDOWS)}")
+                return
+            rollups = self.rollups.query(
+                window, start, end,
+                event_type=request.data.get("event_type"),
+                reason_code=request.data.get("reason_code"),
+            )
+            for bucket_start, event_type, reason_code, rollup in rollups:
+                yield rollup_to_event(window, bucket_start, event_type, reason_code, rollup).SerializeToString()
+            return
+
+        filters = {k: v for k, v in request.data.items() if k not in QUERY_OPTION_KEYS}
+        unknown = sorted(set(filters) - set(FILTER_KEYS))
+        if unknown:
+            context.set_code(grpc.StatusCode.INVALID_ARGUMENT)
+            context.set_details(f"Unsupported filter keys: {', '.join(unknown)}")
+            return
+
+        for data in self.store.query(start, end, filters):
+            if not context.is_active():
+                return
+            yield data
+
+def add_TelemetryService_to_server(service: TelemetryService, server):
+    """Register service with bytes passed through for TelemetryEvent payloads."""
+    handlers = {
+        "LogEvent": grpc.unary_unary_rpc_method_handler(
+            service.LogEvent,
+            request_deserializer=None,
+            response_serializer=None,
+        ),
+        "LogEvents": grpc.stream_unary_rpc_method_handler(
+            service.LogEvents,
+            request_deserializer=None,
+            response_serializer=LogEventsAck.SerializeToString,
+        ),
+        "QueryMetrics": grpc.unary_stream_rpc_method_handler(
+            service.QueryMetrics,
+            request_deserializer=Metadata.FromString,
+            response_serializer=None,
+        ),
+    }
+    server.add_generic_rpc_handlers((grpc.method_handlers_generic_handler(SERVICE_NAME, handlers),))
 
 def serve():
+    store = TelemetryStore(DATA_DIR)
     server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    telemetry_pb2_grpc.add_TelemetryServiceServicer_to_server(TelemetryService(), server)
+    add_TelemetryService_to_server(TelemetryService(store), server)
     server.add_insecure_port('[::]:50054')
     server.start()
     print("TelemetryService running on port 50054")
-    server.wait_for_termination()
+    try:
+        server.wait_for_termination()
+    finally:
+        store.close()
 
 if __name__ == '__main__':
     serve()
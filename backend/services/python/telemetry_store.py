@@ -0,0 +1,367 @@
+# telemetry_store.py
+# Bounded telemetry event store for TelemetryService.
+#
+# Events are kept as the serialized bytes they arrived as. Recent events sit
+# in an in-memory RecordRing (contiguous byte chunks plus an offset index);
+# only the indexed fields are read from the parsed message at ingest. When
+# the ring is full the oldest event spills to the active on-disk segment: an
+# append-only file of length-prefixed serialized TelemetryEvents. Segments rotate by size and
+# each one carries a time index (min/max event timestamp) in a sidecar JSON
+# file, so a time-bounded query only opens segments that overlap its range.
+#
+# Equality lookups (event_type, entity_id, reason_code and a few metadata
+# keys) are served from inverted indexes: posting lists of event offsets over
+# the in-memory ring, and a bloom filter per segment. Fetching one trip's
+# timeline touches only that trip's events in memory and only the segments
+# whose filter may contain it. Queries return the stored bytes; a segment is
+# only parsed when its events need filtering.
+#
+# The active segment keeps its distinct terms in a set. When it is sealed the
+# bloom is sized from that count (BLOOM_BITS_PER_TERM), written to a sidecar
+# and dropped from memory; queries load sealed blooms on demand through a
+# small LRU, so memory does not grow with the number of segments on disk.
+
+import bisect
+import glob
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict, deque
+
+from telemetry_pb2 import TelemetryEvent
+
+from record_buffers import RecordRing
+
+# -----------------------------
+# Defaults
+# -----------------------------
+DEFAULT_RING_CAPACITY = 100_000
+DEFAULT_SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+LENGTH_PREFIX = struct.Struct("<I")
+
+# Fields that can be used as equality filters; metadata keys are looked up in
+# TelemetryEvent.metadata.data (mirrors idx_telemetry_entity in the schema)
+INDEXED_FIELDS = ("event_type", "entity_id", "reason_code")
+INDEXED_METADATA_KEYS = ("trip_id", "trip_request_id", "driver_id", "passenger_id")
+
+BLOOM_HASHES = 7
+BLOOM_BITS_PER_TERM = 10      # ~1% false positives with 7 hashes
+BLOOM_MIN_BITS = 64
+DEFAULT_BLOOM_CACHE = 32      # sealed segment blooms kept loaded
+
+
+def event_time(event: TelemetryEvent) -> float:
+    return event.timestamp.seconds + event.timestamp.nanos / 1e9
+
+
+def index_terms(event: TelemetryEvent) -> list:
+    """(field, value) pairs under which an event is indexed."""
+    terms = [(f, getattr(event, f)) for f in INDEXED_FIELDS if getattr(event, f)]
+    data = event.metadata.data
+    terms.extend((k, data[k]) for k in INDEXED_METADATA_KEYS if data.get(k))
+    return terms
+
+
+def matches(event: TelemetryEvent, filters: dict) -> bool:
+    for field, value in filters.items():
+        actual = getattr(event, field) if field in INDEXED_FIELDS else event.metadata.data.get(field, "")
+        if actual != value:
+            return False
+    return True
+
+
+def read_segment(path: str, limit: int = None):
+    """Yield the raw serialized events of one segment file in write order, up to limit bytes."""
+    with open(path, "rb") as f:
+        while limit is None or f.tell() < limit:
+            header = f.read(LENGTH_PREFIX.size)
+            if len(header) < LENGTH_PREFIX.size:
+                return   # end of file (or a torn tail after a crash)
+            (length,) = LENGTH_PREFIX.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                return
+            yield data
+
+
+# -----------------------------
+# Bloom filter
+# -----------------------------
+class BloomFilter:
+
+    def __init__(self, num_bits: int, bits: bytearray = None):
+        self.num_bits = num_bits
+        self.bits = bits if bits is not None else bytearray((num_bits + 7) // 8)
+
+    def _positions(self, term):
+        digest = hashlib.blake2b(f"{term[0]}\x00{term[1]}".encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(BLOOM_HASHES)]
+
+    def add(self, term):
+        for pos in self._positions(term):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, term) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(term))
+
+
+class BloomCache:
+    """LRU of sealed segments' blooms, loaded from their sidecars on demand."""
+
+    def __init__(self, capacity: int = DEFAULT_BLOOM_CACHE):
+        self.capacity = capacity
+        self.blooms = OrderedDict()   # path -> BloomFilter
+        self.loads = 0
+
+    def get(self, segment) -> BloomFilter:
+        bloom = self.blooms.get(segment.path)
+        if bloom is not None:
+            self.blooms.move_to_end(segment.path)
+            return bloom
+        bloom = segment.load_bloom()
+        self.loads += 1
+        self.blooms[segment.path] = bloom
+        if len(self.blooms) > self.capacity:
+            self.blooms.popitem(last=False)
+        return bloom
+
+
+# -----------------------------
+# Segment bookkeeping
+# -----------------------------
+class Segment:
+
+    def __init__(self, path: str, blooms: BloomCache = None, min_ts: float = None, max_ts: float = None,
+                 count: int = 0, size: int = 0, bloom_bits: int = 0):
+        self.path = path
+        self.blooms = blooms
+        self.min_ts = min_ts
+        self.max_ts = max_ts
+        self.count = count
+        self.size = size
+        # Unsealed: the exact set of distinct terms. Sealed: None, bloom on disk
+        self.terms = set()
+        self.bloom_bits = bloom_bits
+
+    @property
+    def index_path(self) -> str:
+        return self.path[:-len(".log")] + ".idx.json"
+
+    @property
+    def bloom_path(self) -> str:
+        return self.path[:-len(".log")] + ".bloom"
+
+    @property
+    def sealed(self) -> bool:
+        return self.terms is None
+
+    def add(self, ts: float, nbytes: int, terms: list):
+        self.min_ts = ts if self.min_ts is None else min(self.min_ts, ts)
+        self.max_ts = ts if self.max_ts is None else max(self.max_ts, ts)
+        self.count += 1
+        self.size += nbytes
+        self.terms.update(terms)
+
+    def overlaps(self, start: float, end: float) -> bool:
+        if self.count == 0:
+            return False
+        return not ((start is not None and self.max_ts < start) or (end is not None and self.min_ts > end))
+
+    def may_contain(self, filters: dict) -> bool:
+        if not self.sealed:
+            return all(term in self.terms for term in filters.items())
+        if not filters:
+            return True
+        bloom = self.blooms.get(self) if self.blooms is not None else self.load_bloom()
+        return all(term in bloom for term in filters.items())
+
+    def load_bloom(self) -> BloomFilter:
+        with open(self.bloom_path, "rb") as f:
+            return BloomFilter(self.bloom_bits, bytearray(f.read()))
+
+    def seal(self):
+        """Write the time index and a bloom sized for the distinct terms, then drop the terms."""
+        bits = max(BLOOM_MIN_BITS, len(self.terms) * BLOOM_BITS_PER_TERM)
+        self.bloom_bits = -(-bits // 8) * 8   # whole bytes, as stored in the sidecar
+        bloom = BloomFilter(self.bloom_bits)
+        for term in self.terms:
+            bloom.add(term)
+        with open(self.bloom_path, "wb") as f:
+            f.write(bloom.bits)
+        with open(self.index_path, "w") as f:
+            json.dump({"min_ts": self.min_ts, "max_ts": self.max_ts, "count": self.count,
+                       "size": self.size, "bloom_bits": self.bloom_bits}, f)
+        self.terms = None
+
+    @classmethod
+    def load(cls, path: str, blooms: BloomCache = None):
+        segment = cls(path, blooms)
+        if os.path.exists(segment.index_path) and os.path.exists(segment.bloom_path):
+            with open(segment.index_path) as f:
+                idx = json.load(f)
+            segment.min_ts, segment.max_ts = idx["min_ts"], idx["max_ts"]
+            segment.count, segment.size = idx["count"], idx["size"]
+            segment.bloom_bits = idx["bloom_bits"]
+            segment.terms = None
+        else:
+            # No sidecar (e.g. the process died mid-segment): rebuild by scanning
+            # and seal it: the store never appends to a recovered segment
+            for data in read_segment(path):
+                event = TelemetryEvent.FromString(data)
+                segment.add(event_time(event), LENGTH_PREFIX.size + len(data), index_terms(event))
+            segment.seal()
+        return segment
+
+
+# -----------------------------
+# Store
+# -----------------------------
+class TelemetryStore:
+
+    def __init__(self, data_dir: str, ring_capacity: int = DEFAULT_RING_CAPACITY,
+                 segment_max_bytes: int = DEFAULT_SEGMENT_MAX_BYTES):
+        self.data_dir = data_dir
+        self.ring_capacity = ring_capacity
+        self.segment_max_bytes = segment_max_bytes
+        self.blooms = BloomCache()
+        self.lock = threading.Lock()
+
+        # Serialized events with their timestamps; offsets are consecutive
+        self.ring = RecordRing(ring_capacity)
+        # (field, value) -> deque of ring offsets, ascending
+        self.postings = {}
+
+        os.makedirs(data_dir, exist_ok=True)
+        self.segments = [Segment.load(p, self.blooms)
+                         for p in sorted(glob.glob(os.path.join(data_dir, "segment_*.log")))]
+        self.active = None
+        self._open_segment()
+
+    # -----------------------------
+    # Segments
+    # -----------------------------
+    def _open_segment(self):
+        number = len(self.segments)
+        path = os.path.join(self.data_dir, f"segment_{number:08d}.log")
+        self.segments.append(Segment(path, self.blooms))
+        self.active = open(path, "ab")
+
+    def _rotate(self):
+        self.active.close()
+        self.segments[-1].seal()
+        self._open_segment()
+
+    def _spill_oldest(self):
+        """Move the oldest ring event to the active segment and drop its postings."""
+        offset, ts, data = self.ring.pop_oldest()
+        # Terms are not kept per event; re-derive them for the postings and the bloom
+        terms = index_terms(TelemetryEvent.FromString(data))
+        for term in terms:
+            posting = self.postings[term]
+            posting.popleft()   # always `offset`: postings are ascending
+            if not posting:
+                del self.postings[term]
+
+        self.active.write(LENGTH_PREFIX.pack(len(data)))
+        self.active.write(data)
+        self.segments[-1].add(ts, LENGTH_PREFIX.size + len(data), terms)
+        if self.segments[-1].size >= self.segment_max_bytes:
+            self._rotate()
+
+    def close(self):
+        with self.lock:
+            while len(self.ring):
+                self._spill_oldest()
+            self.active.close()
+            self.segments[-1].seal()
+
+    # -----------------------------
+    # Ingest / query
+    # -----------------------------
+    def append(self, data: bytes, event: TelemetryEvent = None) -> bytes:
+        """
+        Store one serialized event. `event` is its parsed form if the caller
+        already has it. A missing timestamp is filled with the ingest time
+        (on `event` too) by appending the field to the wire bytes. Returns
+        the stored bytes.
+        """
+        if event is None:
+            event = TelemetryEvent.FromString(data)
+        if not event.HasField("timestamp"):
+            event.timestamp.FromNanoseconds(time.time_ns())
+            stamp = TelemetryEvent()
+            stamp.timestamp.CopyFrom(event.timestamp)
+            # Concatenated messages merge, so this sets just the timestamp
+            data = bytes(data) + stamp.SerializeToString()
+        ts = event_time(event)
+        terms = index_terms(event)
+        with self.lock:
+            if len(self.ring) >= self.ring_capacity:
+                self._spill_oldest()
+            offset = self.ring.append(data, ts)
+            for term in terms:
+                posting = self.postings.get(term)
+                if posting is None:
+                    self.postings[term] = posting = deque()
+                posting.append(offset)
+        return data
+
+    def _recent(self, start: float, end: float, filters: dict) -> list:
+        """Serialized ring events that match; called with the lock held."""
+        ring = self.ring
+        if filters:
+            postings = sorted((self.postings.get(term, ()) for term in filters.items()), key=len)
+            candidates = self._intersect(postings[0], postings[1:])
+        else:
+            candidates = ring.offsets()
+        return [ring.get(o) for o in candidates
+                if (start is None or ring.timestamp(o) >= start) and (end is None or ring.timestamp(o) <= end)]
+
+    @staticmethod
+    def _intersect(first, others: list) -> list:
+        """Walk the shortest posting list, bisecting forward in the others."""
+        cursors = [0] * len(others)
+        out = []
+        for offset in first:
+            for j, posting in enumerate(others):
+                cursors[j] = bisect.bisect_left(posting, offset, cursors[j])
+                if cursors[j] == len(posting):
+                    return out   # no later offset can match
+                if posting[cursors[j]] != offset:
+                    break
+            else:
+                out.append(offset)
+        return out
+
+    def query(self, start: float = None, end: float = None, filters: dict = None):
+        """
+        Yield serialized events with start <= timestamp <= end (either bound
+        optional) whose fields equal every entry of filters, spilled segments
+        first, then the in-memory ring, in arrival order. Filter keys must be
+        in INDEXED_FIELDS or INDEXED_METADATA_KEYS.
+        """
+        filters = filters or {}
+        with self.lock:
+            self.active.flush()
+            # Cap each segment at its current size: later spills are still in `recent`
+            segments = [(s.path, s.size, s.min_ts, s.max_ts) for s in self.segments
+                        if s.overlaps(start, end) and s.may_contain(filters)]
+            recent = self._recent(start, end, filters)
+
+        for path, size, min_ts, max_ts in segments:
+            covered = (start is None or min_ts >= start) and (end is None or max_ts <= end)
+            if covered and not filters:
+                yield from read_segment(path, size)
+                continue
+            for data in read_segment(path, size):
+                event = TelemetryEvent.FromString(data)
+                ts = event_time(event)
+                if (start is None or ts >= start) and (end is None or ts <= end) and matches(event, filters):
+                    yield data
+        yield from recent
@@ -16,6 +16,10 @@ from common_pb2 import Location
 from pricing_pb2_grpc import PricingServiceStub
 from pricing_pb2 import PriceCalculationRequest
 
+from grpc_channels import default_pool
+from grpc_resilience import inherit_deadline
+from pricing_fallback import FallbackPricer
+
 # -----------------------------
 # In-memory store
 # -----------------------------
@@ -49,8 +53,14 @@ def valid_fsm_transition(current_status, new_status):
 # -----------------------------
 class TripService(TripServiceServicer):
 
-    def __init__(self, pricing_channel):
-        self.pricing_stub = PricingServiceStub(pricing_channel)
+    def __init__(self, pricing_channel=None):
+        # Default: pooled PricingService stub shared with the rest of the process
+        if pricing_channel is None:
+            self.pricing_stub = default_pool().stub(PricingServiceStub, "pricing")
+        else:
+            self.pricing_stub = PricingServiceStub(pricing_channel)
+        # Local fallback pricing while PricingService is down / its breaker is open
+        self.pricer = FallbackPricer(self.pricing_stub)
 
     def CreateTrip(self, request: CreateTripCommand, context):
         with trips_lock:
@@ -76,7 +86,9 @@ class TripService(TripServiceServicer):
         )
 
         try:
-            pricing_resp = self.pricing_stub.CalculatePrice(pricing_request)
+            # Pricing gets whatever is left of our caller's deadline
+            with inherit_deadline(context):
+                pricing_resp = self.pricer.price(pricing_request)
         except grpc.RpcError as e:
             context.set_code(grpc.StatusCode.FAILED_PRECONDITION)
             context.set_details("Pricing failed, cannot create trip")
@@ -171,9 +183,12 @@ class TripService(TripServiceServicer):
 # Server setup
 # -----------------------------
 def serve():
-    channel = grpc.insecure_channel("localhost:50056")  # PricingService channel
+    # Connect to PricingService before taking traffic
+    default_pool().warmup(["pricing"])
+    service = TripService()
+    service.pricer.refresh()  # have a fallback config before the first outage
     server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    add_TripServiceServicer_to_server(TripService(channel), server)
+    add_TripServiceServicer_to_server(service, server)
     server.add_insecure_port("[::]:50053")
     server.start()
     print("TripService running on port 50053")
@@ -0,0 +1,146 @@
+import sys
+import os
+import time
+import grpc
+from concurrent import futures
+
+# -----------------------------
+# Add generated + services to path
+# -----------------------------
+sys.path.append(os.path.join(os.path.dirname(__file__), "../generated/python"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "../services/python"))
+
+from driver_status_pb2_grpc import DriverStatusServiceStub, add_DriverStatusServiceServicer_to_server
+from driver_status_pb2 import UpdateDriverStatusRequest
+from common_pb2 import Location
+
+from driver_index import DriverIndex
+from demand_queue import DemandQueue, AvailabilityFeed
+from driver_status_server import DriverStatusService
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+# -----------------------------
+# Tests
+# -----------------------------
+def test_driver_arrival_rematches_nearby_requests_in_one_batch():
+    batches = []
+    queue = DemandQueue(lambda batch: batches.append([r.request_id for r in batch]), cell_deg=0.01)
+    index = DriverIndex(cell_deg=0.01)
+    index.add_listener(queue.on_driver_available)
+
+    queue.add("near_1", 39.6005, 67.8005)
+    queue.add("near_2", 39.6105, 67.8005)   # neighbouring cell
+    queue.add("far", 40.5, 69.0)
+
+    # Registering without a location, or moving while unavailable, wakes nobody
+    index.update("driver_0", True, None, 0, now=0.0)
+    index.update("driver_1", False, (39.6, 67.8), 0, now=0.0)
+    assert queue.run_once() == 0
+
+    index.update("driver_1", True, None, 0, now=1.0)
+    assert queue.run_once() == 2
+    assert batches == [["near_1", "near_2"]]
+    assert len(queue) == 1 and queue.matched == 2
+
+
+def test_batch_is_capped_per_driver_and_unmatched_requests_are_requeued():
+    clock = FakeClock()
+    batches = []
+
+    def rematch(batch):
+        batches.append([r.request_id for r in batch])
+        return batch[1:]   # only the first found a driver
+
+    queue = DemandQueue(rematch, cell_deg=0.01, per_driver=2, clock=clock)
+    for i in range(5):
+        clock.now = float(i)
+        queue.add(f"req_{i}", 39.6, 67.8)
+
+    queue.on_driver_available("driver_1", 39.6, 67.8)
+    assert queue.run_once() == 1
+    assert batches == [["req_0", "req_1"]]   # oldest first, two per arriving driver
+    assert len(queue) == 4
+
+    # The requeued request keeps its place in line
+    queue.on_driver_available("driver_2", 39.6, 67.8)
+    queue.run_once()
+    assert batches[1] == ["req_1", "req_2"]
+
+
+def test_requests_expire_after_max_wait():
+    clock = FakeClock()
+    expired = []
+    queue = DemandQueue(lambda batch: [], cell_deg=0.01, max_wait=60, on_expired=expired.append, clock=clock)
+    queue.add("old", 39.6, 67.8)
+    clock.now = 30.0
+    queue.add("new", 39.6, 67.8)
+
+    clock.now = 61.0
+    queue.run_once()
+    assert [r.request_id for r in expired] == ["old"]
+    assert len(queue) == 1 and queue.expired == 1
+
+
+def test_availability_feed_wakes_the_queue_over_grpc():
+    service = DriverStatusService(DriverIndex(cell_deg=0.01))
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    add_DriverStatusServiceServicer_to_server(service, server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    stub = DriverStatusServiceStub(grpc.insecure_channel(f"localhost:{port}"))
+
+    batches = []
+    queue = DemandQueue(lambda batch: batches.append([r.request_id for r in batch]), cell_deg=0.01,
+                        batch_window=0.0).start()
+    # Short streams so the test also covers reconnecting
+    feed = AvailabilityFeed(queue, stub, stream_seconds=1).start()
+    try:
+        queue.add("waiting", 39.6005, 67.8005)
+        deadline = time.monotonic() + 5
+        sent = 0
+        while not batches and time.monotonic() < deadline:
+            # Each toggle makes the driver available again; the first may land before the stream opens
+            for available in (False, True):
+                stub.UpdateDriverStatus(UpdateDriverStatusRequest(
+                    driver_id="driver_1", is_available=available, expected_version=sent,
+                    current_location=Location(lat=39.6, lon=67.8),
+                ))
+                sent += 1
+            time.sleep(0.2)
+        assert batches == [["waiting"]]
+        assert feed.received >= 1 and feed.failed_streams == 0
+
+        time.sleep(1.5)   # past the first stream's max_seconds
+        queue.add("later", 39.6005, 67.8005)
+        before = feed.received
+        deadline = time.monotonic() + 5
+        while len(batches) < 2 and time.monotonic() < deadline:
+            for available in (False, True):
+                stub.UpdateDriverStatus(UpdateDriverStatusRequest(
+                    driver_id="driver_1", is_available=available, expected_version=sent,
+                ))
+                sent += 1
+            time.sleep(0.2)
+        assert batches[1] == ["later"] and feed.received > before
+    finally:
+        feed.close()
+        queue.close()
+        server.stop(None)
+
+
+# -----------------------------
+# Run tests
+# -----------------------------
+if __name__ == "__main__":
+    test_driver_arrival_rematches_nearby_requests_in_one_batch()
+    test_batch_is_capped_per_driver_and_unmatched_requests_are_requeued()
+    test_requests_expire_after_max_wait()
+    test_availability_feed_wakes_the_queue_over_grpc()
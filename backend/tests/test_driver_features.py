@@ -0,0 +1,129 @@
+import sys
+import os
+import grpc
+import random
+import tempfile
+from concurrent import futures
+
+# -----------------------------
+# Add generated Python modules and services to path
+# -----------------------------
+sys.path.append(os.path.join(os.path.dirname(__file__), "../generated/python"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "../services/python"))
+
+from telemetry_pb2_grpc import TelemetryServiceStub
+from telemetry_pb2 import TelemetryEvent
+
+from driver_features import DriverFeatureStore, TelemetryFeatureFeed, OFFER_WINDOW, DEFAULT_ACCEPTANCE_RATE, \
+    DEFAULT_RATING
+from telemetry_server import TelemetryService, add_TelemetryService_to_server
+from telemetry_store import TelemetryStore
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def start_telemetry(store):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    add_TelemetryService_to_server(TelemetryService(store), server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    return server, TelemetryServiceStub(grpc.insecure_channel(f"localhost:{port}"))
+
+def offer_event(event_type, driver_id, seconds):
+    evt = TelemetryEvent(event_type=event_type, entity_id=f"offer_{driver_id}_{seconds}")
+    evt.metadata.data["driver_id"] = driver_id
+    evt.timestamp.FromSeconds(seconds)
+    return evt
+
+# -----------------------------
+# Tests
+# -----------------------------
+def test_acceptance_rate_covers_last_100_offers():
+    store = DriverFeatureStore(capacity=2)
+    rng = random.Random(7)
+    history = {}
+    for _ in range(5_000):
+        driver_id = f"driver_{rng.randrange(5)}"
+        accepted = rng.random() < 0.7
+        history.setdefault(driver_id, []).append(accepted)
+        store.record_offer(driver_id, accepted)
+
+    for driver_id, offers in history.items():
+        window = offers[-OFFER_WINDOW:]
+        features = store.get(driver_id)
+        assert features.offers == OFFER_WINDOW
+        assert abs(features.acceptance_rate - sum(window) / len(window)) < 1e-12
+
+    store.record_offer("new_driver", False)
+    assert store.get("new_driver").acceptance_rate == 0.0
+    assert store.get("unknown").acceptance_rate == DEFAULT_ACCEPTANCE_RATE
+
+
+def test_ratings_events_and_batched_lookup():
+    store = DriverFeatureStore()
+    for rating in (5.0, 4.0, 3.0):
+        evt = TelemetryEvent(event_type="trip_completed", entity_id="trip_1")
+        evt.metadata.data.update({"driver_id": "driver_a", "rating": str(rating)})
+        assert store.apply_event(evt)
+    assert store.apply_event(TelemetryEvent(event_type="offer_rejected", entity_id="driver_b"))
+    assert store.apply_event(TelemetryEvent(event_type="offer_accepted", entity_id="driver_b"))
+    # Automatic assignment is not an offer outcome
+    assert not store.apply_event(TelemetryEvent(event_type="driver_assigned", entity_id="driver_b"))
+    assert not store.apply_event(TelemetryEvent(event_type="trip_created", entity_id="trip_1"))
+
+    assert store.get("driver_a").rating == 4.0
+    assert store.get("driver_a").acceptance_rate == DEFAULT_ACCEPTANCE_RATE
+    assert store.get("driver_b") == (0.5, DEFAULT_RATING, 2, 0)
+    assert store.get("unknown") == (DEFAULT_ACCEPTANCE_RATE, DEFAULT_RATING, 0, 0)
+
+    # A whole candidate list in one lookup
+    rates, ratings = store.get_many(["driver_b", "unknown", "driver_a"])
+    assert list(rates) == [0.5, DEFAULT_ACCEPTANCE_RATE, DEFAULT_ACCEPTANCE_RATE]
+    assert list(ratings) == [DEFAULT_RATING, DEFAULT_RATING, 4.0]
+
+    try:
+        store.record_rating("driver_a", 7.0)
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+
+def test_feed_applies_offer_telemetry_once():
+    with tempfile.TemporaryDirectory() as data_dir:
+        telemetry = TelemetryStore(data_dir, ring_capacity=20, segment_max_bytes=500)
+        server, stub = start_telemetry(telemetry)
+        try:
+            store = DriverFeatureStore()
+            feed = TelemetryFeatureFeed(store, stub)
+            for i in range(30):
+                stub.LogEvent(offer_event(["offer_accepted", "offer_rejected"][i % 3 == 0], "driver_a", 1_000 + i))
+            stub.LogEvent(offer_event("driver_assigned", "driver_a", 1_030))
+            assert feed.poll() == 30
+            assert store.get("driver_a").offers == 30
+            assert store.get("driver_a").acceptance_rate == 20 / 30
+
+            # Polling again applies nothing twice, including events at the cursor
+            assert feed.poll() == 0
+            # A new event in the same second as the newest offer_accepted already applied
+            late = offer_event("offer_accepted", "driver_a", 1_029)
+            late.entity_id = "offer_driver_a_1029_b"
+            stub.LogEvent(late)
+            stub.LogEvent(offer_event("offer_expired", "driver_b", 1_031))
+            rated = offer_event("trip_rated", "driver_b", 1_032)
+            rated.metadata.data["rating"] = "4.5"
+            stub.LogEvent(rated)
+            assert feed.poll() == 3 and feed.poll() == 0
+            assert store.get("driver_a").offers == 31 and store.get("driver_a").acceptance_rate == 21 / 31
+            assert store.get("driver_b") == (0.0, 4.5, 1, 1)
+        finally:
+            server.stop(None)
+            telemetry.close()
+
+
+# -----------------------------
+# Run tests
+# -----------------------------
+if __name__ == "__main__":
+    test_acceptance_rate_covers_last_100_offers()
+    test_ratings_events_and_batched_lookup()
+    test_feed_applies_offer_telemetry_once()
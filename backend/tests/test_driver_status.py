@@ -0,0 +1,355 @@
+import sys
+import os
+import grpc
+import time
+import numpy as np
+from concurrent import futures
+
+# -----------------------------
+# Add generated Python modules and services to path
+# -----------------------------
+sys.path.append(os.path.join(os.path.dirname(__file__), "../generated/python"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "../services/python"))
+
+from driver_status_pb2_grpc import DriverStatusServiceStub, add_DriverStatusServiceServicer_to_server
+from driver_status_pb2 import (UpdateDriverStatusRequest, GetAvailableDriversRequest, DriverLocationPing,
+                               WatchAvailableDriversRequest)
+from common_pb2 import Location
+
+from driver_status_server import DriverStatusService, SharedDriverStatusReader, LOCATION_TICK_SECONDS
+from driver_shm import SharedDriverTable
+from dedupe_cache import DedupeCache
+from driver_index import DriverIndex
+
+# -----------------------------
+# In-process server
+# -----------------------------
+def start_server(service=None):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    add_DriverStatusServiceServicer_to_server(service or DriverStatusService(), server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    channel = grpc.insecure_channel(f"localhost:{port}")
+    return server, DriverStatusServiceStub(channel)
+
+# -----------------------------
+# Tests
+# -----------------------------
+def test_optimistic_locking():
+    server, stub = start_server()
+    try:
+        status = stub.UpdateDriverStatus(UpdateDriverStatusRequest(
+            driver_id="driver_1", is_available=True, current_location=Location(lat=39.6, lon=67.8),
+        ))
+        assert status.version == 1
+
+        # Location heartbeat keeps the version
+        status = stub.UpdateDriverStatus(UpdateDriverStatusRequest(
+            driver_id="driver_1", is_available=True, current_location=Location(lat=39.601, lon=67.8),
+        ))
+        assert status.version == 1
+
+        # Assignment with the right version succeeds and bumps it
+        status = stub.UpdateDriverStatus(UpdateDriverStatusRequest(
+            driver_id="driver_1", is_available=False, expected_version=1,
+        ))
+        assert status.version == 2 and not status.is_available
+
+        # Stale version is rejected
+        try:
+            stub.UpdateDriverStatus(UpdateDriverStatusRequest(
+                driver_id="driver_1", is_available=True, expected_version=1,
+            ))
+            assert False, "expected ABORTED"
+        except grpc.RpcError as e:
+            assert e.code() == grpc.StatusCode.ABORTED
+    finally:
+        server.stop(None)
+
+
+def test_nearest_first_streaming():
+    server, stub = start_server()
+    try:
+        origin = Location(lat=39.6, lon=67.8)
+        for i in range(50):
+            stub.UpdateDriverStatus(UpdateDriverStatusRequest(
+                driver_id=f"driver_{i}",
+                is_available=True,
+                current_location=Location(lat=39.6 + 0.002 * i, lon=67.8 - 0.001 * i),
+            ))
+        # Unavailable drivers are never returned
+        stub.UpdateDriverStatus(UpdateDriverStatusRequest(driver_id="driver_0", is_available=False))
+
+        drivers = list(stub.GetAvailableDrivers(GetAvailableDriversRequest(location=origin, max_results=5)))
+        assert [d.driver_id for d in drivers] == [f"driver_{i}" for i in range(1, 6)]
+
+        distances = [float(d.metadata.data["distance_meters"]) for d in drivers]
+        assert distances == sorted(distances)
+
+        # Far-away query still finds the whole (sparse) fleet
+        far = list(stub.GetAvailableDrivers(GetAvailableDriversRequest(
+            location=Location(lat=41.0, lon=69.0), max_results=100,
+        )))
+        assert len(far) == 49
+    finally:
+        server.stop(None)
+
+
+def test_stream_driver_locations_coalesces():
+    server, stub = start_server()
+    try:
+        for i in range(3):
+            stub.UpdateDriverStatus(UpdateDriverStatusRequest(driver_id=f"driver_{i}", is_available=True))
+
+        # 3 drivers x 100 pings each, the last ping per driver wins
+        def pings():
+            for step in range(100):
+                for i in range(3):
+                    yield DriverLocationPing(
+                        driver_id=f"driver_{i}",
+                        location=Location(lat=39.6 + 0.0001 * step, lon=67.8 + 0.01 * i),
+                    )
+            yield DriverLocationPing(driver_id="driver_0")  # no location -> rejected
+
+        summary = stub.StreamDriverLocations(pings())
+        assert summary.pings_received == 301
+        assert summary.pings_rejected == 1
+        assert summary.drivers_updated == 3
+
+        drivers = list(stub.GetAvailableDrivers(GetAvailableDriversRequest(
+            location=Location(lat=39.6099, lon=67.8), max_results=1,
+        )))
+        assert drivers[0].driver_id == "driver_0"
+        assert abs(drivers[0].current_location.lat - 39.6099) < 1e-9
+        assert drivers[0].version == 1
+    finally:
+        server.stop(None)
+
+
+def test_sparse_stream_flushes_on_tick_and_drops_out_of_order_fixes():
+    server, stub = start_server()
+    try:
+        stub.UpdateDriverStatus(UpdateDriverStatusRequest(driver_id="driver_1", is_available=True))
+        seen = []
+
+        def ping(lat, device_ts):
+            p = DriverLocationPing(driver_id="driver_1", location=Location(lat=lat, lon=67.8))
+            p.timestamp.FromNanoseconds(int(device_ts * 1e9))
+            return p
+
+        def lat_now():
+            drivers = list(stub.GetAvailableDrivers(GetAvailableDriversRequest(
+                location=Location(lat=39.6, lon=67.8), max_results=1,
+            )))
+            return drivers[0].current_location.lat
+
+        def pings():
+            yield ping(39.61, device_ts=1_000.0)
+            # No further pings: the tick still applies the pending fix
+            time.sleep(LOCATION_TICK_SECONDS * 2.5)
+            seen.append(lat_now())
+            yield ping(39.62, device_ts=999.0)   # older than the applied fix
+            time.sleep(LOCATION_TICK_SECONDS * 2.5)
+            seen.append(lat_now())
+
+        summary = stub.StreamDriverLocations(pings())
+        assert seen == [39.61, 39.61]
+        assert summary.pings_received == 2 and summary.drivers_updated == 1
+    finally:
+        server.stop(None)
+
+
+def test_idempotency_key_dedupe():
+    server, stub = start_server()
+    try:
+        stub.UpdateDriverStatus(UpdateDriverStatusRequest(driver_id="driver_1", is_available=True))
+        assign = UpdateDriverStatusRequest(
+            driver_id="driver_1", is_available=False, expected_version=1, idempotency_key="assign-1",
+        )
+        first = stub.UpdateDriverStatus(assign)
+        # Retry with the same key returns the committed status instead of ABORTED
+        retry = stub.UpdateDriverStatus(assign)
+        assert first == retry
+        assert retry.version == 2
+    finally:
+        server.stop(None)
+
+
+def test_concurrent_duplicates_apply_once():
+    index = DriverIndex()
+    service = DriverStatusService(index)
+    applied = []
+    original = index.update
+
+    def slow_update(*args):
+        applied.append(args[0])
+        time.sleep(0.1)   # widen the window between lookup and commit
+        return original(*args)
+
+    index.update = slow_update
+    server, stub = start_server(service)
+    try:
+        # expected_version == 0 skips optimistic locking, so only the key protects it
+        update = UpdateDriverStatusRequest(driver_id="driver_1", is_available=True, idempotency_key="online-1")
+        with futures.ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lambda _: stub.UpdateDriverStatus(update), range(4)))
+        assert applied == ["driver_1"]
+        assert all(r == results[0] for r in results)
+    finally:
+        server.stop(None)
+
+
+def test_rejects_new_drivers_when_full_or_id_too_long():
+    table = SharedDriverTable.create(capacity=2)
+    server, stub = start_server(DriverStatusService(DriverIndex(mirror=table)))
+    try:
+        # 33 x 2-byte characters = 66 bytes: would be cut mid-character in the id column
+        try:
+            stub.UpdateDriverStatus(UpdateDriverStatusRequest(driver_id="ж" * 33, is_available=True))
+            assert False, "expected INVALID_ARGUMENT"
+        except grpc.RpcError as e:
+            assert e.code() == grpc.StatusCode.INVALID_ARGUMENT
+
+        for i in range(2):
+            stub.UpdateDriverStatus(UpdateDriverStatusRequest(driver_id=f"driver_{i}", is_available=True))
+        try:
+            stub.UpdateDriverStatus(UpdateDriverStatusRequest(driver_id="driver_2", is_available=True))
+            assert False, "expected RESOURCE_EXHAUSTED"
+        except grpc.RpcError as e:
+            assert e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+
+        # Known drivers keep working and the table stays readable
+        status = stub.UpdateDriverStatus(UpdateDriverStatusRequest(
+            driver_id="driver_1", is_available=True, current_location=Location(lat=39.6, lon=67.8),
+        ))
+        assert status.version == 1
+        assert [d[0] for d in table.nearest(39.6, 67.8, 5)] == ["driver_1"]
+    finally:
+        server.stop(None)
+        table.close()
+
+
+def test_dedupe_cache_expiry_and_cap():
+    now = [0.0]
+    cache = DedupeCache(ttl_seconds=10, buckets=5, max_entries=10, clock=lambda: now[0])
+    cache.put("a", b"1")
+    now[0] = 8.0
+    assert cache.get("a") == b"1"
+    now[0] = 12.0
+    assert cache.get("a") is None
+
+    for i in range(100):
+        cache.put(f"k{i}", b"x")
+    assert len(cache) <= 10
+    assert cache.get("k99") == b"x"
+
+
+def test_stale_driver_eviction():
+    index = DriverIndex(stale_after=30.0)
+    index.update("driver_1", True, (39.6, 67.8), 0, now=100.0)
+    index.update("driver_2", True, (39.6, 67.81), 0, now=100.0)
+    index.update_locations({"driver_2": (39.6, 67.82)}, now=120.0)   # heartbeat
+
+    assert index.next_expiry() == 130.0
+    assert index.evict_stale(now=135.0) == ["driver_1"]
+    assert index.get("driver_1").is_available is False
+    assert index.get("driver_1").version == 2
+    assert [s.driver_id for s in index.nearest(39.6, 67.8, 10)] == ["driver_2"]
+
+    # driver_2 was rescheduled to its new deadline, not evicted
+    assert index.next_expiry() == 150.0
+    assert index.evict_stale(now=151.0) == ["driver_2"]
+    assert index.stats()["evictions_total"] == 2
+    assert index.stats()["available_indexed"] == 0
+
+
+def test_location_history_ring_buffer():
+    index = DriverIndex(history_window=4)
+    pool = index.history.pool
+    for i in range(10):
+        index.update_locations({"driver_1": (39.6 + 0.001 * i, 67.8, 100.0 + i, None)}, now=100.0 + i)
+
+    trace = index.trace("driver_1")
+    assert list(trace["ts"]) == [106.0, 107.0, 108.0, 109.0]
+    # ~111 m per 0.001 deg of latitude over 1 s
+    assert 100 < trace["speed"][-1] < 120
+
+    # Window views share memory with the pool and wrap around the row end
+    views = index.history.window_views(index.slots["driver_1"], 3)
+    assert all(np.shares_memory(v, pool) for v in views)
+    assert [float(t) for v in views for t in v["ts"]] == [107.0, 108.0, 109.0]
+
+    # Fixed memory per slot no matter how many fixes arrive
+    assert index.history.pool is pool
+
+
+def test_shared_memory_reader():
+    table = SharedDriverTable.create(capacity=128)
+    reader_table = SharedDriverTable.attach(table.name)
+    index = DriverIndex(mirror=table)
+    server, stub = start_server(SharedDriverStatusReader(reader_table))
+    try:
+        for i in range(10):
+            index.update(f"driver_{i}", i != 3, (39.6 + 0.001 * i, 67.8), 0, now=100.0)
+
+        drivers = list(stub.GetAvailableDrivers(GetAvailableDriversRequest(
+            location=Location(lat=39.6035, lon=67.8), max_results=3,
+        )))
+        assert [d.driver_id for d in drivers] == ["driver_4", "driver_2", "driver_5"]
+
+        assert reader_table.lookup("driver_3")[2] is False
+        assert reader_table.lookup("driver_4")[3] == 1
+
+        # A slot caught mid-write (odd seqlock counter) is never served
+        slot = reader_table.slots["driver_4"]
+        table.seq[slot] += 1
+        assert reader_table.lookup("driver_4")[2] is False
+        table.seq[slot] += 1
+        assert reader_table.lookup("driver_4")[2] is True
+    finally:
+        server.stop(None)
+        reader_table.close()
+        table.close()
+
+
+def test_watch_available_drivers_streams_arrivals():
+    service = DriverStatusService()
+    server, stub = start_server(service)
+    try:
+        call = stub.WatchAvailableDrivers(WatchAvailableDriversRequest(max_seconds=2), timeout=5)
+        deadline = time.monotonic() + 2
+        while not service.watchers and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        stub.UpdateDriverStatus(UpdateDriverStatusRequest(driver_id="driver_1", is_available=False,
+                                                          current_location=Location(lat=39.6, lon=67.8)))
+        stub.UpdateDriverStatus(UpdateDriverStatusRequest(driver_id="driver_1", is_available=True,
+                                                          expected_version=1))
+        status = next(call)
+        assert status.driver_id == "driver_1" and status.is_available
+        assert (status.current_location.lat, status.current_location.lon) == (39.6, 67.8)
+
+        # The server ends the stream cleanly after max_seconds
+        assert list(call) == []
+        assert call.code() == grpc.StatusCode.OK
+        assert not service.watchers
+    finally:
+        server.stop(None)
+
+
+# -----------------------------
+# Run tests
+# -----------------------------
+if __name__ == "__main__":
+    test_optimistic_locking()
+    test_nearest_first_streaming()
+    test_stream_driver_locations_coalesces()
+    test_sparse_stream_flushes_on_tick_and_drops_out_of_order_fixes()
+    test_idempotency_key_dedupe()
+    test_concurrent_duplicates_apply_once()
+    test_rejects_new_drivers_when_full_or_id_too_long()
+    test_dedupe_cache_expiry_and_cap()
+    test_stale_driver_eviction()
+    test_location_history_ring_buffer()
+    test_shared_memory_reader()
+    test_watch_available_drivers_streams_arrivals()
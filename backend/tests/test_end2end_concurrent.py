@@ -12,6 +12,7 @@ from google.protobuf.timestamp_pb2 import Timestamp
 # Add generated Python modules to path
 # -----------------------------
 sys.path.append(os.path.join(os.path.dirname(__file__), "../../generated/python"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "../services/python"))
 
 # -----------------------------
 # Import services
@@ -33,6 +34,8 @@ from trip_service_pb2 import (
 )
 from common_pb2 import Location
 
+from grpc_channels import ChannelPool
+
 # -----------------------------
 # Configuration
 # -----------------------------
@@ -44,6 +47,9 @@ SEED = 42
 random.seed(SEED)
 
 NUM_CONCURRENT_REQUESTS = 5
+
+# One set of connections shared by all simulated trips
+channels = ChannelPool()
 MAX_CANDIDATES = 3
 
 # -----------------------------
@@ -79,14 +85,9 @@ def match_drivers(origin_lat, origin_lon):
 # Worker function for each trip
 # -----------------------------
 def simulate_trip(trip_number):
-    tr_channel = grpc.insecure_channel(TRIP_REQUEST_SERVICE_ADDR)
-    tr_stub = TripRequestServiceStub(tr_channel)
-
-    match_channel = grpc.insecure_channel(MATCHING_SERVICE_ADDR)
-    match_stub = MatchingServiceStub(match_channel)
-
-    trip_channel = grpc.insecure_channel(TRIP_SERVICE_ADDR)
-    trip_stub = TripServiceStub(trip_channel)
+    tr_stub = channels.stub(TripRequestServiceStub, TRIP_REQUEST_SERVICE_ADDR)
+    match_stub = channels.stub(MatchingServiceStub, MATCHING_SERVICE_ADDR)
+    trip_stub = channels.stub(TripServiceStub, TRIP_SERVICE_ADDR)
 
     # -----------------------------
     # Create Trip Request
@@ -160,6 +161,7 @@ def simulate_trip(trip_number):
 # Run multiple concurrent trips
 # -----------------------------
 def run_concurrent_trips():
+    channels.warmup([TRIP_REQUEST_SERVICE_ADDR, MATCHING_SERVICE_ADDR, TRIP_SERVICE_ADDR])
     threads = []
     for i in range(NUM_CONCURRENT_REQUESTS):
         t = threading.Thread(target=simulate_trip, args=(i,))
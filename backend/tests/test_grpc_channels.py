@@ -0,0 +1,72 @@
+import sys
+import os
+import grpc
+from concurrent import futures
+
+# -----------------------------
+# Add generated Python modules and services to path
+# -----------------------------
+sys.path.append(os.path.join(os.path.dirname(__file__), "../generated/python"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "../services/python"))
+
+from pricing_pb2_grpc import PricingServiceStub, add_PricingServiceServicer_to_server
+from pricing_pb2 import PriceCalculationRequest
+
+from pricing_server import PricingService
+from grpc_channels import ChannelPool, resolve_target
+
+# -----------------------------
+# In-process server
+# -----------------------------
+def start_server():
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    add_PricingServiceServicer_to_server(PricingService(), server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    return server, f"localhost:{port}"
+
+# -----------------------------
+# Tests
+# -----------------------------
+def test_pooled_stub_spreads_calls_over_warm_channels():
+    server, target = start_server()
+    pool = ChannelPool(channels_per_target=3)
+    try:
+        assert pool.warmup([target]) == {target: True}
+        channels = pool.channels[target]
+        assert len(channels) == 3
+        assert pool.stub(PricingServiceStub, target) is pool.stub(PricingServiceStub, target)
+
+        stub = pool.stub(PricingServiceStub, target)
+        for i in range(6):
+            response = stub.CalculatePrice(PriceCalculationRequest(
+                trip_request_id=f"trip_{i}", estimated_distance_meters=1000,
+                estimated_duration_seconds=600, demand_multiplier=1.0,
+            ))
+            assert response.trip_request_id == f"trip_{i}"
+    finally:
+        pool.close()
+        server.stop(None)
+
+
+def test_unreachable_target_and_service_names():
+    pool = ChannelPool(channels_per_target=1)
+    try:
+        assert pool.warmup(["localhost:1"], timeout=0.2) == {"localhost:1": False}
+    finally:
+        pool.close()
+
+    assert resolve_target("pricing") == os.environ.get("PRICING_SERVICE_ADDR", "localhost:50056")
+    try:
+        resolve_target("no_such_service")
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+
+# -----------------------------
+# Run tests
+# -----------------------------
+if __name__ == "__main__":
+    test_pooled_stub_spreads_calls_over_warm_channels()
+    test_unreachable_target_and_service_names()
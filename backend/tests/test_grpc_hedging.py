@@ -0,0 +1,141 @@
+import sys
+import os
+import time
+import threading
+import grpc
+from concurrent import futures
+
+# -----------------------------
+# Add generated Python modules and services to path
+# -----------------------------
+sys.path.append(os.path.join(os.path.dirname(__file__), "../generated/python"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "../services/python"))
+
+from pricing_pb2_grpc import PricingServiceStub, add_PricingServiceServicer_to_server
+from pricing_pb2 import PriceCalculationRequest
+
+from pricing_server import PricingService
+from grpc_channels import ChannelPool
+from grpc_hedging import HedgedCallable, HedgeBudget, LatencyTracker
+
+
+class StragglerPricingService(PricingService):
+    """The first attempt for a trip_request_id starting with "slow" stalls; repeats are fast."""
+
+    def __init__(self, stall: float = 0.5):
+        self.stall = stall
+        self.seen = set()
+        self.lock = threading.Lock()
+
+    def CalculatePrice(self, request, context):
+        with self.lock:
+            first = request.trip_request_id not in self.seen
+            self.seen.add(request.trip_request_id)
+        if first and request.trip_request_id.startswith("slow"):
+            time.sleep(self.stall)
+        if request.trip_request_id.startswith("paced"):
+            time.sleep(0.1)
+        if request.trip_request_id.startswith("stuck"):
+            time.sleep(self.stall)
+        return super().CalculatePrice(request, context)
+
+# -----------------------------
+# In-process server
+# -----------------------------
+def start_server(service):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=8))
+    add_PricingServiceServicer_to_server(service, server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    return server, f"localhost:{port}"
+
+
+def hedged_price(pool, target, budget):
+    price = pool.stub(PricingServiceStub, target, hedge=True).CalculatePrice
+    price.budget = budget
+    price.tracker = LatencyTracker(min_samples=20, refresh_every=10)
+    return price
+
+
+def request(trip_request_id):
+    return PriceCalculationRequest(trip_request_id=trip_request_id, estimated_distance_meters=1000,
+                                   estimated_duration_seconds=600, demand_multiplier=1.0)
+
+# -----------------------------
+# Tests
+# -----------------------------
+def test_hedge_after_p95_first_response_wins():
+    server, target = start_server(StragglerPricingService())
+    pool = ChannelPool(channels_per_target=2)
+    try:
+        price = hedged_price(pool, target, HedgeBudget(ratio=0.05, burst=1))
+        # Before the tracker is warm nothing is hedged
+        for i in range(30):
+            price(request(f"warm_{i}"))
+        assert price.hedged == 0 and price.tracker.threshold() is not None
+
+        start = time.monotonic()
+        response = price(request("slow_1"))
+        assert response.trip_request_id == "slow_1"
+        assert time.monotonic() - start < 0.3
+        assert price.hedged == 1 and price.hedge_wins == 1
+
+        # Budget spent (1 token, 5% refill): the next straggler just waits
+        start = time.monotonic()
+        price(request("slow_2"))
+        assert time.monotonic() - start >= 0.45
+        assert price.hedged == 1 and price.budget.denied == 1
+    finally:
+        pool.close()
+        server.stop(None)
+
+
+def test_hedge_gets_only_the_remaining_timeout():
+    server, target = start_server(StragglerPricingService())
+    pool = ChannelPool(channels_per_target=2)
+    try:
+        price = hedged_price(pool, target, HedgeBudget(ratio=1.0, burst=5))
+        price.tracker = LatencyTracker(min_samples=5, refresh_every=5)
+        for i in range(5):
+            price(request(f"paced_{i}"))
+        assert price.tracker.threshold() >= 0.1
+
+        # Both attempts stall: the call ends at its own timeout, not p95 + timeout
+        start = time.monotonic()
+        try:
+            price(request("stuck_1"), timeout=0.25)
+            assert False, "expected DEADLINE_EXCEEDED"
+        except grpc.RpcError as e:
+            assert e.code() == grpc.StatusCode.DEADLINE_EXCEEDED
+        assert time.monotonic() - start < 0.32
+        assert price.hedged == 1
+
+        # A hedge win records the whole call, hedge delay included
+        count = price.tracker.count
+        price(request("slow_1"), timeout=2.0)
+        assert price.hedge_wins == 1 and price.tracker.count == count + 1
+        assert price.tracker.samples[count % price.tracker.window] >= price.tracker.threshold()
+    finally:
+        pool.close()
+        server.stop(None)
+
+
+def test_pool_hedges_only_idempotent_methods():
+    pool = ChannelPool(channels_per_target=2)
+    try:
+        stub = pool.stub(PricingServiceStub, "localhost:1", hedge=True)
+        assert set(stub.hedged) == {"CalculatePrice"}
+        assert isinstance(stub.CalculatePrice, HedgedCallable)
+        assert not isinstance(stub.UpdateFallbackConfig, HedgedCallable)
+        assert pool.stub(PricingServiceStub, "localhost:1").hedged == {}
+    finally:
+        pool.close()
+
+
+# -----------------------------
+# Run tests
+# -----------------------------
+if __name__ == "__main__":
+    test_hedge_after_p95_first_response_wins()
+    test_hedge_gets_only_the_remaining_timeout()
+    test_pool_hedges_only_idempotent_methods()
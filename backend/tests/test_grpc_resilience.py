@@ -0,0 +1,187 @@
+import sys
+import os
+import time
+import grpc
+from concurrent import futures
+
+# -----------------------------
+# Add generated Python modules and services to path
+# -----------------------------
+sys.path.append(os.path.join(os.path.dirname(__file__), "../generated/python"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "../services/python"))
+
+from pricing_pb2_grpc import PricingServiceStub, add_PricingServiceServicer_to_server
+from pricing_pb2 import PriceCalculationRequest
+
+from pricing_server import PricingService
+from grpc_channels import ChannelPool
+from grpc_resilience import CircuitBreaker, ResilienceInterceptor, deadline_scope
+from pricing_fallback import FallbackPricer, CLIENT_MODEL_VERSION
+
+CALCULATE_PRICE = "/dgdo.pricing.PricingService/CalculatePrice"
+
+
+class SlowPricingService(PricingService):
+
+    def __init__(self):
+        self.delay = 0.0
+        self.calls = 0
+
+    def CalculatePrice(self, request, context):
+        self.calls += 1
+        time.sleep(self.delay)
+        return super().CalculatePrice(request, context)
+
+
+class SlowConfigPricingService(PricingService):
+
+    def GetFallbackConfig(self, request, context):
+        time.sleep(0.3)
+        return super().GetFallbackConfig(request, context)
+
+# -----------------------------
+# In-process server
+# -----------------------------
+def start_server(service):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    add_PricingServiceServicer_to_server(service, server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    return server, f"localhost:{port}"
+
+
+def price_request(i=0):
+    return PriceCalculationRequest(trip_request_id=f"trip_{i}", estimated_distance_meters=1000,
+                                   estimated_duration_seconds=600, demand_multiplier=1.0)
+
+
+def code_of(call):
+    try:
+        call()
+    except grpc.RpcError as e:
+        return e.code()
+    return grpc.StatusCode.OK
+
+# -----------------------------
+# Tests
+# -----------------------------
+def test_method_deadline_and_circuit_breaker():
+    service = SlowPricingService()
+    server, target = start_server(service)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.3)
+    pool = ChannelPool(channels_per_target=1, interceptors=lambda t: [
+        ResilienceInterceptor(t, breaker, deadlines={CALCULATE_PRICE: 0.1})
+    ])
+    try:
+        stub = pool.stub(PricingServiceStub, target)
+        assert code_of(lambda: stub.CalculatePrice(price_request())) == grpc.StatusCode.OK
+
+        # Hung server: the per-method deadline cuts each call short...
+        service.delay = 0.5
+        start = time.monotonic()
+        assert code_of(lambda: stub.CalculatePrice(price_request())) == grpc.StatusCode.DEADLINE_EXCEEDED
+        assert time.monotonic() - start < 0.4
+        assert code_of(lambda: stub.CalculatePrice(price_request())) == grpc.StatusCode.DEADLINE_EXCEEDED
+        assert breaker.state == CircuitBreaker.OPEN
+
+        # ...and once open, calls fail fast without reaching the server
+        calls = service.calls
+        start = time.monotonic()
+        assert code_of(lambda: stub.CalculatePrice(price_request())) == grpc.StatusCode.UNAVAILABLE
+        assert code_of(lambda: stub.CalculatePrice.future(price_request()).result()) == grpc.StatusCode.UNAVAILABLE
+        assert time.monotonic() - start < 0.05
+        assert service.calls == calls
+
+        # Recovered server: the half-open probe closes the breaker
+        service.delay = 0.0
+        time.sleep(0.35)
+        assert code_of(lambda: stub.CalculatePrice(price_request())) == grpc.StatusCode.OK
+        assert breaker.state == CircuitBreaker.CLOSED
+    finally:
+        pool.close()
+        server.stop(None)
+
+
+def test_deadline_scope_bounds_downstream_calls():
+    service = SlowPricingService()
+    service.delay = 0.3
+    server, target = start_server(service)
+    pool = ChannelPool(channels_per_target=1, interceptors=lambda t: [
+        ResilienceInterceptor(t, CircuitBreaker(failure_threshold=100), deadlines={CALCULATE_PRICE: 5.0})
+    ])
+    try:
+        stub = pool.stub(PricingServiceStub, target)
+        with deadline_scope(0.05):
+            start = time.monotonic()
+            assert code_of(lambda: stub.CalculatePrice(price_request())) == grpc.StatusCode.DEADLINE_EXCEEDED
+            assert time.monotonic() - start < 0.25
+
+            # Budget spent: not even sent
+            calls = service.calls
+            assert code_of(lambda: stub.CalculatePrice(price_request())) == grpc.StatusCode.DEADLINE_EXCEEDED
+            assert service.calls == calls
+    finally:
+        pool.close()
+        server.stop(None)
+
+
+def test_fallback_pricer_prices_locally_when_pricing_is_down():
+    server, target = start_server(PricingService())
+    channel = grpc.insecure_channel(target)
+    pricer = FallbackPricer(PricingServiceStub(channel))
+    try:
+        online = pricer.price(price_request(1))
+        pricer.refresher.join()
+        assert pricer.config is not None
+
+        server.stop(None)
+        offline = pricer.price(price_request(2), timeout=0.5)
+        assert offline.pricing_model_version == CLIENT_MODEL_VERSION
+        assert offline.passenger_fare_total == online.passenger_fare_total
+        assert offline.calculation_metadata.data["fallback_reason"] == "UNAVAILABLE"
+        assert pricer.fallbacks == 1
+    finally:
+        channel.close()
+        server.stop(None)
+
+
+def test_breaker_ignores_request_errors():
+    breaker = CircuitBreaker(failure_threshold=2)
+    for _ in range(5):
+        breaker.record(grpc.StatusCode.INTERNAL, 0.0)
+        breaker.record(grpc.StatusCode.UNKNOWN, 0.0)
+        breaker.record(grpc.StatusCode.INVALID_ARGUMENT, 0.0)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record(grpc.StatusCode.RESOURCE_EXHAUSTED, 0.0)
+    breaker.record(grpc.StatusCode.UNAVAILABLE, 0.0)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_fallback_config_refresh_stays_off_the_call_path():
+    server, target = start_server(SlowConfigPricingService())
+    pool = ChannelPool(channels_per_target=1, interceptors=lambda t: [ResilienceInterceptor(t, CircuitBreaker())])
+    pricer = FallbackPricer(pool.stub(PricingServiceStub, target))
+    try:
+        start = time.monotonic()
+        with deadline_scope(0.2):
+            pricer.price(price_request(1))
+            pricer.price(price_request(2))
+        assert time.monotonic() - start < 0.2
+        refresher = pricer.refresher
+        refresher.join()
+        # One refresh for both calls, not bound by their deadline
+        assert pricer.refresher is refresher and pricer.config is not None
+    finally:
+        pool.close()
+        server.stop(None)
+
+
+# -----------------------------
+# Run tests
+# -----------------------------
+if __name__ == "__main__":
+    test_method_deadline_and_circuit_breaker()
+    test_deadline_scope_bounds_downstream_calls()
+    test_fallback_pricer_prices_locally_when_pricing_is_down()
+    test_breaker_ignores_request_errors()
+    test_fallback_config_refresh_stays_off_the_call_path()
@@ -0,0 +1,187 @@
+import sys
+import os
+import asyncio
+import threading
+import time
+
+# -----------------------------
+# Add services to path
+# -----------------------------
+sys.path.append(os.path.join(os.path.dirname(__file__), "../services/python"))
+
+from idempotency import IdempotencyCache, AsyncIdempotencyCache, MemoryBackend, DuplicateInFlight, INFLIGHT_PREFIX
+
+
+class CountingBackend(MemoryBackend):
+
+    def __init__(self):
+        super().__init__()
+        self.round_trips = 0
+
+    def claim(self, key, marker, ttl):
+        self.round_trips += 1
+        return super().claim(key, marker, ttl)
+
+class SlowBackend(MemoryBackend):
+
+    def claim(self, key, marker, ttl):
+        time.sleep(0.1)
+        return super().claim(key, marker, ttl)
+
+# -----------------------------
+# Tests
+# -----------------------------
+def test_concurrent_duplicates_run_once():
+    cache = IdempotencyCache(MemoryBackend())
+    runs, results = [], []
+
+    def create_trip():
+        claim = cache.claim("trip:key_1")
+        if claim.done:
+            results.append(claim.value)
+            return
+        runs.append(1)
+        time.sleep(0.1)
+        cache.complete(claim, "trip_1", ttl=300)
+        results.append("trip_1")
+
+    threads = [threading.Thread(target=create_trip) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(runs) == 1
+    assert results == ["trip_1"] * 8
+
+
+def test_processes_share_backend_and_failed_claims_are_released():
+    backend = MemoryBackend()
+    first = IdempotencyCache(backend, poll_interval=0.01)
+    second = IdempotencyCache(backend, poll_interval=0.01, wait_timeout=0.05)
+
+    claim = first.claim("trip:key_2")
+    assert claim.marker.startswith(INFLIGHT_PREFIX)
+    # In flight in the other "process": wait, then give up
+    try:
+        second.claim("trip:key_2")
+        assert False, "expected DuplicateInFlight"
+    except DuplicateInFlight:
+        pass
+
+    # The owner fails: the duplicate can take over
+    first.release(claim)
+    retry = second.claim("trip:key_2")
+    assert not retry.done and retry.marker is not None
+    second.complete(retry, "trip_2", ttl=300)
+    assert first.claim("trip:key_2").value == "trip_2"
+
+
+def test_local_tier_skips_backend_round_trips():
+    backend = CountingBackend()
+    cache = IdempotencyCache(backend, local_entries=2)
+    for key in ("a", "b", "c"):
+        cache.complete(cache.claim(key), f"trip_{key}", ttl=300)
+    assert backend.round_trips == 3
+
+    assert cache.claim("c").value == "trip_c"
+    assert cache.claim("b").value == "trip_b"
+    assert backend.round_trips == 3
+    # "a" was evicted from the LRU but is still in the backend
+    assert cache.claim("a").value == "trip_a"
+    assert backend.round_trips == 4
+
+
+def test_expired_claim_does_not_overwrite_the_new_owner():
+    now = [0.0]
+    backend = MemoryBackend(clock=lambda: now[0])
+    first = IdempotencyCache(backend, claim_ttl=30, clock=lambda: now[0])
+    second = IdempotencyCache(backend, claim_ttl=30, clock=lambda: now[0])
+
+    stale = first.claim("trip:key_3")
+    now[0] = 31.0   # the first owner stalled past claim_ttl
+    fresh = second.claim("trip:key_3")
+    assert fresh.marker is not None
+    second.complete(fresh, "trip_new", ttl=300)
+
+    assert not first.complete(stale, "trip_old", ttl=300)
+    assert first.lost_claims == 1
+    assert backend.get("trip:key_3") == "trip_new"
+    assert first.claim("trip:key_3").value == "trip_new"
+
+
+def test_discard_only_forgets_the_given_value():
+    cache = IdempotencyCache(MemoryBackend())
+    cache.complete(cache.claim("trip:key_4"), "queued:req_4", ttl=300)
+    cache.discard("trip:key_4", "queued:req_9")
+    assert cache.claim("trip:key_4").value == "queued:req_4"
+
+    # The queued request failed: a retry gets to run again
+    cache.discard("trip:key_4", "queued:req_4")
+    claim = cache.claim("trip:key_4")
+    assert claim.marker is not None and not claim.done
+
+
+def test_async_duplicates_run_once():
+    cache = AsyncIdempotencyCache(IdempotencyCache(MemoryBackend()))
+    runs = []
+
+    async def create_trip():
+        claim = await cache.claim("trip:key_4")
+        if claim.done:
+            return claim.value
+        runs.append(1)
+        await asyncio.sleep(0.1)
+        await cache.complete(claim, "trip_4", ttl=300)
+        return "trip_4"
+
+    async def main():
+        return await asyncio.gather(*[create_trip() for _ in range(8)])
+
+    assert asyncio.run(main()) == ["trip_4"] * 8
+    assert len(runs) == 1
+
+
+def test_async_claim_cancelled_midway_is_released():
+    cache = AsyncIdempotencyCache(IdempotencyCache(SlowBackend()))
+
+    async def main():
+        abandoned = asyncio.ensure_future(cache.claim("trip:key_5"))
+        await asyncio.sleep(0.02)
+        abandoned.cancel()
+        # The abandoned claim lands after the cancel and is given back
+        claim = await cache.claim("trip:key_5")
+        assert claim.marker is not None and not claim.done
+        await cache.complete(claim, "trip_5", ttl=300)
+        return (await cache.claim("trip:key_5")).value
+
+    assert asyncio.run(main()) == "trip_5"
+
+
+def test_async_cache_close_stops_its_worker_threads():
+    cache = AsyncIdempotencyCache(IdempotencyCache(MemoryBackend()), workers=4)
+
+    async def run():
+        claims = await asyncio.gather(*(cache.claim(f"trip:key_{i}") for i in range(8)))
+        await asyncio.gather(*(cache.complete(claim, "trip", ttl=300) for claim in claims))
+
+    before = set(threading.enumerate())
+    asyncio.run(run())
+    workers = [t for t in set(threading.enumerate()) - before if t.name.startswith("idempotency")]
+    assert workers
+    cache.close()
+    assert not any(t.is_alive() for t in workers)
+
+
+# -----------------------------
+# Run tests
+# -----------------------------
+if __name__ == "__main__":
+    test_concurrent_duplicates_run_once()
+    test_processes_share_backend_and_failed_claims_are_released()
+    test_local_tier_skips_backend_round_trips()
+    test_expired_claim_does_not_overwrite_the_new_owner()
+    test_discard_only_forgets_the_given_value()
+    test_async_duplicates_run_once()
+    test_async_claim_cancelled_midway_is_released()
+    test_async_cache_close_stops_its_worker_threads()
@@ -0,0 +1,59 @@
+import sys
+import os
+import asyncio
+import contextlib
+import random
+
+# -----------------------------
+# Add generated Python modules, services and benchmarks to path
+# -----------------------------
+sys.path.append(os.path.join(os.path.dirname(__file__), "../generated/python"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "../services/python"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "../benchmarks"))
+
+from hdr_histogram import Histogram
+from open_loop import InProcessBackend, run_open_loop, STAGES
+
+# -----------------------------
+# Tests
+# -----------------------------
+def test_histogram_quantiles_within_bucket_precision():
+    rng = random.Random(7)
+    values = sorted(rng.uniform(0.0001, 2.0) for _ in range(20_000))
+    hist, other = Histogram(), Histogram()
+    for i, v in enumerate(values):
+        (hist if i % 2 else other).record(v)
+    hist.merge(other)
+
+    assert hist.total == len(values)
+    for q in (0.5, 0.99, 0.999):
+        exact = values[int(q * len(values)) - 1]
+        assert abs(hist.quantile(q) - exact) / exact < 0.01
+    assert abs(hist.quantile(1.0) - values[-1]) < 1e-6
+
+
+def test_open_loop_against_in_process_services():
+    backend = InProcessBackend(drivers=50, seed=1)
+    target = backend.start()
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            result = asyncio.run(run_open_loop(target, rate=50, duration=1.0, seed=1))
+    finally:
+        backend.stop()
+
+    # Poisson arrivals are seeded, so the offered load is reproducible
+    assert 30 <= result.arrivals <= 70
+    assert result.errors == {} and result.dropped == 0
+    assert result.completed == result.arrivals
+    for stage in STAGES:
+        assert result.histograms[stage].total == result.arrivals
+    # End-to-end includes every stage
+    assert result.histograms["trip"].quantile(0.5) >= result.histograms["create_trip"].quantile(0.5)
+
+
+# -----------------------------
+# Run tests
+# -----------------------------
+if __name__ == "__main__":
+    test_histogram_quantiles_within_bucket_precision()
+    test_open_loop_against_in_process_services()
@@ -0,0 +1,208 @@
+import sys
+import os
+import grpc
+import tempfile
+import numpy as np
+from concurrent import futures
+
+# -----------------------------
+# Add generated Python modules and services to path
+# -----------------------------
+sys.path.append(os.path.join(os.path.dirname(__file__), "../generated/python"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "../services/python"))
+
+from ml_feedback_pb2_grpc import MLFeedbackServiceStub
+from ml_feedback_pb2 import Feedback, TrainingBatchRequest
+from common_pb2 import Metadata
+
+from ml_feedback_server import MLFeedbackService, add_MLFeedbackService_to_server, TOKEN_KEY, TOKEN_TRAILER
+from feedback_store import FeedbackStore
+from record_buffers import RecordLog
+from feedback_features import FeatureExporter, load_shards
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def start_server(store):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    add_MLFeedbackService_to_server(MLFeedbackService(store), server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    return server, MLFeedbackServiceStub(grpc.insecure_channel(f"localhost:{port}"))
+
+def make_feedback(i, success=True):
+    fb = Feedback(trip_request_id=f"req_{i}", matched_driver_id=f"driver_{i % 7}", success_flag=success)
+    fb.timestamp.FromSeconds(1_000 + i)
+    fb.metadata.data["city"] = ["kabul", "herat"][i % 2]
+    return fb
+
+def fetch_page(stub, batch_size, filters=None, token=None):
+    """(feedback list, continuation token or None) for one GetTrainingBatch call."""
+    data = dict(filters or {})
+    if token:
+        data[TOKEN_KEY] = token
+    call = stub.GetTrainingBatch(TrainingBatchRequest(metadata=Metadata(data=data), batch_size=batch_size))
+    page = list(call)
+    return page, dict(call.trailing_metadata()).get(TOKEN_TRAILER)
+
+# -----------------------------
+# Tests
+# -----------------------------
+def test_record_log_spans_chunks():
+    log = RecordLog(chunk_bytes=64)
+    payloads = [bytes([i]) * (i % 40 + 1) for i in range(200)]
+    rows = [log.append(p) for p in payloads]
+    assert rows == list(range(200))
+    assert len(log.bytes.chunks) > 1
+    assert [log.get(r) for r in rows] == payloads
+
+
+def test_feedback_round_trips_as_stored_bytes():
+    store = FeedbackStore()
+    server, stub = start_server(store)
+    try:
+        sent = [make_feedback(i, success=i % 3 != 0) for i in range(50)]
+        for fb in sent:
+            ack = stub.SendFeedback(fb)
+            assert ack.trip_request_id == fb.trip_request_id and not (ack.duplicate or ack.replaced)
+
+        assert len(store) == 50
+        assert list(store.scan()) == [fb.SerializeToString() for fb in sent]
+        assert list(stub.GetTrainingBatch(TrainingBatchRequest())) == sent
+    finally:
+        server.stop(None)
+
+
+def test_training_batch_pages_filtered_snapshot():
+    store = FeedbackStore()
+    server, stub = start_server(store)
+    try:
+        for i in range(2_000):
+            stub.SendFeedback(make_feedback(i, success=i % 3 != 0))
+        filters = {"city": "herat", "success_flag": "true"}
+        expected = [f"req_{i}" for i in range(2_000) if i % 2 == 1 and i % 3 != 0]
+
+        pulled, token = [], None
+        while True:
+            page, token = fetch_page(stub, 300, filters, token)
+            assert len(page) <= 300
+            pulled.extend(fb.trip_request_id for fb in page)
+            # Feedback arriving mid-scan is outside the pinned snapshot
+            stub.SendFeedback(make_feedback(10_000 + len(pulled) * 2 + 1))
+            if token is None:
+                break
+        assert pulled == expected
+
+        page, token = fetch_page(stub, 0, {"success_flag": "false"})
+        assert len(page) == 667 and token is None
+        page, token = fetch_page(stub, 5)
+        assert [fb.trip_request_id for fb in page] == [f"req_{i}" for i in range(5)] and token
+
+        # A token only resumes the query it was issued for
+        try:
+            fetch_page(stub, 5, {"city": "kabul"}, token)
+            assert False, "expected INVALID_ARGUMENT"
+        except grpc.RpcError as e:
+            assert e.code() == grpc.StatusCode.INVALID_ARGUMENT
+    finally:
+        server.stop(None)
+
+
+def test_feature_shards_export_incrementally():
+    store = FeedbackStore()
+    with tempfile.TemporaryDirectory() as out_dir:
+        exporter = FeatureExporter(store, out_dir, shard_rows=100, max_candidates=3)
+        for i in range(250):
+            fb = make_feedback(i, success=i % 2 == 0)
+            for rank in range(4):
+                fb.candidate_list.add(driver_id=f"driver_{rank}", probability=0.25,
+                                      distance_meters=100.0 * rank, eta_seconds=60 * rank)
+            fb.matched_driver_id = f"driver_{i % 5}"   # driver_4 is not a candidate
+            if i % 10 == 0:
+                fb.driver_status_snapshot.is_available = True
+                fb.driver_status_snapshot.last_seen.FromSeconds(1_000 + i - 30)
+            store.put(fb.SerializeToString())
+
+        assert exporter.export() == 2 and exporter.export() == 0   # only whole shards
+        assert exporter.export(flush=True) == 1
+
+        names, shards = load_shards(out_dir)
+        assert [len(s) for s in shards] == [100, 100, 50]
+        assert isinstance(shards[0], np.memmap)
+        col = {n: i for i, n in enumerate(names)}
+        rows = np.concatenate(shards)
+        assert rows[:, col["label_success"]].sum() == 125
+        assert list(rows[:5, col["matched_rank"]]) == [0, 1, 2, 3, -1]
+        assert rows[3, col["matched_distance_m"]] == 300.0
+        assert np.isnan(rows[4, col["matched_eta_s"]])
+        assert rows[0, col["snapshot_age_s"]] == 30.0 and np.isnan(rows[1, col["snapshot_age_s"]])
+        assert "cand3_probability" not in col   # capped at max_candidates
+
+
+def test_send_feedback_is_idempotent_last_write_wins():
+    store = FeedbackStore()
+    server, stub = start_server(store)
+    try:
+        for i in range(10):
+            stub.SendFeedback(make_feedback(i, success=False))
+        first = make_feedback(3, success=False)
+        assert stub.SendFeedback(first).duplicate          # retry: no new row
+        assert len(store) == 10
+
+        later = make_feedback(3, success=True)
+        later.metadata.data["city"] = "mazar"
+        ack = stub.SendFeedback(later)
+        assert ack.replaced and not ack.duplicate
+        assert len(store) == 10
+        stored = list(stub.GetTrainingBatch(TrainingBatchRequest()))
+        assert stored[3] == later
+        assert [fb.trip_request_id for fb in stored] == [f"req_{i}" for i in range(10)]
+
+        # Filters see the latest version only
+        page, _ = fetch_page(stub, 100, {"success_flag": "true"})
+        assert [fb.trip_request_id for fb in page] == ["req_3"]
+        page, _ = fetch_page(stub, 100, {"city": "herat"})
+        assert [fb.trip_request_id for fb in page] == ["req_1", "req_5", "req_7", "req_9"]
+
+        try:
+            stub.SendFeedback(Feedback(success_flag=True))
+            assert False, "expected INVALID_ARGUMENT"
+        except grpc.RpcError as e:
+            assert e.code() == grpc.StatusCode.INVALID_ARGUMENT
+    finally:
+        server.stop(None)
+
+
+def test_matching_rows_agree_with_a_full_scan():
+    store = FeedbackStore()
+    feedback = {}
+    for i in range(3_000):
+        fb = make_feedback(i % 2_500, success=i % 5 != 0)   # the last 500 replace earlier rows
+        fb.metadata.data["vehicle"] = ["car", "van", "bike"][i % 3]
+        store.put(fb.SerializeToString(), fb)
+        feedback[fb.trip_request_id] = fb
+
+    rows = [Feedback.FromString(data) for data in store.scan()]
+    for metadata, success in [({"city": "herat", "vehicle": "van"}, None), ({"vehicle": "bike"}, False),
+                              ({"city": "kabul", "vehicle": "car"}, True), ({}, False), ({"city": "nowhere"}, None)]:
+        expected = [row for row, fb in enumerate(rows)
+                    if all(fb.metadata.data.get(k) == v for k, v in metadata.items())
+                    and (success is None or fb.success_flag == success)]
+        pulled, cursor = [], 0
+        while cursor is not None:
+            page, cursor = store.matching_rows(cursor, len(store), 97, metadata, success)
+            assert len(page) <= 97
+            pulled.extend(int(row) for row in page)
+        assert pulled == expected, (metadata, success)
+
+
+# -----------------------------
+# Run tests
+# -----------------------------
+if __name__ == "__main__":
+    test_record_log_spans_chunks()
+    test_feedback_round_trips_as_stored_bytes()
+    test_training_batch_pages_filtered_snapshot()
+    test_send_feedback_is_idempotent_last_write_wins()
+    test_feature_shards_export_incrementally()
+    test_matching_rows_agree_with_a_full_scan()
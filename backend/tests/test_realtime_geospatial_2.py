@@ -21,7 +21,7 @@ from matching_pb2 import MatchingRequest
 
 from trip_service_pb2_grpc import TripServiceStub
 from trip_service_pb2 import CreateTripCommand, UpdateTripStatusCommand, CancelTripCommand
-from trip_service_pb2 import TripStatus
+from trip_pb2 import TripStatus
 
 from common_pb2 import Location
 
@@ -129,7 +129,7 @@ def run_single_trip(passenger_id, trip_request_stub, matching_stub, trip_stub):
         destination=trip_request.destination
     )
     trip = trip_stub.CreateTrip(create_trip_cmd)
-    log_event("TripCreated", {"trip_id": trip.id, "driver_id": driver_id})
+    log_event("TripCreated", {"trip_id": trip.id, "trip_request_id": trip.trip_request_id, "driver_id": driver_id})
 
     # FSM & driver movement
     fsm_sequence = [TripStatus.EN_ROUTE, TripStatus.COMPLETED]
@@ -20,7 +20,7 @@ from matching_pb2 import MatchingRequest
 
 from trip_service_pb2_grpc import TripServiceStub
 from trip_service_pb2 import CreateTripCommand, UpdateTripStatusCommand, CancelTripCommand
-from trip_service_pb2 import TripStatus
+from trip_pb2 import TripStatus
 
 from common_pb2 import Location
 
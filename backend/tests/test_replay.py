@@ -0,0 +1,200 @@
+import sys
+import os
+import asyncio
+import contextlib
+import json
+import logging
+import random
+import tempfile
+import threading
+
+import grpc
+
+# -----------------------------
+# Add generated Python modules, services and benchmarks to path
+# -----------------------------
+sys.path.append(os.path.join(os.path.dirname(__file__), "../generated/python"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "../services/python"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "../benchmarks"))
+
+from trip_request_pb2_grpc import TripRequestServiceStub
+from matching_pb2_grpc import MatchingServiceStub
+from trip_service_pb2_grpc import TripServiceStub
+from telemetry_pb2 import TelemetryEvent
+from trip_pb2 import TripStatus
+
+from telemetry_store import TelemetryStore
+from open_loop import InProcessBackend
+from replay import REPLAYED_SERVICES, load_records, sessions_of, replay
+
+RECORDING = [
+    "INFO service starting",
+    {"timestamp": "2026-01-01T10:00:00.000000Z", "event_type": "TripRequestCreated",
+     "data": {"trip_request_id": "tr_1", "passenger_id": "passenger_1",
+              "origin": {"lat": 40.28, "lon": 69.62}, "destination": {"lat": 40.29, "lon": 69.63}}},
+    {"timestamp": "2026-01-01T10:00:00.050000Z", "event_type": "DriverAssigned",
+     "data": {"trip_request_id": "tr_1"}},
+    {"timestamp": "2026-01-01T10:00:00.100000Z", "event_type": "TripRequestCreated",
+     "data": {"trip_request_id": "tr_2", "passenger_id": "passenger_2", "origin": {"lat": 40.3, "lon": 69.6}}},
+    {"timestamp": "2026-01-01T10:00:00.150000Z", "event_type": "TripCreated",
+     "data": {"trip_id": "t_1", "trip_request_id": "tr_1"}},
+    {"timestamp": "2026-01-01T10:00:00.200000Z", "event_type": "DriverAssigned",
+     "data": {"trip_request_id": "tr_2"}},
+    {"timestamp": "2026-01-01T10:00:00.250000Z", "event_type": "TripStatusUpdated",
+     "data": {"trip_id": "t_1", "new_status": TripStatus.EN_ROUTE, "version": 2}},
+    {"timestamp": "2026-01-01T10:00:00.300000Z", "event_type": "FSMError", "data": {"trip_id": "t_1"}},
+    {"timestamp": "2026-01-01T10:00:00.350000Z", "event_type": "TripCreated",
+     "data": {"trip_id": "t_2", "trip_request_id": "tr_2"}},
+    {"timestamp": "2026-01-01T10:00:00.400000Z", "event_type": "TripCancelled",
+     "data": {"trip_id": "t_2", "status": TripStatus.CANCELLED}},
+]
+
+
+def write_log(path, entries):
+    with open(path, "w") as f:
+        for entry in entries:
+            f.write((entry if isinstance(entry, str) else json.dumps(entry)) + "\n")
+
+
+def run_replay(target, path, **kwargs):
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return asyncio.run(replay(dict.fromkeys(REPLAYED_SERVICES, target), load_records([path]), **kwargs))
+
+# -----------------------------
+# Tests
+# -----------------------------
+def test_replay_records_and_diffs_against_recording():
+    backend = InProcessBackend(drivers=50, seed=2)
+    target = backend.start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            original, rerecorded = os.path.join(tmp, "original.log"), os.path.join(tmp, "replayed.log")
+            write_log(original, RECORDING)
+
+            recorded = []
+            result = run_replay(target, original, speed=None, namespace="run_a", record=recorded.append)
+            assert result.mismatches == []
+            assert result.replayed == 8 and result.skipped == {"FSMError": 1}
+
+            # Replaying the re-recording reproduces it exactly, at the recorded pace / 10
+            recorded.sort(key=lambda entry: entry["timestamp"])
+            write_log(rerecorded, recorded)
+            result = run_replay(target, rerecorded, speed=10, namespace="run_b")
+            assert result.mismatches == [] and result.replayed == 8
+            assert result.elapsed >= result.span / 10 * 0.9
+
+            # A behaviour change shows up as a mismatch on that event only
+            assigned = next(e for e in recorded if e["event_type"] == "DriverAssigned")
+            assigned["data"]["driver_id"] = "driver_gone"
+            write_log(rerecorded, recorded)
+            result = run_replay(target, rerecorded, speed=None, namespace="run_c")
+            assert [(m.event_type, m.field, m.expected) for m in result.mismatches] == \
+                [("DriverAssigned", "driver_id", "driver_gone")]
+    finally:
+        backend.stop()
+
+
+def test_telemetry_segments_are_normalised():
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = TelemetryStore(data_dir, ring_capacity=1)
+        for i, (event_type, entity_id, metadata) in enumerate([
+            ("trip_request_created", "tr_1", {"passenger_id": "passenger_1"}),
+            ("trip_created", "t_1", {"trip_request_id": "tr_1", "driver_id": "driver_1"}),
+            ("driver_matched", "driver_1", {}),
+        ]):
+            evt = TelemetryEvent(event_type=event_type, entity_id=entity_id)
+            evt.timestamp.seconds = 1_000 + i
+            evt.metadata.data.update(metadata)
+            store.append(evt.SerializeToString())
+        store.close()
+
+        records = load_records([data_dir])
+        assert [r.event_type for r in records] == ["TripRequestCreated", "TripCreated", "DriverMatched"]
+        assert records[0].data == {"trip_request_id": "tr_1", "passenger_id": "passenger_1"}
+        assert records[1].data == {"trip_id": "t_1", "trip_request_id": "tr_1", "driver_id": "driver_1"}
+        assert records[2].ts == 1_002
+
+
+def test_telemetry_without_trip_request_ids_is_linked_by_order():
+    # As the workflows wrote it before attaching trip_request_id: the entity id only
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = TelemetryStore(data_dir, ring_capacity=1)
+        for i, (event_type, entity_id) in enumerate([
+            ("trip_request_created", "tr_1"),
+            ("trip_request_created", "tr_2"),
+            ("trip_request_created", "tr_3"),
+            ("driver_matched", "driver_1"),
+            ("driver_matched", "driver_2"),
+            ("driver_assigned", "driver_2"),
+            ("price_calculated", "calc_1"),
+            ("driver_assigned", "driver_1"),
+            ("trip_created", "t_1"),
+            ("trip_created", "t_2"),
+            ("trip_request_expired", "tr_3"),
+        ]):
+            evt = TelemetryEvent(event_type=event_type, entity_id=entity_id)
+            evt.timestamp.seconds = 1_000 + i
+            store.append(evt.SerializeToString())
+        store.close()
+        records = load_records([data_dir])
+
+    assert sessions_of(records) == ["tr_1", "tr_2", "tr_3", "tr_1", "tr_2", "tr_2", None, "tr_1",
+                                    "tr_1", "tr_2", "tr_3"]
+
+    backend = InProcessBackend(drivers=50, seed=2)
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            result = asyncio.run(replay(dict.fromkeys(REPLAYED_SERVICES, backend.start()), records, speed=None))
+    finally:
+        backend.stop()
+    assert result.replayed == 9
+    assert result.skipped == {"PriceCalculated": 1, "TripRequestExpired": 1}
+
+
+def test_realtime_script_output_replays():
+    import test_realtime_geospatial as script
+
+    backend = InProcessBackend(drivers=50, seed=2)
+    target = backend.start()
+    channel = grpc.insecure_channel(target)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "trips.log")
+        handler = logging.FileHandler(path)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        script.logger.addHandler(handler)
+        script.logger.setLevel(logging.INFO)
+        try:
+            random.seed(5)
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                threads = [threading.Thread(target=script.run_single_trip, args=(
+                    f"passenger_{i}", TripRequestServiceStub(channel), MatchingServiceStub(channel),
+                    TripServiceStub(channel))) for i in range(3)]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+        finally:
+            script.logger.removeHandler(handler)
+            handler.close()
+
+        try:
+            records = load_records([path])
+            result = run_replay(target, path, speed=None, namespace="replay")
+        finally:
+            channel.close()
+            backend.stop()
+
+    # Every event joins its trip request; only the script's own nearest-driver pick differs from matching
+    assert None not in sessions_of(records)
+    assert result.replayed == len(records) and not result.skipped
+    assert {(m.event_type, m.field) for m in result.mismatches} <= {("DriverAssigned", "driver_id")}
+
+
+# -----------------------------
+# Run tests
+# -----------------------------
+if __name__ == "__main__":
+    test_replay_records_and_diffs_against_recording()
+    test_telemetry_segments_are_normalised()
+    test_telemetry_without_trip_request_ids_is_linked_by_order()
+    test_realtime_script_output_replays()
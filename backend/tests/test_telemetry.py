@@ -0,0 +1,317 @@
+import sys
+import os
+import grpc
+import tempfile
+import threading
+import numpy as np
+from concurrent import futures
+
+# -----------------------------
+# Add generated Python modules and services to path
+# -----------------------------
+sys.path.append(os.path.join(os.path.dirname(__file__), "../generated/python"))
+sys.path.append(os.path.join(os.path.dirname(__file__), "../services/python"))
+
+from telemetry_pb2_grpc import TelemetryServiceStub
+from telemetry_pb2 import TelemetryEvent
+from common_pb2 import Metadata
+
+from telemetry_server import TelemetryService, add_TelemetryService_to_server
+from telemetry_store import TelemetryStore, BLOOM_BITS_PER_TERM
+from telemetry_client import TelemetryBatcher
+import telemetry_export
+from telemetry_export import export_segments, load_part, load_dictionaries
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def start_server(store):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    add_TelemetryService_to_server(TelemetryService(store), server)
+    port = server.add_insecure_port("localhost:0")
+    server.start()
+    return server, TelemetryServiceStub(grpc.insecure_channel(f"localhost:{port}"))
+
+def make_event(i, event_type="trip_created"):
+    evt = TelemetryEvent(event_type=event_type, entity_id=f"trip_{i}")
+    evt.timestamp.FromSeconds(1_000 + i)
+    return evt
+
+# -----------------------------
+# Tests
+# -----------------------------
+def test_ring_spills_to_rotated_segments():
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = TelemetryStore(data_dir, ring_capacity=10, segment_max_bytes=200)
+        for i in range(100):
+            store.append(make_event(i).SerializeToString())
+
+        assert len(store.ring) == 10
+        assert len(store.segments) > 3
+        # Stored bytes come back exactly as they were appended
+        assert list(store.query()) == [make_event(i).SerializeToString() for i in range(100)]
+
+        # Only segments overlapping the range are read
+        opened = [s for s in store.segments if s.overlaps(1_020, 1_030)]
+        assert 0 < len(opened) < len(store.segments)
+        events = [TelemetryEvent.FromString(d) for d in store.query(1_020, 1_030)]
+        assert [e.entity_id for e in events] == [f"trip_{i}" for i in range(20, 31)]
+
+        # Segments and their time index survive a restart
+        store.close()
+        reopened = TelemetryStore(data_dir, ring_capacity=10, segment_max_bytes=200)
+        assert len(list(reopened.query())) == 100
+        reopened.close()
+
+
+def test_query_metrics_time_filter():
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = TelemetryStore(data_dir, ring_capacity=5)
+        server, stub = start_server(store)
+        try:
+            for i in range(20):
+                stub.LogEvent(make_event(i))
+            events = list(stub.QueryMetrics(Metadata(data={"start_time": "1015", "end_time": "1017"})))
+            assert [e.entity_id for e in events] == ["trip_15", "trip_16", "trip_17"]
+
+            # A missing timestamp is filled at ingest, in the stored bytes too
+            echoed = stub.LogEvent(TelemetryEvent(event_type="trip_created", entity_id="untimed"))
+            assert echoed.timestamp.seconds > 1_000_000_000
+            stored = list(stub.QueryMetrics(Metadata(data={"entity_id": "untimed"})))
+            assert stored == [echoed]
+        finally:
+            server.stop(None)
+            store.close()
+
+
+def test_batched_log_events():
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = TelemetryStore(data_dir)
+        server, stub = start_server(store)
+        try:
+            batcher = TelemetryBatcher(stub, max_batch=100, max_delay=0.05)
+            for i in range(1000):
+                assert batcher.log(make_event(i))
+            batcher.log(TelemetryEvent(entity_id="no_type"))   # rejected server-side
+            batcher.close()
+
+            assert batcher.sent == 1001 and batcher.dropped == 0
+            assert len(list(stub.QueryMetrics(Metadata()))) == 1000
+        finally:
+            server.stop(None)
+            store.close()
+
+
+def test_batcher_drops_instead_of_blocking():
+    release = threading.Event()
+
+    class StuckStub:
+        def LogEvents(self, events, timeout=None):
+            release.wait()
+
+    batcher = TelemetryBatcher(StuckStub(), max_batch=1, max_delay=0.01, max_queue=10)
+    results = [batcher.log(make_event(i)) for i in range(100)]
+    assert results.count(False) == batcher.dropped > 0
+    release.set()
+    batcher.close()
+
+
+def test_aggregate_query_from_rollups():
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = TelemetryStore(data_dir)
+        server, stub = start_server(store)
+        try:
+            for i in range(120):
+                evt = make_event(i, event_type="matching")
+                evt.reason_code = "NO_DRIVERS" if i % 4 == 0 else ""
+                evt.metadata.data["duration_ms"] = str(10 + i % 50)
+                stub.LogEvent(evt)
+
+            rows = list(stub.QueryMetrics(Metadata(data={"aggregate": "1m", "reason_code": "NO_DRIVERS"})))
+            assert [int(r.metadata.data["count"]) for r in rows] == [5, 15, 10]
+            assert [r.timestamp.seconds for r in rows] == [960, 1020, 1080]
+
+            hourly = list(stub.QueryMetrics(Metadata(data={"aggregate": "1h", "event_type": "matching"})))
+            assert sum(int(r.metadata.data["count"]) for r in hourly) == 120
+            assert float(hourly[0].metadata.data["latency_p99_ms"]) <= 100
+
+            try:
+                list(stub.QueryMetrics(Metadata(data={"aggregate": "5m"})))
+                assert False, "expected INVALID_ARGUMENT"
+            except grpc.RpcError as e:
+                assert e.code() == grpc.StatusCode.INVALID_ARGUMENT
+        finally:
+            server.stop(None)
+            store.close()
+
+
+def test_indexed_filters_and_segment_blooms():
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = TelemetryStore(data_dir, ring_capacity=50, segment_max_bytes=2_000)
+        server, stub = start_server(store)
+        try:
+            for i in range(500):
+                evt = make_event(i % 100, event_type=["trip_created", "driver_assigned"][i % 2])
+                evt.metadata.data["trip_id"] = f"trip_{i % 100}"
+                stub.LogEvent(evt)
+
+            timeline = list(stub.QueryMetrics(Metadata(data={"trip_id": "trip_7"})))
+            assert len(timeline) == 5
+            assert {e.entity_id for e in timeline} == {"trip_7"}
+
+            # Postings cover exactly the events still in the ring
+            assert ("entity_id", "trip_7") not in store.postings
+            assert len(store.postings[("entity_id", "trip_99")]) == 1
+
+            # Most segments are skipped by their bloom filter
+            spilled = [s for s in store.segments if s.count]
+            may = [s for s in spilled if s.may_contain({"entity_id": "trip_7"})]
+            assert len(may) < len(spilled) / 2
+
+            # Sealed segments keep no terms or bloom in memory; the bloom on
+            # disk is sized from the segment's distinct terms, not its bytes
+            sealed = [s for s in spilled if s.sealed]
+            assert sealed and all(s.terms is None for s in sealed)
+            assert len(store.blooms.blooms) <= store.blooms.capacity
+            for s in sealed:
+                assert os.path.getsize(s.bloom_path) * 8 == s.bloom_bits
+                assert s.bloom_bits < 100 * BLOOM_BITS_PER_TERM
+
+            both = list(stub.QueryMetrics(Metadata(data={"entity_id": "trip_8", "event_type": "driver_assigned"})))
+            assert both == []
+            both = list(stub.QueryMetrics(Metadata(data={"entity_id": "trip_8", "event_type": "trip_created"})))
+            assert len(both) == 5
+
+            try:
+                list(stub.QueryMetrics(Metadata(data={"colour": "red"})))
+                assert False, "expected INVALID_ARGUMENT"
+            except grpc.RpcError as e:
+                assert e.code() == grpc.StatusCode.INVALID_ARGUMENT
+        finally:
+            server.stop(None)
+            store.close()
+
+
+def test_multi_filter_ring_query_matches_a_scan():
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = TelemetryStore(data_dir, ring_capacity=1_000)
+        try:
+            events = []
+            for i in range(600):
+                evt = make_event(i % 7, event_type=["trip_created", "driver_assigned", "trip_completed"][i % 3])
+                evt.metadata.data["driver_id"] = f"driver_{i % 5}"
+                store.append(evt.SerializeToString(), evt)
+                events.append(evt)
+
+            for filters in ({"entity_id": "trip_3", "event_type": "driver_assigned"},
+                            {"entity_id": "trip_3", "event_type": "driver_assigned", "driver_id": "driver_2"},
+                            {"event_type": "trip_completed", "driver_id": "driver_9"}):
+                got = [TelemetryEvent.FromString(b) for b in store.query(filters=filters)]
+                want = [e for e in events
+                        if all(getattr(e, k) == v if k in ("entity_id", "event_type") else e.metadata.data[k] == v
+                               for k, v in filters.items())]
+                assert got == want
+        finally:
+            store.close()
+
+
+def test_columnar_export_by_day_and_type():
+    with tempfile.TemporaryDirectory() as data_dir, tempfile.TemporaryDirectory() as export_dir:
+        store = TelemetryStore(data_dir, ring_capacity=10, segment_max_bytes=2_000)
+        day = 86_400
+        for i in range(300):
+            evt = make_event(i, event_type=["trip_created", "matching"][i % 2])
+            evt.timestamp.FromSeconds(day * (i // 150) + i)
+            evt.reason_code = "NO_DRIVERS" if i % 10 == 1 else ""
+            evt.metadata.data["duration_ms"] = str(i)
+            store.append(evt.SerializeToString())
+
+        closed = export_segments(data_dir, export_dir)
+        assert closed and export_segments(data_dir, export_dir) == []   # incremental
+        store.close()
+        closed += export_segments(data_dir, export_dir)                 # the last segment once closed
+        assert len(closed) == len(store.segments)
+
+        dictionaries = load_dictionaries(export_dir)
+        rows = []
+        for root, dirs, files in os.walk(export_dir):
+            if "timestamp_ns.npy" in files:
+                part = load_part(root)
+                assert isinstance(part["timestamp_ns"], np.memmap)
+                for j in range(len(part["timestamp_ns"])):
+                    event_type = dictionaries["event_type"][part["event_type"][j]]
+                    assert f"event_type={event_type}" in root
+                    rows.append((part["entity_id"][j], event_type,
+                                 dictionaries["reason_code"][part["reason_code"][j]], part["duration_ms"][j]))
+        assert len(rows) == 300
+        assert sorted(rows, key=lambda r: r[3]) == [
+            (f"trip_{i}", ["trip_created", "matching"][i % 2], "NO_DRIVERS" if i % 10 == 1 else "", float(i))
+            for i in range(300)
+        ]
+        assert {d for d in os.listdir(export_dir) if d.startswith("date=")} == {"date=1970-01-01", "date=1970-01-02"}
+
+
+def test_export_picks_up_segments_recovered_after_a_crash():
+    with tempfile.TemporaryDirectory() as data_dir, tempfile.TemporaryDirectory() as export_dir:
+        store = TelemetryStore(data_dir, ring_capacity=10, segment_max_bytes=1_000_000)
+        for i in range(50):
+            store.append(make_event(i).SerializeToString())
+        # Crash: the active segment is left without its sidecar
+        with store.lock:
+            while len(store.ring):
+                store._spill_oldest()
+            store.active.close()
+        assert export_segments(data_dir, export_dir) == []
+
+        recovered = TelemetryStore(data_dir, ring_capacity=10)
+        assert recovered.segments[0].sealed and recovered.segments[0].count == 50
+        assert export_segments(data_dir, export_dir) == ["segment_00000000.log"]
+        recovered.close()
+
+
+def test_arrow_export():
+    with tempfile.TemporaryDirectory() as data_dir, tempfile.TemporaryDirectory() as export_dir:
+        store = TelemetryStore(data_dir, ring_capacity=10, segment_max_bytes=2_000)
+        for i in range(100):
+            evt = make_event(i, event_type=["trip_created", "matching"][i % 2])
+            evt.reason_code = "NO_DRIVERS" if i % 10 == 1 else ""
+            store.append(evt.SerializeToString())
+        store.close()
+
+        if telemetry_export.pa is None:
+            try:
+                export_segments(data_dir, export_dir, "arrow")
+                assert False, "expected RuntimeError without pyarrow"
+            except RuntimeError:
+                return
+        pa = telemetry_export.pa
+
+        assert len(export_segments(data_dir, export_dir, "arrow")) == len(store.segments)
+        rows = []
+        for root, dirs, files in os.walk(export_dir):
+            for name in files:
+                if name.endswith(".arrow"):
+                    with pa.memory_map(os.path.join(root, name)) as source:
+                        table = pa.ipc.open_file(source).read_all()
+                    rows += zip(table.column("entity_id").to_pylist(), table.column("event_type").to_pylist(),
+                                table.column("reason_code").to_pylist())
+        assert sorted(rows) == sorted(
+            (f"trip_{i}", ["trip_created", "matching"][i % 2], "NO_DRIVERS" if i % 10 == 1 else "")
+            for i in range(100)
+        )
+
+
+# -----------------------------
+# Run tests
+# -----------------------------
+if __name__ == "__main__":
+    test_ring_spills_to_rotated_segments()
+    test_query_metrics_time_filter()
+    test_batched_log_events()
+    test_batcher_drops_instead_of_blocking()
+    test_aggregate_query_from_rollups()
+    test_indexed_filters_and_segment_blooms()
+    test_multi_filter_ring_query_matches_a_scan()
+    test_columnar_export_by_day_and_type()
+    test_export_picks_up_segments_recovered_after_a_crash()
+    test_arrow_export()
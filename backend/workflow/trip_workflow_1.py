@@ -11,7 +11,7 @@ Trip Workflow Orchestration for DG Do (Khujand)
 
 import uuid
 import logging
-from datetime import datetime, timezone
+from datetime import datetime
 from decimal import Decimal
 from typing import Optional
 
@@ -25,15 +25,29 @@ from pricing_pb2_grpc import PricingServiceStub
 from driver_status_pb2_grpc import DriverStatusServiceStub
 from trip_service_pb2_grpc import TripServiceStub
 
-from trip_request_pb2 import CreateTripRequestCommand, TripRequestStatus
+from trip_request_pb2 import CreateTripRequestCommand, CancelTripRequestCommand, TripRequestStatus
 from matching_pb2 import MatchingRequest
 from pricing_pb2 import PriceCalculationRequest
 from driver_status_pb2 import UpdateDriverStatusRequest
-from trip_service_pb2 import CreateTripCommand, TripStatus
+from trip_service_pb2 import CreateTripCommand
 
 # Telemetry helper
 from telemetry_pb2_grpc import TelemetryServiceStub
 from telemetry_pb2 import TelemetryEvent
+from telemetry_client import TelemetryBatcher
+
+# Per-driver acceptance rate / rating for pricing
+from driver_features import DriverFeatureStore, shared_features
+
+# Local LRU + Redis idempotency claims
+from idempotency import IdempotencyCache, RedisBackend
+
+# Cold-start queue for requests that found no driver
+from demand_queue import DemandQueue, AvailabilityFeed, NoDriversAvailable
+
+# Shared channels / stubs
+from grpc_channels import ChannelPool, default_pool
+from pricing_fallback import FallbackPricer
 
 # -----------------------------
 # Redis client for idempotency
@@ -46,6 +60,14 @@ redis_client = redis.Redis(host="localhost", port=6379, db=0)
 MIN_DRIVER_PAYOUT_TJS = 1.5  # TJS per km
 MAX_PRICE_MULTIPLIER = 3.0
 
+# Idempotency value of a request parked in the demand queue (until its trip exists)
+QUEUED_PREFIX = "queued:"
+
+
+def _point(location) -> str:
+    """A Location as telemetry metadata ("lat,lon")."""
+    return f"{location.lat},{location.lon}"
+
 # -----------------------------
 # Workflow class
 # -----------------------------
@@ -58,13 +80,75 @@ class TripWorkflow:
         driver_status_stub: DriverStatusServiceStub,
         trip_stub: TripServiceStub,
         telemetry_stub: TelemetryServiceStub,
+        driver_features: Optional[DriverFeatureStore] = None,
+        speculative_pricing: bool = False,
+        idempotency: Optional[IdempotencyCache] = None,
+        cold_start_queue: bool = False,
+        telemetry: Optional[TelemetryBatcher] = None,
     ):
+        """
+        speculative_pricing: quote the route while matching runs instead of
+        after it, so the critical path pays max(match, price) rather than
+        their sum. The quote is re-validated once the driver is known.
+        idempotency: claims per idempotency key (default: backed by
+        redis_client).
+        cold_start_queue: when matching finds nobody, queue the TripRequest
+        in self.demand_queue instead of failing, and finish it once a driver
+        becomes available nearby, as reported by DriverStatusService's
+        WatchAvailableDrivers stream (self.availability).
+        telemetry: batcher for workflow events, e.g. one shared by several
+        workflows (default: a batcher on telemetry_stub owned by this
+        workflow, flushed and stopped by close()).
+        """
         self.trip_request_stub = trip_request_stub
         self.matching_stub = matching_stub
         self.pricing_stub = pricing_stub
         self.driver_status_stub = driver_status_stub
         self.trip_stub = trip_stub
         self.telemetry_stub = telemetry_stub
+        # Events are queued and shipped in batches off the critical path
+        self.owns_telemetry = telemetry is None
+        self.telemetry = telemetry if telemetry is not None else TelemetryBatcher(telemetry_stub)
+        # Shared per process and fed from offer/rating telemetry
+        self.driver_features = driver_features if driver_features is not None else shared_features(telemetry_stub)
+        self.speculative_pricing = speculative_pricing
+        # CalculatePrice, priced locally from GetFallbackConfig when pricing is down
+        self.pricer = FallbackPricer(pricing_stub)
+        self.idempotency = idempotency if idempotency is not None else IdempotencyCache(RedisBackend(redis_client))
+        self.demand_queue = None
+        self.availability = None
+        if cold_start_queue:
+            self.demand_queue = DemandQueue(self.rematch_queued, on_expired=self.expire_queued).start()
+            self.availability = AvailabilityFeed(self.demand_queue, driver_status_stub).start()
+
+    @classmethod
+    def from_pool(cls, pool: Optional[ChannelPool] = None, hedge: bool = False, **kwargs):
+        """
+        Build with stubs from a ChannelPool (default: the process-wide pool).
+        hedge=True hedges the idempotent matching and pricing calls.
+        """
+        pool = pool or default_pool()
+        return cls(
+            pool.stub(TripRequestServiceStub, "trip_request"),
+            pool.stub(MatchingServiceStub, "matching", hedge=hedge),
+            pool.stub(PricingServiceStub, "pricing", hedge=hedge),
+            pool.stub(DriverStatusServiceStub, "driver_status"),
+            pool.stub(TripServiceStub, "trip"),
+            pool.stub(TelemetryServiceStub, "telemetry"),
+            **kwargs,
+        )
+
+    def close(self):
+        """
+        Stop the cold-start queue's availability feed and worker, then flush
+        and stop our telemetry batcher (a caller-supplied one is left running).
+        """
+        if self.availability is not None:
+            self.availability.close()
+        if self.demand_queue is not None:
+            self.demand_queue.close()
+        if self.owns_telemetry:
+            self.telemetry.close()
 
     # -----------------------------
     # Main entrypoint
@@ -77,14 +161,19 @@ class TripWorkflow:
         3. Pricing
         4. Driver assignment
         5. Trip creation
+        Returns the Trip, or the pending TripRequest if it was queued for
+        lack of drivers (cold_start_queue).
         """
         workflow_log = []
+        quote = None
+        claim = None
         try:
-            # Idempotency check
-            cached = redis_client.get(f"trip:{idempotency_key}")
-            if cached:
+            # Idempotency: a finished key returns its trip; a key in flight
+            # elsewhere is waited on instead of run twice
+            claim = self.idempotency.claim(f"trip:{idempotency_key}")
+            if claim.done:
                 logging.info(f"[IDEMPOTENT] Returning cached trip for {idempotency_key}")
-                return cached
+                return claim.value
 
             # -----------------------------
             # Step 1: Create TripRequest
@@ -96,100 +185,212 @@ class TripWorkflow:
             )
             trip_request = self.trip_request_stub.CreateTripRequest(tr_command)
             workflow_log.append(("trip_request", trip_request.id))
-            self._telemetry("trip_request_created", trip_request.id)
+            self._telemetry("trip_request_created", trip_request.id, passenger_id=passenger_id,
+                            origin=_point(origin), destination=_point(destination))
 
             # -----------------------------
-            # Step 2: Matching
+            # Step 2: Matching (+ speculative route quote)
             # -----------------------------
-            match_request = MatchingRequest(
-                trip_request_id=trip_request.id,
-                origin=origin,
-                destination=destination,
-                max_candidates=3,
-                seed=int(datetime.now().timestamp()),
-            )
-            matching_response = self.matching_stub.GetCandidates(match_request)
-            if not matching_response.candidates:
-                raise Exception("No drivers available")
-            candidate_driver = matching_response.candidates[0]  # deterministic selection
-            workflow_log.append(("matching", candidate_driver.driver_id))
-            self._telemetry("driver_matched", candidate_driver.driver_id)
-
-            # -----------------------------
-            # Step 3: Pricing
-            # -----------------------------
-            price_request = PriceCalculationRequest(
-                trip_request_id=trip_request.id,
-                passenger_id=passenger_id,
-                matched_driver_id=candidate_driver.driver_id,
-                origin=origin,
-                destination=destination,
-                estimated_distance_meters=1000,  # placeholder
-                estimated_duration_seconds=600,   # placeholder
-                demand_multiplier=1.0,
-                supply_multiplier=1.0,
-                driver_acceptance_rate=0.95,
-                driver_rating=4.8,
-                pricing_seed=match_request.seed,
-            )
-            price_response = self.pricing_stub.CalculatePrice(price_request)
-
-            # Economic guardrail
-            if price_response.driver_payout_total < MIN_DRIVER_PAYOUT_TJS:
-                raise Exception("Economic guardrail violated: driver payout too low")
-            workflow_log.append(("pricing", price_response.calculation_id))
-            self._telemetry("price_calculated", price_response.calculation_id)
-
-            # -----------------------------
-            # Step 4: Assign driver
-            # -----------------------------
-            driver_update = UpdateDriverStatusRequest(
-                driver_id=candidate_driver.driver_id,
-                is_available=False,
-                expected_version=1,
-                idempotency_key=str(uuid.uuid4()),
-            )
-            self.driver_status_stub.UpdateDriverStatus(driver_update)
-            workflow_log.append(("driver_assigned", candidate_driver.driver_id))
-            self._telemetry("driver_assigned", candidate_driver.driver_id)
+            seed = int(datetime.now().timestamp())
+            if self.speculative_pricing:
+                quote_request = self._price_request(trip_request.id, passenger_id, origin, destination, seed)
+                quote = self.pricing_stub.CalculatePrice.future(quote_request)
+            candidates = self._match(trip_request.id, origin, destination, seed)
+            if not candidates:
+                if self.demand_queue is None:
+                    raise NoDriversAvailable("No drivers available")
+                # Cold start: keep the TripRequest and park it until a driver
+                # becomes available near the origin (rematch_queued)
+                if quote is not None:
+                    quote.cancel()
+                self.demand_queue.add(trip_request.id, origin.lat, origin.lon,
+                                      (passenger_id, origin, destination, idempotency_key))
+                self._telemetry("trip_request_queued", trip_request.id, seed=seed)
+                self.idempotency.complete(claim, QUEUED_PREFIX + trip_request.id, ttl=int(self.demand_queue.max_wait))
+                return trip_request
 
             # -----------------------------
-            # Step 5: Create Trip
+            # Steps 3-5: Pricing, assignment, Trip
             # -----------------------------
-            trip_command = CreateTripCommand(
-                trip_request_id=trip_request.id,
-                passenger_id=passenger_id,
-                driver_id=candidate_driver.driver_id,
-                origin=origin,
-                destination=destination,
-            )
-            trip = self.trip_stub.CreateTrip(trip_command)
-            workflow_log.append(("trip_created", trip.id))
-            self._telemetry("trip_created", trip.id)
+            price_response = None
+            if quote is not None:
+                price_response = self._reconcile_quote(quote_request, quote)
+            trip = self._finish_trip(trip_request.id, passenger_id, origin, destination, seed,
+                                     candidates, workflow_log, price_response)
 
             # Cache result for idempotency
-            redis_client.set(f"trip:{idempotency_key}", trip.id, ex=300)
+            self.idempotency.complete(claim, trip.id, ttl=300)
 
             return trip
 
         except Exception as e:
             logging.error(f"Workflow failed: {e}")
+            if quote is not None:
+                # Nothing was committed on the quote; just drop it
+                quote.cancel()
             self._compensate(workflow_log)
+            if claim is not None:
+                self.idempotency.release(claim)
             raise
 
+    # -----------------------------
+    # Saga steps 2-5
+    # -----------------------------
+    def _match(self, trip_request_id, origin, destination, seed):
+        """Matching's candidates, best first; empty when matching has nobody to offer."""
+        match_request = MatchingRequest(
+            trip_request_id=trip_request_id,
+            origin=origin,
+            destination=destination,
+            max_candidates=3,
+            seed=seed,
+        )
+        return list(self.matching_stub.GetCandidates(match_request).candidates)
+
+    def _finish_trip(self, trip_request_id, passenger_id, origin, destination, seed, candidates,
+                     workflow_log, price_response=None):
+        """Price (unless a reconciled quote is given), assign the driver and create the Trip."""
+        candidate_driver = candidates[0]  # deterministic selection
+        workflow_log.append(("matching", candidate_driver.driver_id))
+        self._telemetry("driver_matched", candidate_driver.driver_id, trip_request_id=trip_request_id, seed=seed)
+
+        # Step 3: Pricing
+        if price_response is None:
+            price_request = self._price_request(
+                trip_request_id, passenger_id, origin, destination, seed, candidates
+            )
+            price_response = self.pricer.price(price_request)
+
+        # Economic guardrail
+        if price_response.driver_payout_total < MIN_DRIVER_PAYOUT_TJS:
+            raise Exception("Economic guardrail violated: driver payout too low")
+        workflow_log.append(("pricing", price_response.calculation_id))
+        self._telemetry("price_calculated", price_response.calculation_id, trip_request_id=trip_request_id)
+
+        # Step 4: Assign driver
+        driver_update = UpdateDriverStatusRequest(
+            driver_id=candidate_driver.driver_id,
+            is_available=False,
+            expected_version=1,
+            idempotency_key=str(uuid.uuid4()),
+        )
+        self.driver_status_stub.UpdateDriverStatus(driver_update)
+        workflow_log.append(("driver_assigned", candidate_driver.driver_id))
+        self._telemetry("driver_assigned", candidate_driver.driver_id, trip_request_id=trip_request_id)
+
+        # Step 5: Create Trip
+        trip_command = CreateTripCommand(
+            trip_request_id=trip_request_id,
+            passenger_id=passenger_id,
+            driver_id=candidate_driver.driver_id,
+            origin=origin,
+            destination=destination,
+        )
+        trip = self.trip_stub.CreateTrip(trip_command)
+        workflow_log.append(("trip_created", trip.id))
+        self._telemetry("trip_created", trip.id, trip_request_id=trip_request_id,
+                        driver_id=candidate_driver.driver_id)
+        return trip
+
+    # -----------------------------
+    # Cold-start queue callbacks
+    # -----------------------------
+    def rematch_queued(self, batch: list) -> list:
+        """
+        DemandQueue.rematch: finish the saga for queued TripRequests now that
+        supply appeared near them; returns those still without a driver.
+        """
+        unmatched = []
+        for request in batch:
+            passenger_id, origin, destination, idempotency_key = request.payload
+            workflow_log = [("trip_request", request.request_id)]
+            try:
+                seed = int(datetime.now().timestamp())
+                candidates = self._match(request.request_id, origin, destination, seed)
+                if not candidates:
+                    unmatched.append(request)
+                    continue
+                trip = self._finish_trip(request.request_id, passenger_id, origin, destination, seed,
+                                         candidates, workflow_log)
+                self.idempotency.put(f"trip:{idempotency_key}", trip.id, ttl=300)
+            except Exception as e:
+                logging.error(f"Queued request {request.request_id} failed: {e}")
+                self._compensate(workflow_log)
+                # The TripRequest is cancelled; a retry must not be answered with it
+                try:
+                    self.idempotency.discard(f"trip:{idempotency_key}", QUEUED_PREFIX + request.request_id)
+                except Exception as e:
+                    logging.error(f"Could not clear idempotency key for {request.request_id}: {e}")
+        return unmatched
+
+    def expire_queued(self, request):
+        """DemandQueue.on_expired: nobody became available in time; cancel the TripRequest."""
+        self._telemetry("trip_request_expired", request.request_id)
+        self._compensate([("trip_request", request.request_id)])
+
+    # -----------------------------
+    # Pricing helpers
+    # -----------------------------
+    def _price_request(self, trip_request_id, passenger_id, origin, destination, seed, candidates=None):
+        """
+        PriceCalculationRequest for the route; driver inputs for candidates[0]
+        once matching has returned candidates (one lookup for the whole list).
+        """
+        request = PriceCalculationRequest(
+            trip_request_id=trip_request_id,
+            passenger_id=passenger_id,
+            origin=origin,
+            destination=destination,
+            estimated_distance_meters=1000,  # placeholder
+            estimated_duration_seconds=600,   # placeholder
+            demand_multiplier=1.0,
+            supply_multiplier=1.0,
+            pricing_seed=seed,
+        )
+        if candidates:
+            rates, ratings = self.driver_features.get_many([c.driver_id for c in candidates])
+            request.matched_driver_id = candidates[0].driver_id
+            request.driver_acceptance_rate = float(rates[0])
+            request.driver_rating = float(ratings[0])
+        return request
+
+    def _reconcile_quote(self, quote_request, quote):
+        """
+        The speculative quote if it still holds for the matched trip, else
+        None and the caller re-prices with the driver. The fare depends on
+        route and surge only, so the quote holds unless it failed, expired or
+        was priced at a different surge than requested.
+        """
+        try:
+            response = quote.result()
+        except grpc.RpcError as e:
+            logging.warning(f"Speculative quote failed, re-pricing: {e.code()}")
+            return None
+        if response.trip_request_id != quote_request.trip_request_id:
+            return None
+        if response.HasField("price_expires_at") and response.price_expires_at.ToDatetime() <= datetime.utcnow():
+            self._telemetry("price_quote_expired", response.calculation_id,
+                            trip_request_id=quote_request.trip_request_id)
+            return None
+        if response.demand_multiplier_at_request and response.demand_multiplier_at_request != quote_request.demand_multiplier:
+            self._telemetry("price_quote_stale", response.calculation_id,
+                            trip_request_id=quote_request.trip_request_id)
+            return None
+        return response
+
     # -----------------------------
     # Telemetry helper
     # -----------------------------
-    def _telemetry(self, event_type: str, entity_id: str):
+    def _telemetry(self, event_type: str, entity_id: str, **metadata):
+        """Queue one event; metadata links it to its trip request (see benchmarks/replay.py)."""
         evt = TelemetryEvent(
             event_type=event_type,
             entity_id=entity_id,
-            timestamp=int(datetime.now(timezone.utc).timestamp()),
         )
-        try:
-            self.telemetry_stub.LogEvent(evt)
-        except Exception:
-            logging.warning("Telemetry failed for %s", event_type)
+        evt.metadata.data.update({key: str(value) for key, value in metadata.items()})
+        evt.timestamp.GetCurrentTime()
+        if not self.telemetry.log(evt):
+            logging.warning("Telemetry queue full, dropped %s", event_type)
 
     # -----------------------------
     # Compensation handler
@@ -213,7 +414,7 @@ class TripWorkflow:
                 elif step == "trip_request":
                     # Cancel trip request
                     self.trip_request_stub.CancelTripRequest(
-                        trip_request_pb2.CancelTripRequestCommand(
+                        CancelTripRequestCommand(
                             request_id=entity_id,
                             expected_version=1
                         )
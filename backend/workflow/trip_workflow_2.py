@@ -18,6 +18,16 @@ from pricing_pb2 import PriceCalculationRequest
 from trip_service_pb2 import CreateTripCommand
 from common_pb2 import Location
 
+# Per-driver acceptance rate / rating for pricing
+from driver_features import DriverFeatureStore, shared_features
+
+# Local LRU + Redis idempotency claims
+from idempotency import IdempotencyCache, RedisBackend
+
+# Shared channels / stubs
+from grpc_channels import ChannelPool, default_pool
+from telemetry_pb2_grpc import TelemetryServiceStub
+
 # Redis or similar for idempotency
 import redis
 redis_client = redis.Redis(host='localhost', port=6379, db=0)
@@ -39,12 +49,34 @@ class TripWorkflow:
                        matching_stub: MatchingServiceStub,
                        pricing_stub: PricingServiceStub,
                        driver_status_stub: DriverStatusServiceStub,
-                       trip_stub: TripServiceStub):
+                       trip_stub: TripServiceStub,
+                       driver_features: DriverFeatureStore = None,
+                       idempotency: IdempotencyCache = None):
         self.trip_request_stub = trip_request_stub
         self.matching_stub = matching_stub
         self.pricing_stub = pricing_stub
         self.driver_status_stub = driver_status_stub
         self.trip_stub = trip_stub
+        self.driver_features = driver_features if driver_features is not None else shared_features()
+        self.idempotency = idempotency if idempotency is not None else IdempotencyCache(RedisBackend(redis_client))
+
+    @classmethod
+    def from_pool(cls, pool: ChannelPool = None, hedge: bool = False, **kwargs):
+        """
+        Build with stubs from a ChannelPool (default: the process-wide pool).
+        hedge=True hedges the idempotent matching and pricing calls.
+        """
+        pool = pool or default_pool()
+        # The shared feature store, fed from telemetry on the same pool
+        kwargs.setdefault("driver_features", shared_features(pool.stub(TelemetryServiceStub, "telemetry")))
+        return cls(
+            pool.stub(TripRequestServiceStub, "trip_request"),
+            pool.stub(MatchingServiceStub, "matching", hedge=hedge),
+            pool.stub(PricingServiceStub, "pricing", hedge=hedge),
+            pool.stub(DriverStatusServiceStub, "driver_status"),
+            pool.stub(TripServiceStub, "trip"),
+            **kwargs,
+        )
 
     def create_trip(self, passenger_id: str, origin: Location, destination: Location):
         """
@@ -52,9 +84,11 @@ class TripWorkflow:
         """
         # Idempotency key for this workflow
         workflow_id = f"trip_workflow:{passenger_id}:{origin.lat}:{origin.lon}:{destination.lat}:{destination.lon}"
-        if redis_client.exists(workflow_id):
+        # A duplicate in flight elsewhere is waited on, not run twice
+        claim = self.idempotency.claim(workflow_id)
+        if claim.done:
             logging.info(f"Duplicate request detected, returning previous result")
-            return redis_client.get(workflow_id)
+            return claim.value
 
         try:
             # ----------------------------
@@ -85,6 +119,8 @@ class TripWorkflow:
             # ----------------------------
             # Step 3: Calculate Price
             # ----------------------------
+            # One lookup for the whole candidate list; chosen_driver is candidates[0]
+            rates, ratings = self.driver_features.get_many([c.driver_id for c in match_resp.candidates])
             pricing_req = PriceCalculationRequest(
                 trip_request_id=trip_request.id,
                 passenger_id=passenger_id,
@@ -95,8 +131,8 @@ class TripWorkflow:
                 estimated_duration_seconds=600,   # replace with actual routing
                 demand_multiplier=1.0,
                 supply_multiplier=1.0,
-                driver_acceptance_rate=1.0,
-                driver_rating=5.0,
+                driver_acceptance_rate=float(rates[0]),
+                driver_rating=float(ratings[0]),
                 pricing_seed=int(datetime.utcnow().timestamp())
             )
             pricing_resp = self.pricing_stub.CalculatePrice(pricing_req)
@@ -130,7 +166,7 @@ class TripWorkflow:
             # ----------------------------
             # Step 6: Store workflow result for idempotency
             # ----------------------------
-            redis_client.set(workflow_id, trip.id, ex=3600)  # expire in 1 hour
+            self.idempotency.complete(claim, trip.id, ttl=3600)  # expire in 1 hour
 
             return trip
 
@@ -153,4 +189,5 @@ class TripWorkflow:
             except Exception as ce:
                 logging.error(f"Compensation failed: {ce}")
 
+            self.idempotency.release(claim)
             raise e
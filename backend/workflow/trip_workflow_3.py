@@ -23,6 +23,20 @@ from pricing_pb2 import PriceCalculationRequest
 from trip_service_pb2 import CreateTripCommand
 from common_pb2 import Location
 
+# Per-driver acceptance rate / rating for pricing
+from driver_features import DriverFeatureStore, shared_features
+
+# Local LRU + Redis idempotency claims
+from idempotency import IdempotencyCache, RedisBackend
+
+# Not a transient failure: retrying only hammers matching while supply is scarce
+from demand_queue import NoDriversAvailable
+
+# Shared channels / stubs
+from grpc_channels import ChannelPool, default_pool
+from telemetry_pb2_grpc import TelemetryServiceStub
+from pricing_fallback import FallbackPricer
+
 # ----------------------------
 # Redis for idempotency
 # ----------------------------
@@ -44,8 +58,11 @@ def check_economics(passenger_fare: float, driver_payout: float, op_cost: float)
 # ----------------------------
 # Circuit breaker / timeout wrapper
 # ----------------------------
+CALL_TIMEOUT_SECONDS = 2
+
 @contextmanager
-def grpc_call_with_timeout(timeout_seconds=2):
+def grpc_call_with_timeout(timeout_seconds=CALL_TIMEOUT_SECONDS):
+    """Yields the deadline to pass as timeout= to the stub calls in the block."""
     try:
         yield timeout_seconds
     except grpc.RpcError as e:
@@ -68,12 +85,36 @@ class TripWorkflow:
                        matching_stub: MatchingServiceStub,
                        pricing_stub: PricingServiceStub,
                        driver_status_stub: DriverStatusServiceStub,
-                       trip_stub: TripServiceStub):
+                       trip_stub: TripServiceStub,
+                       driver_features: DriverFeatureStore = None,
+                       idempotency: IdempotencyCache = None):
         self.trip_request_stub = trip_request_stub
         self.matching_stub = matching_stub
         self.pricing_stub = pricing_stub
         self.driver_status_stub = driver_status_stub
         self.trip_stub = trip_stub
+        self.driver_features = driver_features if driver_features is not None else shared_features()
+        self.idempotency = idempotency if idempotency is not None else IdempotencyCache(RedisBackend(redis_client))
+        # CalculatePrice, priced locally from GetFallbackConfig when pricing is down
+        self.pricer = FallbackPricer(pricing_stub)
+
+    @classmethod
+    def from_pool(cls, pool: ChannelPool = None, hedge: bool = False, **kwargs):
+        """
+        Build with stubs from a ChannelPool (default: the process-wide pool).
+        hedge=True hedges the idempotent matching and pricing calls.
+        """
+        pool = pool or default_pool()
+        # The shared feature store, fed from telemetry on the same pool
+        kwargs.setdefault("driver_features", shared_features(pool.stub(TelemetryServiceStub, "telemetry")))
+        return cls(
+            pool.stub(TripRequestServiceStub, "trip_request"),
+            pool.stub(MatchingServiceStub, "matching", hedge=hedge),
+            pool.stub(PricingServiceStub, "pricing", hedge=hedge),
+            pool.stub(DriverStatusServiceStub, "driver_status"),
+            pool.stub(TripServiceStub, "trip"),
+            **kwargs,
+        )
 
     @retry_policy
     def create_trip(self, passenger_id: str, origin: Location, destination: Location):
@@ -84,27 +125,29 @@ class TripWorkflow:
         workflow_id = f"trip_workflow:{passenger_id}:{origin.lat}:{origin.lon}:{destination.lat}:{destination.lon}"
 
         # Return existing trip for idempotency
-        if redis_client.exists(workflow_id):
+        # A duplicate in flight elsewhere is waited on, not run twice
+        claim = self.idempotency.claim(workflow_id)
+        if claim.done:
             logging.info(f"[IDEMPOTENCY] Duplicate request, returning previous trip")
-            return redis_client.get(workflow_id)
+            return claim.value
 
         try:
             # ----------------------------
             # Step 1: Create TripRequest
             # ----------------------------
-            with grpc_call_with_timeout():
+            with grpc_call_with_timeout() as timeout:
                 tr_cmd = CreateTripRequestCommand(
                     passenger_id=passenger_id,
                     origin=origin,
                     destination=destination
                 )
-                trip_request = self.trip_request_stub.CreateTripRequest(tr_cmd)
+                trip_request = self.trip_request_stub.CreateTripRequest(tr_cmd, timeout=timeout)
                 log_telemetry("TripRequestCreated", trip_request.id, {"passenger_id": passenger_id})
 
             # ----------------------------
             # Step 2: Matching
             # ----------------------------
-            with grpc_call_with_timeout():
+            with grpc_call_with_timeout() as timeout:
                 match_req = MatchingRequest(
                     trip_request_id=trip_request.id,
                     origin=origin,
@@ -112,16 +155,18 @@ class TripWorkflow:
                     max_candidates=5,
                     seed=int(datetime.utcnow().timestamp())
                 )
-                match_resp = self.matching_stub.GetCandidates(match_req)
+                match_resp = self.matching_stub.GetCandidates(match_req, timeout=timeout)
                 if not match_resp.candidates:
-                    raise RuntimeError("No available drivers")
+                    raise NoDriversAvailable("No available drivers")
                 chosen_driver = match_resp.candidates[0].driver_id
                 log_telemetry("DriverCandidatesFetched", trip_request.id, {"driver_id": chosen_driver})
 
             # ----------------------------
             # Step 3: Price Calculation
             # ----------------------------
-            with grpc_call_with_timeout():
+            with grpc_call_with_timeout() as timeout:
+                # One lookup for the whole candidate list; chosen_driver is candidates[0]
+                rates, ratings = self.driver_features.get_many([c.driver_id for c in match_resp.candidates])
                 pricing_req = PriceCalculationRequest(
                     trip_request_id=trip_request.id,
                     passenger_id=passenger_id,
@@ -132,11 +177,11 @@ class TripWorkflow:
                     estimated_duration_seconds=600,
                     demand_multiplier=1.0,
                     supply_multiplier=1.0,
-                    driver_acceptance_rate=1.0,
-                    driver_rating=5.0,
+                    driver_acceptance_rate=float(rates[0]),
+                    driver_rating=float(ratings[0]),
                     pricing_seed=int(datetime.utcnow().timestamp())
                 )
-                pricing_resp = self.pricing_stub.CalculatePrice(pricing_req)
+                pricing_resp = self.pricer.price(pricing_req, timeout=timeout)
                 check_economics(pricing_resp.passenger_fare_total,
                                 pricing_resp.driver_payout_total,
                                 op_cost=50)
@@ -147,17 +192,18 @@ class TripWorkflow:
             # ----------------------------
             # Step 4: Assign Driver
             # ----------------------------
-            with grpc_call_with_timeout():
+            with grpc_call_with_timeout() as timeout:
                 # Ideally update driver status to assigned
                 self.driver_status_stub.UpdateDriverStatus(
                     # Fill request to mark driver as busy
+                    timeout=timeout,
                 )
                 log_telemetry("DriverAssigned", trip_request.id, {"driver_id": chosen_driver})
 
             # ----------------------------
             # Step 5: Create Trip in TripService
             # ----------------------------
-            with grpc_call_with_timeout():
+            with grpc_call_with_timeout() as timeout:
                 create_trip_cmd = CreateTripCommand(
                     trip_request_id=trip_request.id,
                     passenger_id=passenger_id,
@@ -165,13 +211,13 @@ class TripWorkflow:
                     origin=origin,
                     destination=destination
                 )
-                trip = self.trip_stub.CreateTrip(create_trip_cmd)
+                trip = self.trip_stub.CreateTrip(create_trip_cmd, timeout=timeout)
                 log_telemetry("TripCreated", trip.id, {"trip_request_id": trip_request.id})
 
             # ----------------------------
             # Step 6: Persist workflow result
             # ----------------------------
-            redis_client.set(workflow_id, trip.id, ex=3600)
+            self.idempotency.complete(claim, trip.id, ttl=3600)
             return trip
 
         except Exception as e:
@@ -186,7 +232,8 @@ class TripWorkflow:
                         CancelTripRequestCommand(
                             request_id=trip_request.id,
                             expected_version=trip_request.version
-                        )
+                        ),
+                        timeout=CALL_TIMEOUT_SECONDS,
                     )
                     log_telemetry("TripRequestCancelled", trip_request.id, {"reason": str(e)})
             except Exception as ce:
@@ -199,4 +246,5 @@ class TripWorkflow:
             except Exception as ce:
                 logging.error(f"Driver compensation failed: {ce}")
 
+            self.idempotency.release(claim)
             raise e
@@ -24,6 +24,20 @@ from trip_service_pb2 import CreateTripCommand
 from driver_status_pb2 import UpdateDriverStatusCommand
 from common_pb2 import Location
 
+# Per-driver acceptance rate / rating for pricing
+from driver_features import DriverFeatureStore, shared_features
+
+# Local LRU + Redis idempotency claims
+from idempotency import IdempotencyCache, RedisBackend
+
+# Not a transient failure: retrying only hammers matching while supply is scarce
+from demand_queue import NoDriversAvailable
+
+# Shared channels / stubs
+from grpc_channels import ChannelPool, default_pool
+from telemetry_pb2_grpc import TelemetryServiceStub
+from pricing_fallback import FallbackPricer
+
 # ----------------------------
 # Redis for idempotency and replay
 # ----------------------------
@@ -45,8 +59,11 @@ def check_economics(passenger_fare: float, driver_payout: float, op_cost: float)
 # ----------------------------
 # Circuit breaker / timeout
 # ----------------------------
+CALL_TIMEOUT_SECONDS = 2
+
 @contextmanager
-def grpc_call_with_timeout(timeout_seconds=2):
+def grpc_call_with_timeout(timeout_seconds=CALL_TIMEOUT_SECONDS):
+    """Yields the deadline to pass as timeout= to the stub calls in the block."""
     try:
         yield timeout_seconds
     except grpc.RpcError as e:
@@ -85,13 +102,37 @@ class TripWorkflow:
                        pricing_stub: PricingServiceStub,
                        driver_status_stub: DriverStatusServiceStub,
                        trip_stub: TripServiceStub,
-                       market: str = "khujand"):
+                       market: str = "khujand",
+                       driver_features: DriverFeatureStore = None,
+                       idempotency: IdempotencyCache = None):
         self.trip_request_stub = trip_request_stub
         self.matching_stub = matching_stub
         self.pricing_stub = pricing_stub
         self.driver_status_stub = driver_status_stub
         self.trip_stub = trip_stub
         self.market = market
+        self.driver_features = driver_features if driver_features is not None else shared_features()
+        self.idempotency = idempotency if idempotency is not None else IdempotencyCache(RedisBackend(redis_client))
+        # CalculatePrice, priced locally from GetFallbackConfig when pricing is down
+        self.pricer = FallbackPricer(pricing_stub)
+
+    @classmethod
+    def from_pool(cls, pool: ChannelPool = None, hedge: bool = False, **kwargs):
+        """
+        Build with stubs from a ChannelPool (default: the process-wide pool).
+        hedge=True hedges the idempotent matching and pricing calls.
+        """
+        pool = pool or default_pool()
+        # The shared feature store, fed from telemetry on the same pool
+        kwargs.setdefault("driver_features", shared_features(pool.stub(TelemetryServiceStub, "telemetry")))
+        return cls(
+            pool.stub(TripRequestServiceStub, "trip_request"),
+            pool.stub(MatchingServiceStub, "matching", hedge=hedge),
+            pool.stub(PricingServiceStub, "pricing", hedge=hedge),
+            pool.stub(DriverStatusServiceStub, "driver_status"),
+            pool.stub(TripServiceStub, "trip"),
+            **kwargs,
+        )
 
     @retry_policy
     def create_trip(self, passenger_id: str, origin: Location, destination: Location, ab_test_group: str = None):
@@ -107,9 +148,11 @@ class TripWorkflow:
         workflow_id = f"trip_workflow:{self.market}:{passenger_id}:{origin.lat}:{origin.lon}:{destination.lat}:{destination.lon}"
 
         # Idempotency
-        if redis_client.exists(workflow_id):
+        # A duplicate in flight elsewhere is waited on, not run twice
+        claim = self.idempotency.claim(workflow_id)
+        if claim.done:
             logging.info(f"[IDEMPOTENCY] Returning cached trip")
-            return redis_client.get(workflow_id)
+            return claim.value
 
         driver_assigned = None
         trip_request = None
@@ -119,15 +162,15 @@ class TripWorkflow:
             # ----------------------------
             # Step 1: Create TripRequest
             # ----------------------------
-            with grpc_call_with_timeout():
+            with grpc_call_with_timeout() as timeout:
                 tr_cmd = CreateTripRequestCommand(passenger_id=passenger_id, origin=origin, destination=destination)
-                trip_request = self.trip_request_stub.CreateTripRequest(tr_cmd)
+                trip_request = self.trip_request_stub.CreateTripRequest(tr_cmd, timeout=timeout)
                 log_telemetry("TripRequestCreated", trip_request.id, {"passenger_id": passenger_id})
 
             # ----------------------------
             # Step 2: Matching
             # ----------------------------
-            with grpc_call_with_timeout():
+            with grpc_call_with_timeout() as timeout:
                 match_req = MatchingRequest(
                     trip_request_id=trip_request.id,
                     origin=origin,
@@ -135,9 +178,9 @@ class TripWorkflow:
                     max_candidates=5,
                     seed=int(datetime.utcnow().timestamp())
                 )
-                match_resp = self.matching_stub.GetCandidates(match_req)
+                match_resp = self.matching_stub.GetCandidates(match_req, timeout=timeout)
                 if not match_resp.candidates:
-                    raise RuntimeError("No drivers available")
+                    raise NoDriversAvailable("No drivers available")
                 driver_assigned = match_resp.candidates[0].driver_id
                 log_telemetry("DriverAssignedCandidate", trip_request.id, {"driver_id": driver_assigned})
 
@@ -148,7 +191,9 @@ class TripWorkflow:
             if ab_test_group == "B":
                 surge_multiplier *= 0.9  # Example A/B variant
 
-            with grpc_call_with_timeout():
+            with grpc_call_with_timeout() as timeout:
+                # One lookup for the whole candidate list; driver_assigned is candidates[0]
+                rates, ratings = self.driver_features.get_many([c.driver_id for c in match_resp.candidates])
                 pricing_req = PriceCalculationRequest(
                     trip_request_id=trip_request.id,
                     passenger_id=passenger_id,
@@ -159,11 +204,11 @@ class TripWorkflow:
                     estimated_duration_seconds=600,
                     demand_multiplier=surge_multiplier,
                     supply_multiplier=1.0,
-                    driver_acceptance_rate=1.0,
-                    driver_rating=5.0,
+                    driver_acceptance_rate=float(rates[0]),
+                    driver_rating=float(ratings[0]),
                     pricing_seed=int(datetime.utcnow().timestamp())
                 )
-                pricing_resp = self.pricing_stub.CalculatePrice(pricing_req)
+                pricing_resp = self.pricer.price(pricing_req, timeout=timeout)
                 check_economics(pricing_resp.passenger_fare_total,
                                 pricing_resp.driver_payout_total,
                                 op_cost=50)
@@ -175,17 +220,17 @@ class TripWorkflow:
             # ----------------------------
             # Step 4: Driver Status Update (assignment)
             # ----------------------------
-            with grpc_call_with_timeout():
+            with grpc_call_with_timeout() as timeout:
                 self.driver_status_stub.UpdateDriverStatus(UpdateDriverStatusCommand(
                     driver_id=driver_assigned,
                     status="ASSIGNED"
-                ))
+                ), timeout=timeout)
                 log_telemetry("DriverStatusUpdated", trip_request.id, {"driver_id": driver_assigned})
 
             # ----------------------------
             # Step 5: Create Trip
             # ----------------------------
-            with grpc_call_with_timeout():
+            with grpc_call_with_timeout() as timeout:
                 create_trip_cmd = CreateTripCommand(
                     trip_request_id=trip_request.id,
                     passenger_id=passenger_id,
@@ -193,11 +238,11 @@ class TripWorkflow:
                     origin=origin,
                     destination=destination
                 )
-                trip = self.trip_stub.CreateTrip(create_trip_cmd)
+                trip = self.trip_stub.CreateTrip(create_trip_cmd, timeout=timeout)
                 log_telemetry("TripCreated", trip.id, {"trip_request_id": trip_request.id})
 
             # Persist workflow result for idempotency & replay
-            redis_client.set(workflow_id, trip.id, ex=3600)
+            self.idempotency.complete(claim, trip.id, ttl=3600)
             return trip
 
         except Exception as e:
@@ -212,7 +257,8 @@ class TripWorkflow:
                         CancelTripRequestCommand(
                             request_id=trip_request.id,
                             expected_version=trip_request.version
-                        )
+                        ),
+                        timeout=CALL_TIMEOUT_SECONDS,
                     )
                     log_telemetry("TripRequestCancelled", trip_request.id, {"reason": str(e)})
             except Exception as ce:
@@ -223,9 +269,10 @@ class TripWorkflow:
                     self.driver_status_stub.UpdateDriverStatus(UpdateDriverStatusCommand(
                         driver_id=driver_assigned,
                         status="AVAILABLE"
-                    ))
+                    ), timeout=CALL_TIMEOUT_SECONDS)
                     log_telemetry("DriverUnassigned", trip_request.id, {"driver_id": driver_assigned})
             except Exception as ce:
                 logging.error(f"DriverStatus compensation failed: {ce}")
 
+            self.idempotency.release(claim)
             raise e
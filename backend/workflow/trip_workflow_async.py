@@ -0,0 +1,347 @@
+# trip_workflow_async.py
+
+"""
+Asyncio Trip Workflow for DG Do (Khujand)
+
+Same saga as trip_workflow_1 (steps, guardrails, compensation, telemetry)
+on grpc.aio stubs. Each in-flight trip is a coroutine instead of a blocked
+OS thread, so one event loop can drive thousands of concurrent sagas.
+"""
+
+import asyncio
+import uuid
+import logging
+from datetime import datetime
+from typing import Optional
+
+import grpc
+import redis
+
+# Import gRPC stubs (build them on a grpc.aio channel)
+from trip_request_pb2_grpc import TripRequestServiceStub
+from matching_pb2_grpc import MatchingServiceStub
+from pricing_pb2_grpc import PricingServiceStub
+from driver_status_pb2_grpc import DriverStatusServiceStub
+from trip_service_pb2_grpc import TripServiceStub
+
+from trip_request_pb2 import CreateTripRequestCommand, CancelTripRequestCommand
+from matching_pb2 import MatchingRequest
+from pricing_pb2 import PriceCalculationRequest
+from driver_status_pb2 import UpdateDriverStatusRequest
+from trip_service_pb2 import CreateTripCommand
+
+# Telemetry helper
+from telemetry_pb2_grpc import TelemetryServiceStub
+from telemetry_pb2 import TelemetryEvent
+from telemetry_client import TelemetryBatcher
+
+# Per-driver acceptance rate / rating for pricing
+from driver_features import DriverFeatureStore, shared_features
+
+# Local LRU + Redis idempotency claims, run off the event loop
+from idempotency import IdempotencyCache, AsyncIdempotencyCache, RedisBackend
+
+# Shared channels / stubs
+from grpc_channels import ChannelPool, default_pool
+
+# -----------------------------
+# Redis client for idempotency (blocking: claims run on worker threads)
+# -----------------------------
+redis_client = redis.Redis(host="localhost", port=6379, db=0)
+
+# -----------------------------
+# Constants / Guardrails
+# -----------------------------
+MIN_DRIVER_PAYOUT_TJS = 1.5  # TJS per km
+MAX_PRICE_MULTIPLIER = 3.0
+
+
+def _point(location) -> str:
+    """A Location as telemetry metadata ("lat,lon")."""
+    return f"{location.lat},{location.lon}"
+
+# -----------------------------
+# Workflow class
+# -----------------------------
+class AsyncTripWorkflow:
+    def __init__(
+        self,
+        trip_request_stub: TripRequestServiceStub,
+        matching_stub: MatchingServiceStub,
+        pricing_stub: PricingServiceStub,
+        driver_status_stub: DriverStatusServiceStub,
+        trip_stub: TripServiceStub,
+        telemetry_stub: TelemetryServiceStub,
+        driver_features: Optional[DriverFeatureStore] = None,
+        idempotency: Optional[IdempotencyCache] = None,
+        speculative_pricing: bool = False,
+        telemetry: Optional[TelemetryBatcher] = None,
+    ):
+        """
+        The five service stubs must be grpc.aio stubs. telemetry_stub is a
+        regular blocking stub: TelemetryBatcher ships events from its own
+        thread, so logging never blocks the event loop. idempotency: claims
+        per idempotency key (default: backed by redis_client), driven through
+        AsyncIdempotencyCache so concurrent duplicates run once.
+        speculative_pricing quotes the route concurrently with matching (see
+        TripWorkflow). telemetry: a caller-owned batcher (default: one owned
+        by this workflow). close() when done.
+        """
+        self.trip_request_stub = trip_request_stub
+        self.matching_stub = matching_stub
+        self.pricing_stub = pricing_stub
+        self.driver_status_stub = driver_status_stub
+        self.trip_stub = trip_stub
+        self.owns_telemetry = telemetry is None
+        self.telemetry = telemetry if telemetry is not None else TelemetryBatcher(telemetry_stub)
+        # Shared per process and fed from offer/rating telemetry
+        self.driver_features = driver_features if driver_features is not None else shared_features(telemetry_stub)
+        self.idempotency = AsyncIdempotencyCache(
+            idempotency if idempotency is not None else IdempotencyCache(RedisBackend(redis_client)))
+        self.speculative_pricing = speculative_pricing
+
+    @classmethod
+    def from_pool(cls, pool: ChannelPool, telemetry_pool: Optional[ChannelPool] = None, **kwargs):
+        """
+        Build with stubs from an aio ChannelPool; telemetry uses a blocking
+        pool (default: the process-wide one).
+        """
+        return cls(
+            pool.stub(TripRequestServiceStub, "trip_request"),
+            pool.stub(MatchingServiceStub, "matching"),
+            pool.stub(PricingServiceStub, "pricing"),
+            pool.stub(DriverStatusServiceStub, "driver_status"),
+            pool.stub(TripServiceStub, "trip"),
+            (telemetry_pool or default_pool()).stub(TelemetryServiceStub, "telemetry"),
+            **kwargs,
+        )
+
+    def close(self):
+        """
+        Stop the idempotency worker threads, then flush and stop our telemetry
+        batcher (a caller-supplied one is left running). Blocks; call it once
+        no create_trip() is in flight.
+        """
+        self.idempotency.close()
+        if self.owns_telemetry:
+            self.telemetry.close()
+
+    # -----------------------------
+    # Main entrypoint
+    # -----------------------------
+    async def create_trip(self, passenger_id: str, origin, destination, idempotency_key: str):
+        """
+        Orchestrates the full trip workflow:
+        1. TripRequest creation
+        2. Matching
+        3. Pricing
+        4. Driver assignment
+        5. Trip creation
+        """
+        workflow_log = []
+        quote = None
+        claim = None
+        try:
+            # Idempotency: a finished key returns its trip; a key in flight
+            # elsewhere is waited on instead of run twice
+            claim = await self.idempotency.claim(f"trip:{idempotency_key}")
+            if claim.done:
+                logging.info(f"[IDEMPOTENT] Returning cached trip for {idempotency_key}")
+                return claim.value
+
+            # -----------------------------
+            # Step 1: Create TripRequest
+            # -----------------------------
+            tr_command = CreateTripRequestCommand(
+                passenger_id=passenger_id,
+                origin=origin,
+                destination=destination,
+            )
+            trip_request = await self.trip_request_stub.CreateTripRequest(tr_command)
+            workflow_log.append(("trip_request", trip_request.id))
+            self._telemetry("trip_request_created", trip_request.id, passenger_id=passenger_id,
+                            origin=_point(origin), destination=_point(destination))
+
+            # -----------------------------
+            # Step 2: Matching (+ speculative route quote)
+            # -----------------------------
+            seed = int(datetime.now().timestamp())
+            if self.speculative_pricing:
+                # An aio call starts on creation; awaited after matching
+                quote_request = self._price_request(trip_request.id, passenger_id, origin, destination, seed)
+                quote = self.pricing_stub.CalculatePrice(quote_request)
+            match_request = MatchingRequest(
+                trip_request_id=trip_request.id,
+                origin=origin,
+                destination=destination,
+                max_candidates=3,
+                seed=seed,
+            )
+            matching_response = await self.matching_stub.GetCandidates(match_request)
+            if not matching_response.candidates:
+                raise Exception("No drivers available")
+            candidate_driver = matching_response.candidates[0]  # deterministic selection
+            workflow_log.append(("matching", candidate_driver.driver_id))
+            self._telemetry("driver_matched", candidate_driver.driver_id, trip_request_id=trip_request.id,
+                            seed=seed)
+
+            # -----------------------------
+            # Step 3: Pricing
+            # -----------------------------
+            price_response = None
+            if quote is not None:
+                price_response = await self._reconcile_quote(quote_request, quote)
+            if price_response is None:
+                price_request = self._price_request(
+                    trip_request.id, passenger_id, origin, destination, seed, matching_response.candidates
+                )
+                price_response = await self.pricing_stub.CalculatePrice(price_request)
+
+            # Economic guardrail
+            if price_response.driver_payout_total < MIN_DRIVER_PAYOUT_TJS:
+                raise Exception("Economic guardrail violated: driver payout too low")
+            workflow_log.append(("pricing", price_response.calculation_id))
+            self._telemetry("price_calculated", price_response.calculation_id,
+                            trip_request_id=trip_request.id)
+
+            # -----------------------------
+            # Step 4: Assign driver
+            # -----------------------------
+            driver_update = UpdateDriverStatusRequest(
+                driver_id=candidate_driver.driver_id,
+                is_available=False,
+                expected_version=1,
+                idempotency_key=str(uuid.uuid4()),
+            )
+            await self.driver_status_stub.UpdateDriverStatus(driver_update)
+            workflow_log.append(("driver_assigned", candidate_driver.driver_id))
+            self._telemetry("driver_assigned", candidate_driver.driver_id, trip_request_id=trip_request.id)
+
+            # -----------------------------
+            # Step 5: Create Trip
+            # -----------------------------
+            trip_command = CreateTripCommand(
+                trip_request_id=trip_request.id,
+                passenger_id=passenger_id,
+                driver_id=candidate_driver.driver_id,
+                origin=origin,
+                destination=destination,
+            )
+            trip = await self.trip_stub.CreateTrip(trip_command)
+            workflow_log.append(("trip_created", trip.id))
+            self._telemetry("trip_created", trip.id, trip_request_id=trip_request.id,
+                            driver_id=candidate_driver.driver_id)
+
+            # Cache result for idempotency
+            await self.idempotency.complete(claim, trip.id, ttl=300)
+
+            return trip
+
+        except asyncio.CancelledError:
+            # Cancelled mid-saga (e.g. a caller timeout): still roll back,
+            # shielded so the compensation itself runs to completion
+            logging.error("Workflow cancelled")
+            if quote is not None:
+                quote.cancel()
+            await asyncio.shield(self._compensate(workflow_log))
+            if claim is not None:
+                await asyncio.shield(self.idempotency.release(claim))
+            raise
+        except Exception as e:
+            logging.error(f"Workflow failed: {e}")
+            if quote is not None:
+                # Nothing was committed on the quote; just drop it
+                quote.cancel()
+            await self._compensate(workflow_log)
+            if claim is not None:
+                await self.idempotency.release(claim)
+            raise
+
+    # -----------------------------
+    # Pricing helpers
+    # -----------------------------
+    def _price_request(self, trip_request_id, passenger_id, origin, destination, seed, candidates=None):
+        """
+        PriceCalculationRequest for the route; driver inputs for candidates[0]
+        once matching has returned candidates (one lookup for the whole list).
+        """
+        request = PriceCalculationRequest(
+            trip_request_id=trip_request_id,
+            passenger_id=passenger_id,
+            origin=origin,
+            destination=destination,
+            estimated_distance_meters=1000,  # placeholder
+            estimated_duration_seconds=600,   # placeholder
+            demand_multiplier=1.0,
+            supply_multiplier=1.0,
+            pricing_seed=seed,
+        )
+        if candidates:
+            rates, ratings = self.driver_features.get_many([c.driver_id for c in candidates])
+            request.matched_driver_id = candidates[0].driver_id
+            request.driver_acceptance_rate = float(rates[0])
+            request.driver_rating = float(ratings[0])
+        return request
+
+    async def _reconcile_quote(self, quote_request, quote):
+        """The speculative quote if it still holds, else None (see TripWorkflow._reconcile_quote)."""
+        try:
+            response = await quote
+        except grpc.RpcError as e:
+            logging.warning(f"Speculative quote failed, re-pricing: {e.code()}")
+            return None
+        if response.trip_request_id != quote_request.trip_request_id:
+            return None
+        if response.HasField("price_expires_at") and response.price_expires_at.ToDatetime() <= datetime.utcnow():
+            self._telemetry("price_quote_expired", response.calculation_id,
+                            trip_request_id=quote_request.trip_request_id)
+            return None
+        if response.demand_multiplier_at_request and response.demand_multiplier_at_request != quote_request.demand_multiplier:
+            self._telemetry("price_quote_stale", response.calculation_id,
+                            trip_request_id=quote_request.trip_request_id)
+            return None
+        return response
+
+    # -----------------------------
+    # Telemetry helper
+    # -----------------------------
+    def _telemetry(self, event_type: str, entity_id: str, **metadata):
+        """Queue one event; metadata links it to its trip request (see benchmarks/replay.py)."""
+        evt = TelemetryEvent(
+            event_type=event_type,
+            entity_id=entity_id,
+        )
+        evt.metadata.data.update({key: str(value) for key, value in metadata.items()})
+        evt.timestamp.GetCurrentTime()
+        if not self.telemetry.log(evt):
+            logging.warning("Telemetry queue full, dropped %s", event_type)
+
+    # -----------------------------
+    # Compensation handler
+    # -----------------------------
+    async def _compensate(self, workflow_log):
+        """
+        Roll back all steps in reverse order to ensure partial failure recovery
+        """
+        for step, entity_id in reversed(workflow_log):
+            try:
+                if step == "driver_assigned":
+                    # Unassign driver
+                    await self.driver_status_stub.UpdateDriverStatus(
+                        UpdateDriverStatusRequest(
+                            driver_id=entity_id,
+                            is_available=True,
+                            expected_version=2,  # optimistic locking
+                            idempotency_key=str(uuid.uuid4()),
+                        )
+                    )
+                elif step == "trip_request":
+                    # Cancel trip request
+                    await self.trip_request_stub.CancelTripRequest(
+                        CancelTripRequestCommand(
+                            request_id=entity_id,
+                            expected_version=1
+                        )
+                    )
+            except Exception as e:
+                logging.error(f"Compensation failed for {step} {entity_id}: {e}")